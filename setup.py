@@ -54,6 +54,7 @@ setup(name = "uproot_skyhook",
       license = "BSD 3-clause",
       test_suite = "tests",
       install_requires = ["flatbuffers>=1.8.0", "uproot>3.3.5", "lz4", "backports.lzma;python_version<\"3.3\""],
+      extras_require = {"zstd": ["zstandard"], "fast-zlib": ["isal", "deflate"]},
       setup_requires = ["pytest-runner"],
       tests_require = ["pytest"],
       classifiers = [
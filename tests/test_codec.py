@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import unittest
+import zlib
+
+import numpy
+
+import uproot_skyhook.layout
+import uproot_skyhook.codec
+
+class Test(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    data = numpy.arange(1000, dtype=">f8").tobytes()
+
+    def check(self, compression, compressed):
+        out = uproot_skyhook.codec.decompress(compression, compressed, len(self.data))
+        assert out.dtype == numpy.uint8 and out.tobytes() == self.data
+
+    def test_zlib(self):
+        self.check(uproot_skyhook.layout.zlib, zlib.compress(self.data))
+
+    def test_zlib_backends(self):
+        compressed = zlib.compress(self.data)
+        try:
+            for name, loader in uproot_skyhook.codec.zlib_backends:
+                try:
+                    assert uproot_skyhook.codec.zlibbackend(name) == name
+                except ImportError:
+                    continue
+                self.check(uproot_skyhook.layout.zlib, compressed)
+                assert len(uproot_skyhook.codec.decompress(uproot_skyhook.layout.zlib, zlib.compress(b""), 0)) == 0
+        finally:
+            uproot_skyhook.codec.zlibbackend()
+        assert uproot_skyhook.codec.zlibbackend("zlib") == "zlib"
+        self.assertRaises(ValueError, lambda: uproot_skyhook.codec.zlibbackend("nonexistent"))
+        uproot_skyhook.codec.zlibbackend()
+
+    def test_lzma(self):
+        try:
+            import lzma
+        except ImportError:
+            raise unittest.SkipTest("lzma not installed")
+        self.check(uproot_skyhook.layout.lzma, lzma.compress(self.data))
+
+    def test_lz4(self):
+        try:
+            import lz4.block
+        except ImportError:
+            raise unittest.SkipTest("lz4 not installed")
+        self.check(uproot_skyhook.layout.lz4, lz4.block.compress(self.data, store_size=False))
+
+    def test_zstd(self):
+        try:
+            import zstandard
+        except ImportError:
+            raise unittest.SkipTest("zstandard not installed")
+        self.check(uproot_skyhook.layout.zstd, zstandard.ZstdCompressor().compress(self.data))
+        self.check(uproot_skyhook.layout.zstd, zstandard.ZstdCompressor(write_content_size=False).compress(self.data))
+
+    def test_algorithms(self):
+        assert uproot_skyhook.codec.fromalgorithm(b"ZL").compression == uproot_skyhook.layout.zlib
+        assert uproot_skyhook.codec.fromalgorithm(b"XZ").compression == uproot_skyhook.layout.lzma
+        assert uproot_skyhook.codec.fromalgorithm(b"L4").skipbytes == 8
+        assert uproot_skyhook.codec.fromalgorithm(b"ZS").compression == uproot_skyhook.layout.zstd
+        self.assertRaises(ValueError, lambda: uproot_skyhook.codec.fromalgorithm(b"??"))
+        self.assertRaises(ValueError, lambda: uproot_skyhook.codec.get(uproot_skyhook.layout.old))
+
+    def test_zstd_layout(self):
+        from uproot_skyhook.layout import zstd, Branch, File, Column, Dataset
+        import uproot
+        dataset = Dataset("dataset", "treepath", ["one"], [Column(uproot.asdtype(">f8"))], [File("file", b"abbacdbad", [Branch([0, 1000], [0], zstd, [True], [100], [8000], [0, 1], None, None)])], [0, 1000])
+        assert uproot_skyhook.layout.frombuffer(dataset.tobuffer()).files[0].branches[0].compression == zstd
@@ -0,0 +1,663 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import zlib
+
+import numpy
+
+import uproot
+import uproot_skyhook.layout
+import uproot_skyhook.deliver
+import uproot_skyhook.codec
+import uproot_skyhook.native
+import uproot_skyhook.index
+
+class Test(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def dataset(self):
+        from uproot_skyhook.layout import zlib, lz4, Branch, File, Column, Dataset
+
+        files = []
+        for i in range(10):
+            # file 3 is 50 times larger than the others
+            sizes = [5000] * 10 if i == 3 else [100] * 10
+            one = Branch(numpy.arange(0, 1001, 100), numpy.arange(10) * 1000, zlib, [True] * 10, [x // 2 for x in sizes], sizes, numpy.arange(11), None, None)
+            two = Branch([0, 500, 1000], [10000, 20000], lz4, [True, False], [40, 100], [80, 100], [0, 1, 2], None, None)
+            files.append(File("file{0}".format(i), b"abbacdbad", [one, two]))
+        return Dataset("dataset", "treepath", ["one", "two"], [Column(uproot.asdtype(">f4")), Column(uproot.asdtype(">i8"))], files, numpy.arange(0, 11000, 1000))
+
+    def pages(self, directory):
+        # a fake file of basket pages: a flat >f4 column in two baskets (the second one zlib-compressed),
+        # a jagged >i4 column with 10-byte headers per entry, and a string column
+        from uproot_skyhook.layout import none, zlib as zlib_, Branch, File, Column, Dataset
+
+        def jaggedbasket(entries, skipbytes):
+            data, offsets = b"", []
+            for x in entries:
+                offsets.append(len(data))
+                data += b"h" * skipbytes + x
+            border = len(data)
+            return data + b"\x00" * 4 + numpy.array(offsets, dtype=">i4").tobytes() + b"\x00" * 4, border
+
+        flat = numpy.arange(10, dtype=">f4")
+        jagged = [numpy.arange(i, dtype=">i4") for i in range(5)]
+        strings = [b"", b"one", b"two", b"three"]
+        jaggedpage, jaggedborder = jaggedbasket([x.tobytes() for x in jagged], 10)
+        stringpage, stringborder = jaggedbasket([bytes(bytearray([len(x)])) + x for x in strings], 0)
+        pages = [flat[:4].tobytes(), zlib.compress(flat[4:].tobytes()), jaggedpage, stringpage]
+        seeks = numpy.cumsum([0] + [len(x) for x in pages])
+        with open(os.path.join(directory, "pages"), "wb") as file:
+            file.write(b"".join(pages))
+
+        files = [File(os.path.join(directory, "pages"), b"abbacdbad", [
+            Branch([0, 4, 10], seeks[:2], zlib_, [False, True], [len(pages[0]), len(pages[1])], [16, 24], [0, 1, 2], None, None),
+            Branch([0, 5], seeks[2:3], none, None, None, [len(pages[2])], [0, 1], [0], [jaggedborder]),
+            Branch([0, 4], seeks[3:4], none, None, None, [len(pages[3])], [0, 1], [0], [stringborder])])]
+        columns = [Column(uproot.asdtype(">f4")), Column(uproot.asjagged(uproot.asdtype(">i4"), skipbytes=10)), Column(uproot.asstring())]
+        return Dataset("dataset", "treepath", ["flat", "jagged", "string"], columns, files, [0, 10]), flat, jagged, strings
+
+    def test_native(self):
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+            dataset = uproot_skyhook.layout.frombuffer(dataset.tobuffer())
+
+            assert uproot_skyhook.deliver.array(dataset, "flat").tolist() == flat.tolist()
+            assert uproot_skyhook.deliver.array(dataset, "flat", 2, 7).tolist() == flat[2:7].tolist()
+            assert uproot_skyhook.deliver.array(dataset, "jagged", 0, 5).tolist() == [x.tolist() for x in jagged]
+            assert uproot_skyhook.deliver.array(dataset, "jagged", 2, 4).tolist() == [x.tolist() for x in jagged[2:4]]
+            assert uproot_skyhook.deliver.array(dataset, "string", 0, 4).tolist() == strings
+            assert uproot_skyhook.deliver.array(dataset, "string", 1, 3).tolist() == strings[1:3]
+
+            # by default, the same types as uproot; native=True gives the minimal containers
+            out = uproot_skyhook.deliver.array(dataset, "jagged", 0, 5)
+            assert not isinstance(out, uproot_skyhook.native.JaggedArray)
+            assert out[[4, 2]].tolist() == [jagged[4].tolist(), jagged[2].tolist()]
+            assert out[::2].counts.tolist() == [0, 2, 4]
+            out = uproot_skyhook.deliver.array(dataset, "string", 0, 4)
+            assert not isinstance(out, uproot_skyhook.native.StringArray)
+            assert out[[3, 1]].tolist() == [strings[3], strings[1]]
+            assert isinstance(uproot_skyhook.deliver.array(dataset, "jagged", 0, 5, native=True), uproot_skyhook.native.JaggedArray)
+            assert isinstance(uproot_skyhook.deliver.array(dataset, "string", 0, 4, native=True), uproot_skyhook.native.StringArray)
+            assert uproot_skyhook.deliver.array(dataset, "string", 0, 4, native=True).tolist() == strings
+            arrays = uproot_skyhook.deliver.arrays(dataset, ["jagged", "string"], 0, 4, native=True)
+            assert isinstance(arrays["jagged"], uproot_skyhook.native.JaggedArray) and isinstance(arrays["string"], uproot_skyhook.native.StringArray)
+
+            # the same, in a process that never imports uproot
+            dataset.tofile(os.path.join(directory, "dataset.rootlayout"))
+            script = "; ".join(["import sys",
+                                "import uproot_skyhook.layout, uproot_skyhook.deliver",
+                                "dataset = uproot_skyhook.layout.fromfile(sys.argv[1])",
+                                "print(uproot_skyhook.deliver.array(dataset, 'jagged', 1, 5, native=True).counts.tolist())",
+                                "print(uproot_skyhook.deliver.array(dataset, 'string', 0, 4, native=True).tolist())",
+                                "print(sorted(x for x in ('uproot', 'awkward', 'lz4', 'lzma') if x in sys.modules))"])
+            env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(uproot_skyhook.layout.__file__))))
+            output = subprocess.check_output([sys.executable, "-c", script, os.path.join(directory, "dataset.rootlayout")], env=env).decode().split("\n")
+            assert output[:3] == ["[1, 2, 3, 4]", repr(strings), "[]"]
+        finally:
+            shutil.rmtree(directory)
+
+    def test_partition(self):
+        dataset = self.dataset()
+
+        parts = uproot_skyhook.deliver.partition(dataset, ["one"], 4)
+        assert parts[0][0] == 0 and parts[-1][1] == 10000
+        assert all(x[1] == y[0] for x, y in zip(parts[:-1], parts[1:]))
+        assert all(x[0] % 100 == 0 for x in parts)
+        assert sum(x[2] for x in parts) == 9 * 1000 + 50000
+        assert max(x[2] for x in parts) < 2 * min(x[2] for x in parts)
+        assert len([x for x in parts if 3000 <= x[0] < 4000]) >= 2
+
+        assert uproot_skyhook.deliver.partition(dataset, ["one", "two"], 1) == [(0, 10000, 59000 + 10 * 180)]
+        assert uproot_skyhook.deliver.partition(dataset, ["one"], 1, compressed=True) == [(0, 10000, 59000 // 2)]
+
+        parts = uproot_skyhook.deliver.partition(dataset, ["one"], 4, entrystart=3050, entrystop=3060)
+        assert [x[:2] for x in parts] == [(3050, 3052), (3052, 3055), (3055, 3058), (3058, 3060)]
+        assert all(x[2] == 5000 for x in parts)
+
+    def test_estimate(self):
+        dataset = self.dataset()
+
+        estimate = uproot_skyhook.deliver.estimate(dataset, ["one", "two"])
+        assert (estimate["files"], estimate["baskets"], estimate["pages"]) == (10, 120, 120)
+        assert estimate["compressedbytes"] == 59000 // 2 + 10 * 140
+        assert estimate["uncompressedbytes"] == 59000 + 10 * 180
+        assert estimate["codecs"]["zlib"] == {"pages": 100, "compressedbytes": 59000 // 2, "uncompressedbytes": 59000}
+        assert estimate["codecs"]["lz4"] == {"pages": 10, "compressedbytes": 400, "uncompressedbytes": 800}
+        assert estimate["codecs"]["none"] == {"pages": 10, "compressedbytes": 1000, "uncompressedbytes": 1000}
+        assert estimate["outputbytes"] == 59000 + 10 * 180
+
+        estimate = uproot_skyhook.deliver.estimate(dataset, ["one"], 3050, 3150)
+        assert (estimate["files"], estimate["baskets"], estimate["pages"]) == (1, 2, 2)
+        assert estimate["uncompressedbytes"] == 10000
+        assert estimate["outputbytes"] == 5000
+
+    def test_mixed_codecs(self):
+        # one branch whose baskets were written with different algorithms (as after fast-merging)
+        import lzma
+        from uproot_skyhook.layout import zlib as zlib_, lzma as lzma_, none, Branch, File, Column, Dataset
+
+        directory = tempfile.mkdtemp()
+        try:
+            flat = numpy.arange(12, dtype=">f8")
+            pages = [zlib.compress(flat[:4].tobytes()), lzma.compress(flat[4:8].tobytes()), flat[8:].tobytes()]
+            seeks = numpy.cumsum([0] + [len(x) for x in pages])
+            with open(os.path.join(directory, "pages"), "wb") as file:
+                file.write(b"".join(pages))
+
+            branch = Branch([0, 4, 8, 12], seeks[:3], zlib_, [True, True, False], [len(x) for x in pages], [32, 32, 32], [0, 1, 2, 3], None, None, [zlib_.value, lzma_.value, none.value])
+            dataset = Dataset("dataset", "treepath", ["flat"], [Column(uproot.asdtype(">f8"))], [File(os.path.join(directory, "pages"), b"abbacdbad", [branch])], [0, 12])
+            dataset = uproot_skyhook.layout.frombuffer(dataset.tobuffer())
+
+            assert dataset.files[0].branches[0].page_compression.tolist() == [zlib_.value, lzma_.value, none.value]
+            assert dataset.files[0].branches[0] == branch
+            assert dataset.columnar(0).page_compression.tolist() == [zlib_.value, lzma_.value, none.value]
+            assert dataset.columnar(0).branch(0) == branch
+            assert uproot_skyhook.deliver.array(dataset, "flat").tolist() == flat.tolist()
+            assert uproot_skyhook.deliver.array(dataset, "flat", 5, 10).tolist() == flat[5:10].tolist()
+            selected = dataset.select(entrystart=5, trim=True)
+            assert selected.files[0].branches[0].page_compression.tolist() == [lzma_.value, none.value]
+            assert selected.numentries == 7
+            assert uproot_skyhook.deliver.array(selected, "flat").tolist() == flat[5:].tolist()
+            assert uproot_skyhook.deliver.array(selected, "flat", 2, 4).tolist() == flat[7:9].tolist()
+            selected = uproot_skyhook.layout.frombuffer(selected.tobuffer())
+            assert uproot_skyhook.deliver.array(selected, "flat", 1).tolist() == flat[6:].tolist()
+            assert [x.tolist() for x in selected.columnar(0).basket_entries(selected.global_offsets)] == [[-1, 3], [3, 7]]
+
+            estimate = uproot_skyhook.deliver.estimate(dataset, ["flat"])
+            assert sorted(estimate["codecs"]) == ["lzma", "none", "zlib"]
+            assert estimate["codecs"]["lzma"]["compressedbytes"] == len(pages[1])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_partial_basket(self):
+        # one basket of three zlib pages, the last of which is corrupt: a query that ends in the
+        # first page must neither read the rest of that page's output nor touch the later pages
+        from uproot_skyhook.layout import zlib as zlib_, Branch, File, Column, Dataset
+
+        directory = tempfile.mkdtemp()
+        try:
+            flat = numpy.arange(3000, dtype=">i8")
+            pages = [zlib.compress(flat[:1000].tobytes()), zlib.compress(flat[1000:2000].tobytes()), b"garbage!" * 100]
+            seeks = numpy.cumsum([0] + [len(x) for x in pages])
+            with open(os.path.join(directory, "pages"), "wb") as file:
+                file.write(b"".join(pages))
+
+            branch = Branch([0, 3000], seeks[:3], zlib_, [True, True, True], [len(x) for x in pages], [8000, 8000, 8000], [0, 3], None, None)
+            dataset = Dataset("dataset", "treepath", ["flat"], [Column(uproot.asdtype(">i8"))], [File(os.path.join(directory, "pages"), b"abbacdbad", [branch])], [0, 3000])
+
+            assert uproot_skyhook.deliver.array(dataset, "flat", 0, 10).tolist() == flat[:10].tolist()
+            assert uproot_skyhook.deliver.array(dataset, "flat", 990, 1500).tolist() == flat[990:1500].tolist()
+            self.assertRaises(Exception, lambda: uproot_skyhook.deliver.array(dataset, "flat", 0, 2500))
+
+            assert len(uproot_skyhook.codec.decompress(zlib_, pages[0], 8000, 80)) == 80
+            assert len(uproot_skyhook.codec.decompress(zlib_, pages[0], 8000, 9000)) == 8000
+        finally:
+            shutil.rmtree(directory)
+
+    def test_zerocopy(self):
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+
+            # entries 0:4 are the uncompressed first basket
+            view = uproot_skyhook.deliver.array(dataset, "flat", 1, 3, zerocopy=True)
+            assert view.tolist() == flat[1:3].tolist()
+            assert view.dtype == numpy.dtype(">f4") and isinstance(view.base, numpy.memmap)
+
+            # entries 4:10 are zlib-compressed, so a range across both baskets is copied, in the same dtype
+            array = uproot_skyhook.deliver.array(dataset, "flat", 2, 7, zerocopy=True)
+            assert array.tolist() == flat[2:7].tolist() and array.dtype == numpy.dtype(">f4")
+            array = uproot_skyhook.deliver.array(dataset, "flat", 5, 9, zerocopy=True)
+            assert array.tolist() == flat[5:9].tolist() and array.dtype == numpy.dtype(">f4")
+            assert uproot_skyhook.deliver.array(dataset, "flat", 3, 3, zerocopy=True).dtype == numpy.dtype(">f4")
+
+            assert [(start, stop, x.tolist()) for start, stop, x in uproot_skyhook.deliver.views(dataset, "flat", 2, 7)] == [(2, 4, flat[2:4].tolist()), (4, 7, flat[4:7].tolist())]
+            self.assertRaises(ValueError, lambda: list(uproot_skyhook.deliver.views(dataset, "jagged")))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_prefetch(self):
+        directory = tempfile.mkdtemp()
+        try:
+            # one file, ten uncompressed baskets of 10 entries each, contiguous on disk
+            data = numpy.arange(100, dtype=">i4")
+            with open(os.path.join(directory, "pages"), "wb") as file:
+                file.write(data.tobytes())
+            branch = uproot_skyhook.layout.Branch(numpy.arange(0, 101, 10), numpy.arange(0, 400, 40), uproot_skyhook.layout.none, None, None, [40] * 10, numpy.arange(11), None, None)
+            file = uproot_skyhook.layout.File(os.path.join(directory, "pages"), b"abbacdbad", [branch])
+            dataset = uproot_skyhook.layout.Dataset("dataset", "treepath", ["data"], [uproot_skyhook.layout.Column(uproot.asdtype(">i4"))], [file], [0, 100])
+
+            hints = []
+            original = uproot_skyhook.deliver.MemmapFileArray.willneed
+            def willneed(self, start, stop):
+                hints.append((start, stop))
+                original(self, start, stop)
+            uproot_skyhook.deliver.MemmapFileArray.willneed = willneed
+            try:
+                assert uproot_skyhook.deliver.array(dataset, "data", 15, 75, prefetch=2).tolist() == data[15:75].tolist()
+                assert hints == [(40 * i, 40 * i + 40) for i in range(1, 8)]
+                del hints[:]
+                assert uproot_skyhook.deliver.array(dataset, "data", prefetch=0).tolist() == data.tolist()
+                assert hints == []
+            finally:
+                uproot_skyhook.deliver.MemmapFileArray.willneed = original
+
+            # a file that can't be memory-mapped is read ahead in background threads
+            reads = []
+            original = uproot_skyhook.deliver.ReadFileArray._read
+            def _read(self, start, stop):
+                reads.append((start, stop, threading.current_thread() is threading.main_thread()))
+                return original(self, start, stop)
+            def memmap(self, location):
+                raise OSError("no mmap here")
+            originalinit = uproot_skyhook.deliver.MemmapFileArray.__init__
+            uproot_skyhook.deliver.ReadFileArray._read = _read
+            uproot_skyhook.deliver.MemmapFileArray.__init__ = memmap
+            try:
+                assert uproot_skyhook.deliver.array(dataset, "data", 15, 75, prefetch=2).tolist() == data[15:75].tolist()
+                assert sorted(reads) == [(40 * i, 40 * i + 40, False) for i in range(1, 8)]
+                del reads[:]
+                assert uproot_skyhook.deliver.array(dataset, "data", prefetch=0).tolist() == data.tolist()
+                assert reads == [(40 * i, 40 * i + 40, True) for i in range(10)]
+            finally:
+                uproot_skyhook.deliver.ReadFileArray._read = original
+                uproot_skyhook.deliver.MemmapFileArray.__init__ = originalinit
+        finally:
+            shutil.rmtree(directory)
+
+    def test_cache(self):
+        import uproot_skyhook.cache
+
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+            cache = uproot_skyhook.cache.ArrayCache(os.path.join(directory, "cache"), 1000000)
+
+            for i in range(2):
+                arrays = uproot_skyhook.deliver.arrays(dataset, ["flat", "jagged", "string"], 1, 4, cache=cache)
+                assert arrays["flat"].tolist() == flat[1:4].tolist()
+                assert arrays["jagged"].tolist() == [x.tolist() for x in jagged[1:4]]
+                assert arrays["string"].tolist() == strings[1:4]
+                assert not isinstance(arrays["string"], uproot_skyhook.native.StringArray)
+                assert isinstance(uproot_skyhook.deliver.array(dataset, "string", 1, 4, cache=cache, native=True), uproot_skyhook.native.StringArray)
+            assert isinstance(arrays["flat"], numpy.memmap)
+            assert len(cache.entries()) == 3
+
+            # corrupt the data: the cached result is what comes back
+            key = cache.key(dataset.files[0].uuid, "flat", dataset.columns[0].native.identifier, 1, 4)
+            cache.put(key, numpy.array([1.5, 2.5, 3.5], dtype="f4"))
+            assert uproot_skyhook.deliver.array(dataset, "flat", 1, 4, cache=cache).tolist() == [1.5, 2.5, 3.5]
+            self.assertRaises(ValueError, lambda: uproot_skyhook.deliver.array(dataset, "flat", 1, 4, zerocopy=True, cache=cache))
+
+            # least recently used entries go first
+            os.utime(os.path.join(cache.directory, key + ".npy"), (0, 0))
+            cache.limitbytes = cache.numbytes() - 1
+            cache.evict()
+            assert len(cache.entries()) == 2
+            assert cache.get(key) is None
+
+            # puts under the limit don't list the directory; going over it evicts
+            scans = []
+            original = cache.entries
+            cache.entries = lambda: scans.append(None) or original()
+            cache.limitbytes = 1000000
+            for i in range(10):
+                cache.put(cache.key(b"uuid", "x", "asdtype", i, i + 1), numpy.zeros(100, dtype="f8"))
+            assert len(scans) == 0
+            cache.limitbytes = cache._numbytes - 1
+            cache.put(cache.key(b"uuid", "x", "asdtype", 10, 11), numpy.zeros(100, dtype="f8"))
+            assert len(scans) == 1 and cache.numbytes() <= cache.limitbytes
+
+            # a failed write leaves no temporary file behind
+            def write(file):
+                raise OSError("disk full")
+            self.assertRaises(OSError, lambda: cache._write(os.path.join(cache.directory, "failed.npy"), write))
+            assert not any(x.endswith(".tmp") for x in os.listdir(cache.directory))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_cache_files(self):
+        import uproot_skyhook.cache
+
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+            dataset = dataset + dataset + dataset
+            cache = uproot_skyhook.cache.ArrayCache(os.path.join(directory, "cache"), 1000000)
+
+            # the middle file is cached whole, so a range differing only at the edges reuses it
+            assert uproot_skyhook.deliver.array(dataset, "flat", 5, 25, cache=cache).tolist() == flat[5:].tolist() + flat.tolist() + flat[:5].tolist()
+            assert len(cache.entries()) == 3
+            assert uproot_skyhook.deliver.array(dataset, "flat", 8, 30, cache=cache).tolist() == flat[8:].tolist() + flat.tolist() + flat.tolist()
+            assert len(cache.entries()) == 4      # the last file is the same file (UUID) as the middle one
+        finally:
+            shutil.rmtree(directory)
+
+    def test_pagecache(self):
+        import uproot_skyhook.cache
+
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+            pagecache = uproot_skyhook.cache.PageCache(os.path.join(directory, "pagecache"), 1000000)
+
+            assert uproot_skyhook.deliver.array(dataset, "flat", pagecache=pagecache).tolist() == flat.tolist()
+            assert uproot_skyhook.deliver.array(dataset, "string", 0, 4, pagecache=pagecache).tolist() == strings
+            assert len(pagecache.entries()) == 3
+
+            # with the original file gone, everything comes from the cache
+            os.rename(os.path.join(directory, "pages"), os.path.join(directory, "moved"))
+            with open(os.path.join(directory, "pages"), "wb") as file:
+                file.write(b"\x00" * 1000)
+            assert uproot_skyhook.deliver.array(dataset, "flat", pagecache=pagecache).tolist() == flat.tolist()
+            assert uproot_skyhook.deliver.array(dataset, "string", 0, 4, pagecache=pagecache).tolist() == strings
+
+            pagecache.limitbytes = 50
+            pagecache.evict()
+            assert pagecache.numbytes() <= 50
+        finally:
+            shutil.rmtree(directory)
+
+    def test_transcode(self):
+        import uproot_skyhook.transcode
+
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+
+            for compression in (uproot_skyhook.layout.none, uproot_skyhook.layout.lz4):
+                for native in (False, True):
+                    output = os.path.join(directory, "{0}-{1}".format(compression.name, native))
+                    transcoded = uproot_skyhook.transcode.transcode(dataset, ["flat", "jagged", "string"], output, compression, native)
+                    transcoded = uproot_skyhook.layout.frombuffer(transcoded.tobuffer())
+
+                    assert transcoded.files[0].branches[0].local_offsets.tolist() == dataset.files[0].branches[0].local_offsets.tolist()
+                    assert transcoded.files[0].uuid != dataset.files[0].uuid
+                    assert all(x.compression == compression for x in transcoded.files[0].branches)
+                    assert uproot_skyhook.deliver.array(transcoded, "flat").tolist() == flat.tolist()
+                    assert uproot_skyhook.deliver.array(transcoded, "flat", 2, 7).tolist() == flat[2:7].tolist()
+                    assert uproot_skyhook.deliver.array(transcoded, "jagged", 1, 5).tolist() == [x.tolist() for x in jagged[1:5]]
+                    assert uproot_skyhook.deliver.array(transcoded, "string", 0, 4).tolist() == strings
+
+                    view = uproot_skyhook.deliver.array(transcoded, "flat", 5, 9, zerocopy=True)
+                    assert view.tolist() == flat[5:9].tolist()
+                    if compression == uproot_skyhook.layout.none:
+                        assert isinstance(view.base, numpy.memmap)
+                        assert view.dtype.isnative == native
+
+            self.assertRaises(ValueError, lambda: uproot_skyhook.transcode.transcode(dataset, ["flat"], directory, uproot_skyhook.layout.lzma))
+
+            # UUIDs given as str
+            file = dataset.files[0]
+            dataset.files = [uproot_skyhook.layout.File(file.location, "abbacdbad", file.branches)]
+            transcoded = uproot_skyhook.transcode.transcode(dataset, ["flat"], os.path.join(directory, "str"))
+            assert uproot_skyhook.deliver.array(transcoded, "flat").tolist() == flat.tolist()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_reduce(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+            content = numpy.concatenate(jagged[1:5])
+
+            for executor in (None, ThreadPoolExecutor(2)):
+                assert uproot_skyhook.deliver.reduce(dataset, "flat", "sum", executor=executor) == flat.sum()
+                assert uproot_skyhook.deliver.reduce(dataset, "flat", "sum", 2, 7, executor=executor) == flat[2:7].sum()
+                assert uproot_skyhook.deliver.reduce(dataset, "flat", "count", 3, 3, executor=executor) == 0
+                assert uproot_skyhook.deliver.reduce(dataset, "flat", "min", 3, 3, executor=executor) is None
+                assert uproot_skyhook.deliver.reduce(dataset, "flat", "minmax", 3, 9, executor=executor) == (3, 8)
+                assert uproot_skyhook.deliver.reduce(dataset, "jagged", "count", 1, 5, executor=executor) == len(content)
+                assert uproot_skyhook.deliver.reduce(dataset, "jagged", "max", 1, 5, executor=executor) == content.max()
+
+                counts, edges = uproot_skyhook.deliver.histogram(dataset, "flat", 4, (0, 8), executor=executor)
+                expected = numpy.histogram(flat, 4, (0, 8))
+                assert counts.tolist() == expected[0].tolist() and edges.tolist() == expected[1].tolist()
+
+                counts, edges = uproot_skyhook.deliver.histogram(dataset, "jagged", 3, entrystart=1, entrystop=5, executor=executor)
+                expected = numpy.histogram(content, 3)
+                assert counts.tolist() == expected[0].tolist() and edges.tolist() == expected[1].tolist()
+
+            self.assertRaises(ValueError, lambda: uproot_skyhook.deliver.reduce(dataset, "flat", "median"))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_where(self):
+        # two files of 100 entries; "one" in baskets of 10 (zlib), "two" in baskets of 25 (uncompressed)
+        from uproot_skyhook.layout import none, zlib as zlib_, Branch, File, Column, Dataset
+
+        directory = tempfile.mkdtemp()
+        try:
+            one = numpy.arange(200, dtype=">f8")
+            two = (numpy.arange(200) * 10).astype(">i4")
+            files = []
+            for filei in range(2):
+                onepages = [zlib.compress(one[filei*100 + i : filei*100 + i + 10].tobytes()) for i in range(0, 100, 10)]
+                twopages = [two[filei*100 + i : filei*100 + i + 25].tobytes() for i in range(0, 100, 25)]
+                seeks = numpy.cumsum([0] + [len(x) for x in onepages + twopages])
+                path = os.path.join(directory, "file{0}".format(filei))
+                with open(path, "wb") as file:
+                    file.write(b"".join(onepages + twopages))
+                files.append(File(path, "uuid{0}".format(filei).encode(), [
+                    Branch(numpy.arange(0, 101, 10), seeks[:10], zlib_, [True] * 10, [len(x) for x in onepages], [80] * 10, numpy.arange(11), None, None),
+                    Branch(numpy.arange(0, 101, 25), seeks[10:14], none, None, None, [100] * 4, numpy.arange(5), None, None)]))
+            dataset = Dataset("dataset", "treepath", ["one", "two"], [Column(uproot.asdtype(">f8")), Column(uproot.asdtype(">i4"))], files, [0, 100, 200])
+
+            arrays = uproot_skyhook.deliver.arrays(dataset, ["one", "two"], where="(one % 7 == 0) & (two < 1500)")
+            mask = (one % 7 == 0) & (two < 1500)
+            assert arrays["one"].tolist() == one[mask].tolist()
+            assert arrays["two"].tolist() == two[mask].tolist()
+
+            arrays = uproot_skyhook.deliver.arrays(dataset, ["two"], 5, 163, where="abs(one - 120) < 3")
+            assert arrays["two"].tolist() == [1180, 1190, 1200, 1210, 1220]
+
+            assert len(uproot_skyhook.deliver.arrays(dataset, ["one", "two"], where="one < 0")["two"]) == 0
+            self.assertRaises(ValueError, lambda: uproot_skyhook.deliver.arrays(dataset, ["one"], where="1 > 0"))
+            assert uproot_skyhook.deliver.arrays(dataset, ["two"], where="(maximum(one, 3) == 3) & ~(two > 10) | (-one == -199)")["two"].tolist() == [0, 10, 1990]
+
+            # only arithmetic, comparisons, and whitelisted functions: no way to reach Python objects
+            for bad in ["[c for c in ().__class__.__base__.__subclasses__()]",
+                        "one.__class__",
+                        "one[0] > 0",
+                        "(lambda: one)() > 0",
+                        "__import__('os').getpid() > one",
+                        "open('x') > one",
+                        "one > 'x'",
+                        "abs(one, out=one) > 0",
+                        "one(1) > 0",
+                        "one if two else one",
+                        "one >"]:
+                self.assertRaises(ValueError, lambda: uproot_skyhook.deliver.arrays(dataset, ["one"], where=bad))
+
+            # baskets of "two" without selected entries are never read
+            read = []
+            original = uproot_skyhook.deliver._basketdata
+            def _basketdata(branch, filearray, basketi, needed=None):
+                read.append((len(branch.page_seeks), basketi))
+                return original(branch, filearray, basketi, needed)
+            uproot_skyhook.deliver._basketdata = _basketdata
+            try:
+                assert uproot_skyhook.deliver.arrays(dataset, ["two"], where="one == 130")["two"].tolist() == [1300]
+            finally:
+                uproot_skyhook.deliver._basketdata = original
+            assert [x for x in read if x[0] == 4] == [(4, 1)]
+        finally:
+            shutil.rmtree(directory)
+
+    def test_where_jagged(self):
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+            arrays = uproot_skyhook.deliver.arrays(dataset, ["jagged", "string"], 0, 4, where="(flat == 1) | (flat == 3)")
+            assert arrays["jagged"].tolist() == [jagged[1].tolist(), jagged[3].tolist()]
+            assert arrays["string"].tolist() == [strings[1], strings[3]]
+        finally:
+            shutil.rmtree(directory)
+
+    def test_counts(self):
+        from uproot_skyhook.layout import zlib as zlib_, Branch, File, Column, Dataset
+
+        directory = tempfile.mkdtemp()
+        try:
+            dataset, flat, jagged, strings = self.pages(directory)
+            assert uproot_skyhook.deliver.counts(dataset, "jagged", 0, 5).tolist() == [len(x) for x in jagged]
+            assert uproot_skyhook.deliver.counts(dataset, "jagged", 2, 4).tolist() == [2, 3]
+            assert uproot_skyhook.deliver.counts(dataset, "string", 0, 4).tolist() == [len(x) for x in strings]
+            self.assertRaises(ValueError, lambda: uproot_skyhook.deliver.counts(dataset, "flat"))
+
+            # a jagged basket in two zlib pages, the first of which (all content) is corrupt
+            border = 100*4
+            offsets = numpy.arange(0, 101, 10) * 4
+            tail = b"\x00" * 4 + offsets[:-1].astype(">i4").tobytes() + b"\x00" * 4
+            pages = [b"garbage!" * 10, zlib.compress(tail)]
+            with open(os.path.join(directory, "jagged"), "wb") as file:
+                file.write(b"".join(pages))
+            branch = Branch([0, 10], [0, len(pages[0])], zlib_, [True, True], [len(x) for x in pages], [border, len(tail)], [0, 2], [0], [border])
+            dataset = Dataset("dataset", "treepath", ["jagged"], [Column(uproot.asjagged(uproot.asdtype(">i4")))], [File(os.path.join(directory, "jagged"), b"abbacdbad", [branch])], [0, 10])
+
+            assert uproot_skyhook.deliver.counts(dataset, "jagged").tolist() == [10] * 10
+            assert uproot_skyhook.deliver.counts(dataset, "jagged", 3, 5).tolist() == [10, 10]
+            self.assertRaises(Exception, lambda: uproot_skyhook.deliver.array(dataset, "jagged"))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_index(self):
+        # two files of 100 entries; "run" sorted, "event" sorted within runs, "x" a payload, and "bigevent"
+        # like "event" but ULong64_t beyond 2**63, all in baskets of 20
+        from uproot_skyhook.layout import none, zlib as zlib_, Branch, File, Column, Dataset
+
+        directory = tempfile.mkdtemp()
+        try:
+            run = (numpy.arange(200) // 50 + 1).astype(">i4")
+            event = (numpy.arange(200) % 50 * 3 + 1000).astype(">i8")
+            x = numpy.arange(200, dtype=">f8")
+            bigevent = (event.astype(numpy.uint64) + numpy.uint64(2**63)).astype(">u8")
+            files = []
+            for filei in range(2):
+                pages = [zlib.compress(array[filei*100 + i : filei*100 + i + 20].tobytes()) for array in (run, event, x, bigevent) for i in range(0, 100, 20)]
+                seeks = numpy.cumsum([0] + [len(p) for p in pages])
+                path = os.path.join(directory, "file{0}".format(filei))
+                with open(path, "wb") as file:
+                    file.write(b"".join(pages))
+                files.append(File(path, "uuid{0}".format(filei).encode(), [
+                    Branch(numpy.arange(0, 101, 20), seeks[5*i : 5*i + 5], zlib_, [True] * 5, [len(p) for p in pages[5*i : 5*i + 5]], [20 * itemsize] * 5, numpy.arange(6), None, None)
+                    for i, itemsize in enumerate((4, 8, 8, 8))]))
+            dataset = Dataset("dataset", "treepath", ["run", "event", "x", "bigevent"], [Column(uproot.asdtype(">i4")), Column(uproot.asdtype(">i8")), Column(uproot.asdtype(">f8")), Column(uproot.asdtype(">u8"))], files, [0, 100, 200])
+
+            runindex = uproot_skyhook.index.build(dataset, "run")
+            assert runindex.basket_starts.tolist() == list(range(0, 200, 20))
+            assert runindex.basket_min.tolist() == [1, 1, 1, 2, 2, 3, 3, 3, 4, 4]
+            assert runindex.bloom is None
+            assert uproot_skyhook.index.lookup(runindex, 2) == [(40, 100)]
+            assert uproot_skyhook.index.lookup(runindex, 2, 3) == [(40, 160)]
+            assert uproot_skyhook.index.lookup(runindex, 5) == []
+
+            eventindex = uproot_skyhook.index.build(dataset, "event", bitsperkey=10)
+            assert eventindex.bloom_offsets.tolist() == list(range(0, 251, 25)) and eventindex.bloom_hashes == 7
+            path = os.path.join(directory, "event.index")
+            eventindex.tofile(path)
+            assert uproot_skyhook.layout.keyindexfromfile(path) == eventindex
+
+            # min/max alone would select every basket; the Bloom filter rejects most of them
+            assert uproot_skyhook.index.lookup(eventindex, 1030) == [(0, 20), (60, 80), (100, 120), (160, 180)]
+            assert uproot_skyhook.index.lookup(eventindex, 1031) == []
+            assert uproot_skyhook.index.lookup(eventindex, 1000, 1005) == [(0, 20), (40, 60), (100, 120), (140, 160)]
+
+            assert uproot_skyhook.index.entries(dataset, eventindex, 1030).tolist() == [10, 60, 110, 160]
+            assert uproot_skyhook.index.entries(dataset, eventindex, 1000, 1005).tolist() == [0, 1, 50, 51, 100, 101, 150, 151]
+
+            ranges = uproot_skyhook.index.intersect(uproot_skyhook.index.lookup(runindex, 3), uproot_skyhook.index.lookup(eventindex, 1030))
+            assert ranges == [(100, 120)]
+            arrays = [uproot_skyhook.deliver.arrays(dataset, ["x"], start, stop, where="(run == 3) & (event == 1030)")["x"] for start, stop in ranges]
+            assert numpy.concatenate(arrays).tolist() == [110.0]
+
+            # uint64 keys keep all 64 bits, in memory, in files, and in the Bloom filter
+            assert uproot_skyhook.layout.KeyIndex("x", [0], [10], [numpy.uint64(2**63 + 5)], [numpy.uint64(2**64 - 1)]).basket_max.tolist() == [2**64 - 1]
+            bigindex = uproot_skyhook.index.build(dataset, "bigevent", bitsperkey=10)
+            assert bigindex.unsigned and not eventindex.unsigned
+            assert bigindex.basket_min.tolist() == [2**63 + x for x in eventindex.basket_min.tolist()]
+            bigindex.tofile(path)
+            assert uproot_skyhook.layout.keyindexfromfile(path) == bigindex
+            assert uproot_skyhook.layout.keyindexfromfile(path).basket_max.tolist() == bigindex.basket_max.tolist()
+            assert uproot_skyhook.index.lookup(bigindex, 2**63 + 1030) == [(0, 20), (60, 80), (100, 120), (160, 180)]
+            assert uproot_skyhook.index.lookup(bigindex, 2**63 + 1031) == []
+            assert uproot_skyhook.index.lookup(bigindex, 1030) == []
+            assert uproot_skyhook.index.lookup(bigindex, -5, 2**63 + 1002) == [(0, 20), (40, 60), (100, 120), (140, 160)]
+            assert uproot_skyhook.index.entries(dataset, bigindex, 2**63 + 1030).tolist() == [10, 60, 110, 160]
+            assert uproot_skyhook.index.entries(dataset, bigindex, 2**64).tolist() == []
+
+            # per-file KeyIndexes combine into one for the Dataset
+            halves = [Dataset("dataset", "treepath", dataset.colnames, dataset.columns, [x], [0, 100]) for x in dataset.files]
+            combined = uproot_skyhook.index.concatenate([uproot_skyhook.index.build(x, "event", bitsperkey=10) for x in halves], dataset.global_offsets)
+            assert combined == eventindex
+            self.assertRaises(ValueError, lambda: uproot_skyhook.index.concatenate([eventindex, runindex], [0, 100, 200]))
+
+            self.assertRaises(ValueError, lambda: uproot_skyhook.index.build(dataset, "x"))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_analyze_keyindex(self):
+        import uproot_skyhook.analyze
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "keys.root")
+            with uproot.recreate(path, compression=uproot.ZLIB(1)) as file:
+                file["tree"] = uproot.newtree({"run": "int32", "event": "int64"})
+                for i in range(3):
+                    file["tree"].extend({"run": numpy.full(100, i + 1, dtype=numpy.int32), "event": numpy.arange(100, dtype=numpy.int64) + 100*i})
+
+            dataset = uproot_skyhook.analyze.file("dataset", path, "tree")
+            assert isinstance(dataset, uproot_skyhook.layout.Dataset)
+            eventindex = uproot_skyhook.analyze.keyindex(path, "tree", "event", bitsperkey=10)
+            runindex = uproot_skyhook.analyze.keyindex(path, "tree", "run")
+            assert runindex.basket_min.tolist() == [1, 2, 3]
+            assert eventindex == uproot_skyhook.index.build(dataset, "event", bitsperkey=10)
+            assert runindex == uproot_skyhook.index.build(dataset, "run")
+
+            both = dataset + dataset
+            combined = uproot_skyhook.index.concatenate([eventindex] * 2, both.global_offsets)
+            assert uproot_skyhook.index.entries(both, combined, 150).tolist() == [150, 450]
+            self.assertRaises(ValueError, lambda: uproot_skyhook.analyze.keyindex(path, "tree", "nope"))
+        finally:
+            shutil.rmtree(directory)
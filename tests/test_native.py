@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# 
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import struct
+import unittest
+
+import numpy
+
+import uproot_skyhook.native
+
+class Test(unittest.TestCase):
+    def runTest(self):
+        pass
+
+    def deliver(self, interp, data, entrystart, entrystop):
+        numentries = entrystop - entrystart
+        source = interp.fromroot(data, None, entrystart, entrystop)
+        numitems = interp.source_numitems(source)
+        destination = interp.destination(numitems, numentries)
+        interp.fill(source, destination, 0, numitems, 0, numentries)
+        return interp.finalize(interp.clip(destination, 0, numitems, 0, numentries), None)
+
+    def test_double32(self):
+        interp = uproot_skyhook.native.asdouble32(-10.0, 10.0, 12)
+        raw = numpy.array([0, 1, 2048, 4095, 100, 4000], dtype=">u4")
+        expected = raw.astype(numpy.float64) * (20.0 / (1 << 12)) - 10.0
+        assert numpy.array_equal(self.deliver(interp, raw.view(numpy.uint8), 0, 6), expected)
+        assert numpy.array_equal(self.deliver(interp, raw.view(numpy.uint8), 2, 5), expected[2:5])
+
+    def test_double32_dims(self):
+        interp = uproot_skyhook.native.asdouble32(0.0, 1.0, 8, (3,))
+        raw = numpy.arange(12, dtype=">u4")
+        expected = (raw.astype(numpy.float64) / 256.0).reshape(-1, 3)
+        assert numpy.array_equal(self.deliver(interp, raw.view(numpy.uint8), 1, 3), expected[1:3])
+
+    def test_double32_truncated(self):
+        numbits = 14
+        values = numpy.array([1.0, -2.5, 3.140625, 1024.0, -0.125], dtype=numpy.float32)
+        raw = b""
+        for x in values:
+            intvalue = struct.unpack(">I", struct.pack(">f", x))[0]
+            exponent = (intvalue >> 23) & 0xff
+            mantissa = (intvalue >> (23 - numbits)) & ((1 << numbits) - 1)
+            if x < 0:
+                mantissa |= 1 << (numbits + 1)
+            raw += struct.pack(">BH", exponent, mantissa)
+        interp = uproot_skyhook.native.asdouble32(0.0, 0.0, numbits)
+        assert numpy.array_equal(self.deliver(interp, numpy.frombuffer(raw, dtype=numpy.uint8), 0, 5), values.astype(numpy.float64))
+
+    def test_stlbitset(self):
+        interp = uproot_skyhook.native.asstlbitset(5)
+        bits = numpy.array([[1, 0, 0, 1, 1], [0, 0, 0, 0, 0], [1, 1, 1, 1, 1]], dtype=numpy.uint8)
+        data = numpy.hstack([numpy.full((3, 4), 255, dtype=numpy.uint8), bits]).reshape(-1)
+        assert numpy.array_equal(self.deliver(interp, data, 0, 3), bits.astype(numpy.bool_))
+        assert numpy.array_equal(self.deliver(interp, data, 1, 3), bits[1:].astype(numpy.bool_))
+
+    def test_concatenate(self):
+        one = uproot_skyhook.native.StringArray.fromcounts([3, 0, 2], numpy.frombuffer(b"onexx", dtype=numpy.uint8))[1:]
+        two = uproot_skyhook.native.StringArray.fromcounts([1], numpy.frombuffer(b"z", dtype=numpy.uint8))
+        out = uproot_skyhook.native.concatenate([one, two])
+        assert isinstance(out, uproot_skyhook.native.StringArray)
+        assert out.tolist() == [b"", b"xx", b"z"]
+        assert uproot_skyhook.native.concatenate([numpy.arange(3), numpy.arange(2)]).tolist() == [0, 1, 2, 0, 1]
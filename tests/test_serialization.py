@@ -28,6 +28,10 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
+import pickle
+import shutil
+import tempfile
 import unittest
 
 import numpy
@@ -64,12 +68,251 @@ class Test(unittest.TestCase):
         deserialized = uproot_skyhook.layout.frombuffer(serialized)
         assert deserialized == dataset
 
+    def test_dataset_colindex(self):
+        from uproot_skyhook.layout import zlib, Branch, File, Column, Dataset
+        from uproot import asdtype
+
+        branch = Branch([0, 1000], [12345], zlib, [True], [100], [200], [0, 1], [12], None)
+        dataset = Dataset("dataset", "treepath", ["one", "two"], [Column(asdtype(float)), Column(asdtype(int))], [File("file1", b"abbacdbad", [branch, branch])], [0, 1000])
+        deserialized = uproot_skyhook.layout.frombuffer(dataset.tobuffer())
+        assert deserialized.colindex == {"one": 0, "two": 1}
+
+        deserialized.colnames = ["two", "one"]
+        assert deserialized.colindex == {"two": 0, "one": 1}
+
+    def test_dataset_bulk(self):
+        from uproot_skyhook.layout import zlib, Branch, File, Column, Dataset
+        from uproot import asdtype
+
+        files = []
+        for i in range(20):
+            branches = [Branch([0, 100, 1000], [123 + i, 1234 + i], zlib, [True, False], [100, 100], [200, 200], [0, 1, 2], None, None),
+                        Branch([0, 1000], [12345 + i], zlib, [True], [100], [200], [0, 1], None, None)]
+            files.append(File("file{0}".format(i), b"abbacdbad", branches))
+        dataset = Dataset("dataset", "treepath", ["one", "two"], [Column(asdtype(float)), Column(asdtype(int))], files, numpy.arange(0, 21000, 1000))
+
+        buffer = dataset.tobuffer()
+        one = uproot_skyhook.layout.frombuffer(buffer)
+        two = uproot_skyhook.layout.frombuffer(buffer)
+        assert one.colnames.tolist() == ["one", "two"]
+        assert [x.location for x in one.files[5:8]] == ["file5", "file6", "file7"]
+        assert one.files.materialize()[19].branches.tolist()[1].page_seeks.tolist() == [12345 + 19]
+        assert one.files == two.files
+        assert one == two
+        assert one == dataset
+        assert uproot_skyhook.layout.frombuffer(bytearray(buffer)) == two
+
+        two.files[3].location = "changed"
+        assert one.files[3] != two.files[3]
+        assert one.files != two.files
+
+        # iteration materializes one chunk at a time
+        three = uproot_skyhook.layout.frombuffer(buffer)
+        three.files.chunksize = 8
+        iterator = iter(three.files)
+        assert next(iterator).location == "file0"
+        assert sum(x is not None for x in three.files._got) == 8
+        assert [x.location for x in iterator] == ["file{0}".format(i) for i in range(1, 20)]
+
+    def test_dataset_shared(self):
+        from uproot_skyhook.layout import zlib, Branch, File, Column, Dataset
+        from uproot import asdtype
+
+        files = []
+        for i in range(20):
+            branches = [Branch([0, 100, 1000], [123 + i, 1234 + i], zlib, [True, False], [100, 100], [200, 200], [0, 1, 2], None, None) for j in range(5)]
+            files.append(File("file{0}".format(i), b"abbacdbad", branches))
+        dataset = Dataset("dataset", "treepath", ["c{0}".format(j) for j in range(5)], [Column(asdtype(">f4")) for j in range(5)], files, numpy.arange(0, 21000, 1000))
+
+        shared = dataset.tobuffer()
+        assert len(shared) < sum(x.nbytes for f in files for b in f.branches for x in (b.local_offsets, b.page_seeks, b.compressedbytes, b.uncompressedbytes))
+
+        deserialized = uproot_skyhook.layout.frombuffer(shared)
+        assert deserialized == dataset
+        assert deserialized.files[13].branches[4].page_seeks.tolist() == [123 + 13, 1234 + 13]
+        assert deserialized.columnar(3).page_seeks.tolist() == dataset.columnar(3).page_seeks.tolist()
+        assert uproot_skyhook.layout.frombuffer(dataset.tobuffer(compact=True)) == dataset
+
+    def test_dataset_shards(self):
+        from uproot_skyhook.layout import zlib, lzma, Branch, File, Column, Dataset
+        from uproot import asdtype
+
+        files = []
+        for i in range(25):
+            branches = [Branch([0, 100, 1000], [123 + i, 1234 + i], zlib, [True, False], [100, 100], [200, 200], [0, 1, 2], None, None),
+                        Branch([0, 1000], [12345 + i], lzma, [True], [100], [200], [0, 1], [10 + i], None)]
+            files.append(File("file{0}".format(i), b"abbacdbad", branches))
+        dataset = Dataset("dataset", "treepath", ["one", "two"], [Column(asdtype(float)), Column(asdtype(int))], files, numpy.arange(0, 26000, 1000))
+
+        directory = tempfile.mkdtemp()
+        try:
+            sharded = uproot_skyhook.layout.toshards(directory, "dataset", "treepath", ["one", "two"], [Column(asdtype(float)), Column(asdtype(int))], iter(files), filespershard=10)
+            assert sorted(os.listdir(directory)) == ["index.rootlayout", "shard-000000.rootlayout", "shard-000001.rootlayout", "shard-000002.rootlayout"]
+            assert sharded.global_offsets.tolist() == dataset.global_offsets.tolist()
+            assert sharded._shards._shards == [None, None, None]
+            assert sharded.files[13].branches[1].page_seeks.tolist() == [12345 + 13]
+            assert [x is not None for x in sharded._shards._shards] == [False, True, False]
+            assert numpy.shares_memory(sharded.files[13].branches[1].page_seeks, sharded._columnpiece(1, 1).page_seeks)
+
+            assert sharded == dataset
+            assert uproot_skyhook.layout.fromshards(directory) == sharded
+            for colindex in range(2):
+                one, two = sharded.columnar(colindex), dataset.columnar(colindex)
+                for name in ("basket_offsets", "page_offsets", "local_offsets", "page_seeks", "compressedbytes", "basket_keylens", "haskeylens"):
+                    assert getattr(one, name).tolist() == getattr(two, name).tolist()
+            assert sharded.tocolumnar() == dataset
+
+            unpickled = pickle.loads(pickle.dumps(uproot_skyhook.layout.fromshards(directory)))
+            assert unpickled._shards._shards == [None, None, None]
+            assert unpickled == dataset
+
+            resharded = uproot_skyhook.layout.fromfile(os.path.join(directory, "index.rootlayout")).toshards(os.path.join(directory, "again"), filespershard=100)
+            assert len(resharded._shards) == 1
+            assert resharded == dataset
+        finally:
+            shutil.rmtree(directory)
+
+    def test_dataset_select(self):
+        from uproot_skyhook.layout import none, zlib, lzma, Branch, File, Column, Dataset
+        from uproot import asdtype
+
+        files = [File("file1", b"abbacdbad", [Branch([0, 100, 1000], [123, 1234], zlib, [True, False], [100, 100], [200, 200], [0, 1, 2], [12, 13], None),
+                                              Branch([0, 1000], [12345], none, None, None, [200], [0, 1], None, None)]),
+                 File("file2", b"decafcafe", [Branch([0, 200, 400, 500], [11, 22, 33], zlib, [True, True, True], [10, 20, 30], [40, 50, 60], [0, 1, 2, 3], [1, 2, 3], None),
+                                              Branch([0, 10, 500], [123456, 1234567, 12345678], lzma, [False, True, True], [100, 100, 50], [100, 200, 300], [0, 1, 3], [12, 13], [125, 150])]),
+                 File("file3", b"deadbeef", [Branch([0, 300], [99], none, None, None, [400], [0, 1], None, None),
+                                             Branch([0, 300], [999], zlib, [True], [40], [400], [0, 1], [14], [200])])]
+        dataset = Dataset("dataset", "treepath", ["one", "two"], [Column(asdtype(float)), Column(asdtype(int))], files, [0, 1000, 1500, 1800])
+
+        assert dataset.select() == dataset
+        assert dataset.select(["two", "one"]).colnames == ["two", "one"]
+
+        selected = dataset.select(["two"], 1005, 1600)
+        assert selected.entryoffset == 1000
+        assert [x.location for x in selected.files] == ["file2", "file3"]
+        assert selected.global_offsets.tolist() == [0, 500, 800]
+        assert selected.files[0].branches == [files[1].branches[1]]
+
+        trimmed = dataset.select(["one"], 1250, 1450, trim=True)
+        assert trimmed.entryoffset == 1250
+        assert [x.location for x in trimmed.files] == ["file2"]
+        assert trimmed.global_offsets.tolist() == [0, 200]
+        assert trimmed.files[0].entrystart == 250
+        branch = trimmed.files[0].branches[0]
+        assert branch.local_offsets.tolist() == [200, 400, 500]
+        assert branch.page_seeks.tolist() == [22, 33]
+        assert branch.compressedbytes.tolist() == [20, 30]
+        assert branch.basket_page_offsets.tolist() == [0, 1, 2]
+        assert branch.basket_keylens.tolist() == [2, 3]
+        assert uproot_skyhook.layout.frombuffer(trimmed.tobuffer()) == trimmed
+        assert uproot_skyhook.layout.frombuffer(trimmed.tobuffer()).files[0].entrystart == 250
+
+        trimmed = dataset.select(["two"], 1005, 1600, trim=True)
+        assert trimmed.global_offsets.tolist() == [0, 495, 595]
+        assert [x.entrystart for x in trimmed.files] == [5, 0]
+        assert trimmed.files[0].branches[0].page_seeks.tolist() == [123456, 1234567, 12345678]
+        assert trimmed.files[1].branches[0].page_seeks.tolist() == [999]
+        assert trimmed.select(entrystart=100, entrystop=200, trim=True).files[0].entrystart == 105
+
+        assert len(dataset.select(entrystart=500, entrystop=500).files) == 0
+        self.assertRaises(ValueError, lambda: dataset.select(["three"]))
+
+    def test_dataset_pickle(self):
+        from uproot_skyhook.layout import zlib, Branch, File, Column, Dataset
+        from uproot import asdtype
+
+        files = [File("file{0}".format(i), b"abbacdbad", [Branch([0, 100, 1000], [123 + i, 1234 + i], zlib, [True, False], [100, 100], [200, 200], [0, 1, 2], None, None)]) for i in range(10)]
+        dataset = Dataset("dataset", "treepath", ["one"], [Column(asdtype(float), title="first")], files, numpy.arange(0, 11000, 1000))
+        deserialized = uproot_skyhook.layout.frombuffer(dataset.tonumpy())
+
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            for x in (dataset, deserialized, files[3], files[3].branches[0], dataset.columns[0], deserialized.files[3], deserialized.files[3].branches[0], deserialized.columns[0]):
+                y = pickle.loads(pickle.dumps(x, protocol))
+                assert "_files" not in y.__dict__ and "_branches" not in y.__dict__ and "_local_offsets" not in y.__dict__
+                assert type(y) is type(x) and y == x
+
+        copy = pickle.loads(pickle.dumps(deserialized, 2))
+        assert copy == deserialized and copy._unmodified()
+        copy.files[3].location = "changed"
+        assert copy != deserialized
+        assert pickle.loads(pickle.dumps(copy, 2)).files[3].location == "changed"
+
+        if pickle.HIGHEST_PROTOCOL >= 5:
+            buffers = []
+            data = pickle.dumps(deserialized, 5, buffer_callback=buffers.append)
+            assert len(buffers) == 1 and len(data) < 1000
+            assert buffers[0].raw().nbytes == len(deserialized.tonumpy())
+            assert pickle.loads(data, buffers=buffers) == dataset
+
+    def test_dataset_columnar(self):
+        from uproot_skyhook.layout import none, zlib, lzma, Branch, File, Column, Dataset
+        from uproot import asdtype
+
+        files = [File("file1", b"abbacdbad", [Branch([0, 100, 1000], [123, 1234], zlib, [True, False], [100, 100], [200, 200], [0, 1, 2], [12, 13], None),
+                                              Branch([0, 1000], [12345], none, None, None, [200], [0, 1], None, None)]),
+                 File("file2", b"decafcafe", [Branch.empty(),
+                                              Branch([0, 10, 500], [123456, 1234567, 12345678], lzma, [False, True, True], [100, 100, 50], [100, 200, 300], [0, 1, 3], [12, 13], [125, 150])]),
+                 File("file3", b"deadbeef", [Branch([0, 300], [99], none, None, None, [400], [0, 1], None, None),
+                                             Branch([0, 300], [999], zlib, [True], [40], [400], [0, 1], [14], [200])])]
+        dataset = Dataset("dataset", "treepath", ["one", "two"], [Column(asdtype(float)), Column(asdtype(int))], files, [0, 1000, 1500, 1800])
+        deserialized = uproot_skyhook.layout.frombuffer(dataset.tobuffer())
+
+        for colindex in range(2):
+            one = dataset.columnar(colindex)
+            two = deserialized.columnar(colindex)
+            for name in ("compression", "basket_offsets", "page_offsets", "local_offsets", "page_seeks", "iscompressed", "compressedbytes", "uncompressedbytes", "basket_page_offsets", "haskeylens", "basket_keylens", "hasborders", "basket_data_borders"):
+                assert numpy.array_equal(getattr(one, name), getattr(two, name))
+
+        assert deserialized.files[2].branches[1] == files[2].branches[1]
+        assert numpy.shares_memory(deserialized.files[2].branches[1].page_seeks, deserialized.columnar(1).page_seeks)
+
+        columnar = deserialized.tocolumnar()
+        assert columnar == dataset
+        assert numpy.shares_memory(columnar.files[1].branches[1].page_seeks, columnar.columnar(1).page_seeks)
+
+        assert deserialized.columnar(1).file_uncompressedbytes().tolist() == [200, 600, 400]
+        assert deserialized.columnar(1).basket_uncompressedbytes().tolist() == [200, 100, 500, 400]
+        starts, stops = deserialized.columnar(1).basket_entries(deserialized.global_offsets)
+        assert starts.tolist() == [0, 1000, 1010, 1500]
+        assert stops.tolist() == [1000, 1010, 1500, 1800]
+
     def roundtrip_interp(self, interp):
         builder = flatbuffers.Builder(1024)
         builder.Finish(uproot_skyhook.interpretation.toflatbuffers(builder, interp))
         serialized = builder.Output()
         assert uproot_skyhook.interpretation.frombuffer(serialized).identifier == interp.identifier
 
+    def test_dataset_compact(self):
+        from uproot_skyhook.layout import zlib, Branch, File, Column, Dataset
+        from uproot import asdtype
+
+        files = []
+        for i in range(20):
+            local_offsets = numpy.arange(0, 10000 * (i + 1), 1000)
+            numbaskets = len(local_offsets) - 1
+            page_seeks = 1000 + numpy.cumsum(numpy.full(numbaskets, 4321 + i))
+            compressedbytes = numpy.full(numbaskets, 4000 + i)
+            branches = [Branch(local_offsets, page_seeks, zlib, [True] * numbaskets, compressedbytes, [8000] * numbaskets, numpy.arange(numbaskets + 1), None, None)]
+            files.append(File("file{0}".format(i), b"abbacdbad", branches))
+        # too short to pack, and page_seeks out of order
+        files.append(File("short", b"abbacdbad", [Branch([0, 1000], [123], zlib, [True], [4000], [8000], [0, 1], None, None)]))
+        page_seeks = numpy.tile(numpy.array([2**40, 5, 2**33], dtype=numpy.uint64), 10)
+        files.append(File("unordered", b"abbacdbad", [Branch(numpy.arange(0, 31000, 1000), page_seeks, zlib, [True] * 30, [4000] * 30, [8000] * 30, numpy.arange(31), None, None)]))
+        dataset = Dataset("dataset", "treepath", ["one"], [Column(asdtype(float))], files, numpy.concatenate([[0], numpy.cumsum([x.branches[0].numentries for x in files])]))
+
+        plain = dataset.tobuffer()
+        compact = dataset.tobuffer(compact=True)
+        assert len(compact) < len(plain)
+
+        one = uproot_skyhook.layout.frombuffer(plain)
+        two = uproot_skyhook.layout.frombuffer(compact)
+        assert one.files.tolist() == two.files.tolist()
+        assert two.files[7].branches[0].page_seeks.tolist() == files[7].branches[0].page_seeks.tolist()
+        assert two.files[7].branches[0].compressedbytes.tolist() == files[7].branches[0].compressedbytes.tolist()
+        assert two.columnar(0).page_seeks.tolist() == one.columnar(0).page_seeks.tolist()
+        for name in "local_offsets", "page_seeks", "compressedbytes", "uncompressedbytes", "basket_page_offsets", "basket_offsets", "page_offsets":
+            assert getattr(two.columnar(0), name).tolist() == getattr(dataset.columnar(0), name).tolist()
+
     def test_serialization_asdtype_flat(self):
         self.roundtrip_interp(uproot.asdtype(numpy.bool_))
         self.roundtrip_interp(uproot.asdtype("i1"))
@@ -32,6 +32,8 @@ import numpy
 import uproot
 
 import uproot_skyhook.layout
+import uproot_skyhook.codec
+import uproot_skyhook.index
 
 def file(name, filepath, treepath, location_prefix=None, localsource=uproot.MemmapSource.defaults, xrootdsource=uproot.XRootDSource.defaults, httpsource=uproot.HTTPSource.defaults, **options):
     fullfilepath = filepath if location_prefix is None else location_prefix + filepath
@@ -53,6 +55,7 @@ def file(name, filepath, treepath, location_prefix=None, localsource=uproot.Memm
         iscompressed = numpy.empty(uprootbranch.numbaskets, dtype=numpy.bool_)
         compressedbytes = numpy.empty(uprootbranch.numbaskets, dtype="<u4")
         uncompressedbytes = numpy.empty(uprootbranch.numbaskets, dtype="<u4")
+        page_compression = numpy.zeros(uprootbranch.numbaskets, dtype=numpy.uint8)
         basket_page_offsets = numpy.empty(uprootbranch.numbaskets + 1, dtype="<u4")
         basket_page_offsets[0] = 0
         basket_keylens = numpy.zeros(uprootbranch.numbaskets, dtype="<u4")
@@ -70,6 +73,7 @@ def file(name, filepath, treepath, location_prefix=None, localsource=uproot.Memm
                 pagei = basket_page_offsets[i]
                 page_seeks[pagei] = cursor.index
                 iscompressed[pagei] = False
+                page_compression[pagei] = uproot_skyhook.layout.none.value
                 compressedbytes[pagei] = basket_compressedbytes
                 uncompressedbytes[pagei] = basket_uncompressedbytes
                 pagei += 1
@@ -84,32 +88,25 @@ def file(name, filepath, treepath, location_prefix=None, localsource=uproot.Memm
                     page_compressedbytes = c1 + (c2 << 8) + (c3 << 16)
                     page_uncompressedbytes = u1 + (u2 << 8) + (u3 << 16)
                     total_compressedbytes += 9 + page_compressedbytes
-                    if algo == b"ZL":
-                        if compression is not None and compression != uproot_skyhook.layout.zlib:
-                            raise ValueError("different compression used by different baskets")
-                        compression = uproot_skyhook.layout.zlib
-                    elif algo == b"XZ":
-                        if compression is not None and compression != uproot_skyhook.layout.lzma:
-                            raise ValueError("different compression used by different baskets")
-                        compression = uproot_skyhook.layout.lzma
-                    elif algo == b"L4":
-                        if compression is not None and compression != uproot_skyhook.layout.lz4:
-                            raise ValueError("different compression used by different baskets")
-                        compression = uproot_skyhook.layout.lz4
-                        cursor.skip(8)
-                        page_compressedbytes -= 8
-                    elif algo == b"CS":
+                    if algo == b"CS":
                         raise ValueError("unsupported compression algorithm: 'old' (according to ROOT comments, hasn't been used in 20+ years!)")
-                    
+                    codec = uproot_skyhook.codec.fromalgorithm(algo)
+                    if compression is None:
+                        compression = codec.compression
+                    cursor.skip(codec.skipbytes)
+                    page_compressedbytes -= codec.skipbytes
+
                     # extremely rare, though possible, for numpages > numbaskets
                     if pagei >= len(page_seeks):
                         page_seeks = numpy.resize(page_seeks, int(len(page_seeks)*1.2))
                         iscompressed = numpy.resize(iscompressed, int(len(iscompressed)*1.2))
                         compressedbytes = numpy.resize(compressedbytes, int(len(compressedbytes)*1.2))
                         uncompressedbytes = numpy.resize(uncompressedbytes, int(len(uncompressedbytes)*1.2))
+                        page_compression = numpy.resize(page_compression, int(len(page_compression)*1.2))
 
                     page_seeks[pagei] = cursor.index
                     iscompressed[pagei] = True
+                    page_compression[pagei] = codec.compression.value
                     compressedbytes[pagei] = page_compressedbytes
                     uncompressedbytes[pagei] = page_uncompressedbytes
                     pagei += 1
@@ -129,6 +126,7 @@ def file(name, filepath, treepath, location_prefix=None, localsource=uproot.Memm
             iscompressed = iscompressed[:basket_page_offsets[-1]].copy()
             compressedbytes = compressedbytes[:basket_page_offsets[-1]].copy()
             uncompressedbytes = uncompressedbytes[:basket_page_offsets[-1]].copy()
+            page_compression = page_compression[:basket_page_offsets[-1]].copy()
 
         if (basket_data_borders == 0).all():
             basket_keylens = None
@@ -139,10 +137,32 @@ def file(name, filepath, treepath, location_prefix=None, localsource=uproot.Memm
             iscompressed = None
             compressedbytes = None
 
+        # ROOT may switch algorithms between baskets (e.g. after fast-merging files); only then keep one per page
+        if compression == uproot_skyhook.layout.none or (page_compression[iscompressed] == compression.value).all():
+            page_compression = None
+
         colnames.append(branchname.decode("utf-8"))
         columns.append(uproot_skyhook.layout.Column(uprootbranch.interpretation, None if uprootbranch.title == b"" or uprootbranch.title is None else uprootbranch.title.decode("utf-8")))
-        branches.append(uproot_skyhook.layout.Branch(local_offsets, page_seeks, compression, iscompressed, compressedbytes, uncompressedbytes, basket_page_offsets, basket_keylens, basket_data_borders))
+        branches.append(uproot_skyhook.layout.Branch(local_offsets, page_seeks, compression, iscompressed, compressedbytes, uncompressedbytes, basket_page_offsets, basket_keylens, basket_data_borders, page_compression))
         numentries = max(numentries, branches[-1].local_offsets[-1])
         
     file = uproot_skyhook.layout.File(filepath, uprootfile._context.tfile["_fUUID"], branches)
     return uproot_skyhook.layout.Dataset(name, treepath, colnames, columns, [file], [0, numentries], location_prefix=location_prefix)
+
+def keyindex(filepath, treepath, colname, bitsperkey=0, location_prefix=None, localsource=uproot.MemmapSource.defaults, xrootdsource=uproot.XRootDSource.defaults, httpsource=uproot.HTTPSource.defaults, **options):
+    # a KeyIndex of one file's column, from its baskets as uproot reads them (so from any source uproot
+    # can open), with the entry numbers of file(...)'s Dataset; index.concatenate combines those of
+    # files whose Datasets are added together
+    fullfilepath = filepath if location_prefix is None else location_prefix + filepath
+    uprootfile = uproot.open(fullfilepath, localsource=localsource, xrootdsource=xrootdsource, httpsource=httpsource, **options)
+
+    for branchname, uprootbranch in uprootfile[treepath].iteritems(recursive=True):
+        if branchname.decode("utf-8") == colname:
+            break
+    else:
+        raise ValueError("colname not recognized: {0}".format(repr(colname)))
+
+    unsigned = uproot_skyhook.index._keycolumn(uproot_skyhook.layout.Column(uprootbranch.interpretation).native)
+    local_offsets = uprootbranch._fBasketEntry[: uprootbranch.numbaskets + 1]
+    baskets = ((local_offsets[i], local_offsets[i + 1], uprootbranch.basket(i)) for i in range(uprootbranch.numbaskets))
+    return uproot_skyhook.index._fromkeys(colname, unsigned, baskets, bitsperkey)
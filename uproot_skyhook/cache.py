@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Persistent caches in a local directory: ArrayCache for delivered arrays and PageCache for compressed
+# pages. Writes are atomic renames, readers keep unlinked files open, and recency is the files' mtime,
+# so processes may share a directory; least recently used entries are evicted beyond limitbytes.
+
+import os
+import hashlib
+import tempfile
+
+import numpy
+
+import uproot_skyhook.native
+
+def _key(*fields):
+    out = hashlib.sha1()
+    for x in fields:
+        out.update(x if isinstance(x, bytes) else x.encode("utf-8"))
+        out.update(b"\x00")
+    return out.hexdigest()
+
+class DirectoryCache(object):
+    suffix = None       # of this kind's files; an entry is all files whose names start with its key
+
+    def __init__(self, directory, limitbytes):
+        self.directory = directory
+        self.limitbytes = limitbytes
+        self._numbytes = None      # running total since the last scan of the directory
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+    def _write(self, path, write):
+        # write(file) fills a temporary file, which then replaces path all at once
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                write(file)
+            os.rename(tmppath, path)
+        except (IOError, OSError):
+            os.remove(tmppath)
+            raise
+
+    def _added(self, numbytes):
+        # the directory is scanned once, then only when the running total (which doesn't see other
+        # processes' writes or replaced entries) goes over limitbytes
+        if self._numbytes is None:
+            self._numbytes = self.numbytes()
+        else:
+            self._numbytes += numbytes
+        if self._numbytes > self.limitbytes:
+            self.evict()
+
+    def entries(self):
+        # (last used, numbytes, paths) for each key
+        out = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                lastused, numbytes, paths = out.get(name.split(".")[0], (0, 0, []))
+                out[name.split(".")[0]] = (max(lastused, stat.st_mtime), numbytes + stat.st_size, paths + [path])
+        return list(out.values())
+
+    def numbytes(self):
+        return sum(numbytes for lastused, numbytes, paths in self.entries())
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(numbytes for lastused, numbytes, paths in entries)
+        for lastused, numbytes, paths in entries:
+            if total <= self.limitbytes:
+                break
+            for path in sorted(paths, reverse=True):     # ArrayCache: offsets before content
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= numbytes
+        self._numbytes = total
+
+class ArrayCache(DirectoryCache):
+    # one entry per file, column, interpretation and entry range, so that arrays over many files are
+    # assembled from per-file pieces; .npy files (offsets and content for jagged), loaded as memory maps
+    suffix = ".npy"
+
+    @staticmethod
+    def key(uuid, colname, identifier, entrystart, entrystop):
+        # entrystart and entrystop are local to the file
+        return _key(uuid, colname, identifier, str(entrystart), str(entrystop))
+
+    def _paths(self, key, jagged):
+        if jagged:
+            return [os.path.join(self.directory, key + ".content.npy"), os.path.join(self.directory, key + ".offsets.npy")]
+        else:
+            return [os.path.join(self.directory, key + ".npy")]
+
+    def get(self, key, cls=numpy.ndarray):
+        # cls is the type that finalize returns; None if the entry is missing
+        jagged = issubclass(cls, uproot_skyhook.native.JaggedArray)
+        paths = self._paths(key, jagged)
+        try:
+            arrays = [numpy.load(x, mmap_mode="r") for x in paths]
+            for x in paths:
+                os.utime(x, None)      # most recently used
+        except (IOError, OSError):
+            return None
+        if jagged:
+            return cls(arrays[1], arrays[0])
+        else:
+            return arrays[0]
+
+    def put(self, key, array):
+        if isinstance(array, uproot_skyhook.native.JaggedArray):
+            arrays = [array.content[array.offsets[0] : array.offsets[-1]], array.offsets - array.offsets[0]]
+            paths = self._paths(key, True)     # content first: an entry exists once its offsets do
+        else:
+            arrays = [array]
+            paths = self._paths(key, False)
+        if sum(x.nbytes for x in arrays) > self.limitbytes:
+            return
+
+        for x, path in zip(arrays, paths):
+            self._write(path, lambda file: numpy.save(file, numpy.ascontiguousarray(x)))
+
+        self._added(sum(x.nbytes for x in arrays))
+
+class PageCache(DirectoryCache):
+    # compressed page bytes by file UUID and page_seek, for storage much slower than local disk
+    suffix = ".page"
+
+    @staticmethod
+    def key(uuid, page_seek):
+        return _key(uuid, str(page_seek))
+
+    def has(self, key):
+        return os.path.exists(os.path.join(self.directory, key + self.suffix))
+
+    def get(self, key):
+        path = os.path.join(self.directory, key + self.suffix)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return numpy.frombuffer(data, dtype=numpy.uint8)
+
+    def put(self, key, data):
+        if len(data) > self.limitbytes:
+            return
+        self._write(os.path.join(self.directory, key + self.suffix), lambda file: file.write(numpy.asarray(data, dtype=numpy.uint8).tobytes()))
+        self._added(len(data))
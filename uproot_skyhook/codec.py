@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Decompressors for each Compression, shared by analyze (which recognizes ROOT's algorithm tags)
+# and deliver (which decompresses pages). Codec modules are only imported when first used.
+
+import zlib as zlib_
+
+import numpy
+
+import uproot_skyhook.layout
+
+class Codec(object):
+    def __init__(self, compression, algorithm, decompress, skipbytes=0, partial=None):
+        self.compression = compression
+        self.algorithm = algorithm       # ROOT's two-byte tag in each compressed page's header
+        self.decompress = decompress     # (compressed bytes, uncompressed size) -> numpy.uint8 array
+        self.skipbytes = skipbytes       # bytes after the header that are not part of the compressed data
+        self.partial = partial           # (compressed bytes, limit) -> first limit bytes, or None if the format can't stop early
+
+    def __repr__(self):
+        return "<Codec {0} ({1})>".format(self.compression.name, repr(self.algorithm))
+
+registry = {}
+algorithms = {}
+
+def register(compression, algorithm, decompress, skipbytes=0, partial=None):
+    codec = Codec(compression, algorithm, decompress, skipbytes, partial)
+    registry[compression] = codec
+    algorithms[algorithm] = codec
+    return codec
+
+def get(compression):
+    codec = registry.get(compression, None)
+    if codec is None:
+        raise ValueError("no codec registered for compression {0}".format(repr(compression)))
+    return codec
+
+def fromalgorithm(algorithm):
+    codec = algorithms.get(algorithm, None)
+    if codec is None:
+        raise ValueError("unsupported compression algorithm: {0}".format(repr(algorithm)))
+    return codec
+
+def decompress(compression, data, uncompressedbytes, limit=None):
+    # if limit is given, only the first limit bytes are needed (more may be returned)
+    codec = get(compression)
+    if limit is not None and limit < uncompressedbytes and codec.partial is not None:
+        return codec.partial(data, limit)
+    else:
+        return codec.decompress(data, uncompressedbytes)
+
+# DEFLATE implementations for zlib pages, fastest first: libdeflate and isal decode the same bytes
+# two to three times faster than the standard library. Each loader raises ImportError if not installed.
+
+def _zlib_isal():
+    import isal.isal_zlib
+    return lambda data, uncompressedbytes: isal.isal_zlib.decompress(data, bufsize=uncompressedbytes)
+
+def _zlib_libdeflate():
+    import deflate
+    return deflate.zlib_decompress
+
+def _zlib_stdlib():
+    return lambda data, uncompressedbytes: zlib_.decompress(data, zlib_.MAX_WBITS, uncompressedbytes)
+
+zlib_backends = [("libdeflate", _zlib_libdeflate), ("isal", _zlib_isal), ("zlib", _zlib_stdlib)]
+
+_zlibbackend = None
+
+def zlibbackend(name=None):
+    # selects the named backend, or the first importable one if None; returns its name
+    global _zlibbackend
+    for backendname, loader in zlib_backends:
+        if name is None or name == backendname:
+            try:
+                _zlibbackend = (backendname, loader())
+            except ImportError:
+                if name is not None:
+                    raise
+            else:
+                return backendname
+    raise ValueError("unrecognized zlib backend: {0}".format(repr(name)))
+
+def _zlib(data, uncompressedbytes):
+    if _zlibbackend is None:
+        zlibbackend()
+    return numpy.frombuffer(_zlibbackend[1](data, uncompressedbytes), dtype=numpy.uint8)
+
+def _zlib_partial(data, limit):
+    # streaming decompression stops producing output (and consuming input) at max_length
+    return numpy.frombuffer(zlib_.decompressobj().decompress(data, limit), dtype=numpy.uint8)
+
+def _lzma(data, uncompressedbytes):
+    try:
+        import lzma
+    except ImportError:
+        import backports.lzma as lzma
+    return numpy.frombuffer(lzma.decompress(data), dtype=numpy.uint8)
+
+def _lzma_partial(data, limit):
+    try:
+        import lzma
+    except ImportError:
+        import backports.lzma as lzma
+    return numpy.frombuffer(lzma.LZMADecompressor().decompress(data, max_length=limit), dtype=numpy.uint8)
+
+def _lz4(data, uncompressedbytes):
+    import lz4.block
+    return numpy.frombuffer(lz4.block.decompress(data, uncompressedbytes), dtype=numpy.uint8)
+
+def _zstd(data, uncompressedbytes):
+    import zstandard
+    # ROOT doesn't always write the content size into the frame
+    return numpy.frombuffer(zstandard.ZstdDecompressor().decompress(data, max_output_size=uncompressedbytes), dtype=numpy.uint8)
+
+register(uproot_skyhook.layout.zlib, b"ZL", _zlib, partial=_zlib_partial)
+register(uproot_skyhook.layout.lzma, b"XZ", _lzma, partial=_lzma_partial)
+register(uproot_skyhook.layout.lz4, b"L4", _lz4, skipbytes=8)     # lz4 pages start with an 8-byte checksum
+register(uproot_skyhook.layout.zstd, b"ZS", _zstd)
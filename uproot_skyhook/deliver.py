@@ -28,27 +28,20 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import ast
+import numbers
 import os
-import zlib
-try:
-    import lzma
-except ImportError:
-    import backports.lzma as lzma
+import threading
 try:
     from urlparse import urlparse
 except ImportError:
     from urllib.parse import urlparse
 
 import numpy
-import lz4.block
 
 import uproot_skyhook.layout
-
-decompress = {
-    uproot_skyhook.layout.zlib: lambda x, uncompressed_size: numpy.frombuffer(zlib.decompress(x), dtype=numpy.uint8),
-    uproot_skyhook.layout.lzma: lambda x, uncompressed_size: numpy.frombuffer(lzma.decompress(x), dtype=numpy.uint8),
-    uproot_skyhook.layout.lz4: lambda x, uncompressed_size: numpy.frombuffer(lz4.block.decompress(x, uncompressed_size), dtype=numpy.uint8),
-    }
+import uproot_skyhook.native
+import uproot_skyhook.codec
 
 def _normalize_entrystartstop(dataset, entrystart, entrystop):
     if entrystart is None:
@@ -67,6 +60,12 @@ def _normalize_entrystartstop(dataset, entrystart, entrystop):
         raise ValueError("entrystop must be greater than or equal to entrystart")
     return entrystart, entrystop
 
+def _colindex(dataset, colname):
+    colindex = dataset.colindex.get(colname, None)
+    if colindex is None:
+        raise ValueError("colname not recognized")
+    return colindex
+
 def _numitems_numentries(dataset, colindex, interpretation, entrystart, entrystop):
     filestart, filestop = numpy.searchsorted(dataset.global_offsets, (entrystart, entrystop), side="left")
     if dataset.global_offsets[filestart] > entrystart:
@@ -77,9 +76,7 @@ def _numitems_numentries(dataset, colindex, interpretation, entrystart, entrysto
         file = dataset.files[filei]
         branch = file.branches[colindex]
 
-        globalbot, globaltop = dataset.global_offsets[filei], dataset.global_offsets[filei + 1]
-        localstart = min(globaltop, max(0, int(entrystart - globalbot)))
-        localstop = min(globaltop, max(0, int(entrystop - globalbot)))
+        globalbot, localstart, localstop = _localrange(dataset, file, filei, entrystart, entrystop)
 
         basketstart, basketstop = numpy.searchsorted(branch.local_offsets, (localstart, localstop), side="left")
         if branch.local_offsets[basketstart] > localstart:
@@ -97,16 +94,35 @@ def _numitems_numentries(dataset, colindex, interpretation, entrystart, entrysto
 
     return out
 
-def baskets(dataset, colname, entrystart=None, entrystop=None):
-    if colname not in dataset.colnames:
-        raise ValueError("colname not recognized")
-    colindex = dataset.colnames.index(colname)
+def baskets(dataset, colname, entrystart=None, entrystop=None, prefetch=4, pagecache=None):
+    colindex = _colindex(dataset, colname)
 
     entrystart, entrystop = _normalize_entrystartstop(dataset, entrystart, entrystop)
 
-    return _baskets(dataset, colindex, entrystart, entrystop)
-
-def _baskets(dataset, colindex, entrystart, entrystop):
+    return _baskets(dataset, colindex, entrystart, entrystop, prefetch=prefetch, pagecache=pagecache)
+
+def _basket_span(branch, basketi):
+    # byte range of a basket's pages in the file, or None if it has none
+    pagestart, pagestop = branch.basket_page_offsets[basketi], branch.basket_page_offsets[basketi + 1]
+    if pagestart == pagestop:
+        return None
+    return int(branch.page_seeks[pagestart]), int(branch.page_seeks[pagestop - 1]) + int(branch.compressedbytes[pagestop - 1])
+
+def _localrange(dataset, file, filei, entrystart, entrystop):
+    # the global entry number of the File's local entry 0 (before the File's first entry if it has
+    # an entrystart) and the local entry numbers of entrystart:entrystop, clipped to the File
+    globalstart, globalstop = int(dataset.global_offsets[filei]), int(dataset.global_offsets[filei + 1])
+    globalbot = globalstart - int(file.entrystart)
+    localstart = max(globalstart, min(globalstop, int(entrystart))) - globalbot
+    localstop = max(globalstart, min(globalstop, int(entrystop))) - globalbot
+    return globalbot, localstart, localstop
+
+def _touched(dataset, colindex, entrystart, entrystop, prefetch, pagecache):
+    # yields (filearray, branch, basketi, globalbot, localstart, localstop, localbot, localtop,
+    # basketstart, basketstop) for each basket overlapping the range, with the file open: the range
+    # in the file is localstart:localstop, the basket is localbot:localtop, and their overlap is
+    # basketstart:basketstop from the start of the basket. The storage is asked for the next prefetch baskets
+    # while each one is processed.
     filestart, filestop = numpy.searchsorted(dataset.global_offsets, (entrystart, entrystop), side="left")
     if dataset.global_offsets[filestart] > entrystart:
         filestart -= 1
@@ -116,67 +132,142 @@ def _baskets(dataset, colindex, entrystart, entrystop):
         branch = file.branches[colindex]
 
         location = file.location if dataset.location_prefix is None else dataset.location_prefix + file.location
-        with FileArray.open(location) as filearray:
-            globalbot, globaltop = int(dataset.global_offsets[filei]), int(dataset.global_offsets[filei + 1])
-            localstart = min(globaltop, max(0, int(entrystart) - globalbot))
-            localstop = min(globaltop, max(0, int(entrystop) - globalbot))
+        with FileArray.open(location, pagecache, file.uuid) as filearray:
+            globalbot, localstart, localstop = _localrange(dataset, file, filei, entrystart, entrystop)
 
             basketstart, basketstop = numpy.searchsorted(branch.local_offsets, (localstart, localstop), side="left")
             if branch.local_offsets[basketstart] > localstart:
                 basketstart -= 1
 
+            hinted = basketstart
             for basketi in range(basketstart, basketstop):
-                basket_uncompressedbytes = 0
-
-                basketdata = []
-                for pagei in range(branch.basket_page_offsets[basketi], branch.basket_page_offsets[basketi + 1]):
-                    page_seek = branch.page_seeks[pagei]
-                    compressedbytes = branch.compressedbytes[pagei]
-                    uncompressedbytes = branch.uncompressedbytes[pagei]
-                    compresseddata = filearray[page_seek : page_seek + compressedbytes]
-                    if branch.compression != uproot_skyhook.layout.none and branch.iscompressed[pagei]:
-                        basketdata.append(decompress[branch.compression](compresseddata, uncompressedbytes))
-                    else:
-                        basketdata.append(compresseddata)
-                    basket_uncompressedbytes += uncompressedbytes
-
-                if len(basketdata) == 1:
-                    basketdata = basketdata[0]
-                else:
-                    basketdata = numpy.concatenate(basketdata)
-
-                if branch.basket_data_borders is None:
-                    data, byteoffsets = basketdata, None
-                else:
-                    keylen = branch.basket_keylens[basketi]
-                    border = branch.basket_data_borders[basketi]
-                    objlen = basket_uncompressedbytes
-                    last = border + keylen
-
-                    data = basketdata[:border]
-                    byteoffsets = numpy.empty((objlen - border - 4) // 4, dtype=numpy.int32)      # native endian
-                    byteoffsets[:-1] = basketdata[border + 4 : -4].view(">i4")   # read as big-endian and convert
-                    byteoffsets[-1] = last
-                    numpy.subtract(byteoffsets, keylen, byteoffsets)
-
-                globalstart, globalstop = int(branch.local_offsets[basketi]) + globalbot, int(branch.local_offsets[basketi + 1]) + globalbot
+                while prefetch > 0 and hinted < min(basketstop, basketi + 1 + prefetch):
+                    span = _basket_span(branch, hinted)
+                    if span is not None:
+                        filearray.willneed(*span)
+                    hinted += 1
+
                 localbot, localtop = int(branch.local_offsets[basketi]), int(branch.local_offsets[basketi + 1])
-                basketstart = min(localtop - localbot, max(0, localstart - localbot))
-                basketstop = min(localtop - localbot, max(0, localstop - localbot))
-                yield globalstart, globalstop, localstart, localstop, basketstart, basketstop, data, byteoffsets
+                yield (filearray,
+                       branch,
+                       basketi,
+                       globalbot,
+                       localstart,
+                       localstop,
+                       localbot,
+                       localtop,
+                       min(localtop - localbot, max(0, localstart - localbot)),
+                       min(localtop - localbot, max(0, localstop - localbot)))
+
+def _baskets(dataset, colindex, entrystart, entrystop, itemsize=None, prefetch=4, pagecache=None):
+    # if itemsize is given (fixed-width entries), baskets without byte offsets are only decompressed
+    # as far as the last requested entry, and their trailing pages are not read at all
+    for filearray, branch, basketi, globalbot, localstart, localstop, localbot, localtop, basketstart, basketstop in _touched(dataset, colindex, entrystart, entrystop, prefetch, pagecache):
+        if itemsize is None or branch.basket_data_borders is not None or basketstop == localtop - localbot:
+            needed = None
+        else:
+            needed = itemsize * basketstop
+
+        basketdata = _basketdata(branch, filearray, basketi, needed)
+
+        if branch.basket_data_borders is None:
+            data, byteoffsets = basketdata, None
+        else:
+            border = branch.basket_data_borders[basketi]
+            data = basketdata[:border]
+            byteoffsets = _byteoffsets(basketdata[border:], branch.basket_keylens[basketi], border)
+
+        yield localbot + globalbot, localtop + globalbot, localstart, localstop, basketstart, basketstop, data, byteoffsets
+
+def _byteoffsets(tail, keylen, border):
+    # entry byte offsets in the basket's data, from the part of the basket after its border
+    byteoffsets = numpy.empty((len(tail) - 4) // 4, dtype=numpy.int32)      # native endian
+    byteoffsets[:-1] = tail[4:-4].view(">i4")   # read as big-endian and convert
+    byteoffsets[-1] = border + keylen
+    numpy.subtract(byteoffsets, keylen, byteoffsets)
+    return byteoffsets
+
+def _pagedata(branch, filearray, pagei, limit=None):
+    # one page's uncompressed bytes, or at least its first limit bytes
+    page_seek = branch.page_seeks[pagei]
+    compresseddata = filearray[page_seek : page_seek + branch.compressedbytes[pagei]]
+    if branch.compression != uproot_skyhook.layout.none and branch.iscompressed[pagei]:
+        return uproot_skyhook.codec.decompress(branch.page_codec(pagei), compresseddata, branch.uncompressedbytes[pagei], limit)
+    else:
+        return compresseddata
+
+def _basketdata(branch, filearray, basketi, needed=None, skip=0):
+    # a basket's uncompressed bytes, or at least its first needed bytes; pages that end before
+    # byte skip are not read, and the output starts at the first page that is
+    basket_uncompressedbytes = 0
+
+    basketdata = []
+    for pagei in range(branch.basket_page_offsets[basketi], branch.basket_page_offsets[basketi + 1]):
+        if needed is not None and basket_uncompressedbytes >= needed:
+            break
+        uncompressedbytes = branch.uncompressedbytes[pagei]
+        if basket_uncompressedbytes + uncompressedbytes > skip:
+            limit = None if needed is None else needed - basket_uncompressedbytes
+            basketdata.append(_pagedata(branch, filearray, pagei, limit))
+        basket_uncompressedbytes += uncompressedbytes
+
+    if len(basketdata) == 1:
+        return basketdata[0]
+    else:
+        return numpy.concatenate(basketdata)
 
 class TBranch(object):
     _fLeaves = ()
 
-def array(dataset, colname, entrystart=None, entrystop=None):
-    if colname not in dataset.colnames:
-        raise ValueError("colname not recognized")
-    colindex = dataset.colnames.index(colname)
-    column = dataset.columns[colindex]
-    interpretation = column.interp
+class _JaggedPrep(object):
+    # the counts and content that uproot's asjagged.finalize expects
+    def __init__(self, counts, content):
+        self.counts = counts
+        self.content = content
+
+def _output(column, out, native):
+    # jagged and string columns are delivered as awkward/uproot arrays, as uproot would give them, unless
+    # native is True (the minimal native.JaggedArray/StringArray, without importing uproot)
+    if native or not isinstance(out, uproot_skyhook.native.JaggedArray) or isinstance(column.interp, uproot_skyhook.native.Interpretation):
+        return out
+    return column.interp.finalize(_JaggedPrep(out.counts, out.content[out.offsets[0] : out.offsets[-1]]), TBranch())
+
+def views(dataset, colname, entrystart=None, entrystop=None, prefetch=4, pagecache=None):
+    # yields (globalstart, globalstop, array) for each basket's part of the range; arrays from
+    # uncompressed baskets are views of the memory-mapped file, in the file's (not byteswapped) dtype
+    colindex = _colindex(dataset, colname)
+    interpretation = dataset.columns[colindex].native
+    if not isinstance(interpretation, uproot_skyhook.native.asdtype):
+        raise ValueError("views are only possible for asdtype columns, not {0}".format(interpretation.identifier))
+
+    entrystart, entrystop = _normalize_entrystartstop(dataset, entrystart, entrystop)
+
+    for globalstart, globalstop, localstart, localstop, basketstart, basketstop, data, byteoffsets in _baskets(dataset, colindex, entrystart, entrystop, interpretation.itemsize, prefetch, pagecache):
+        yield globalstart + basketstart, globalstart + basketstop, interpretation.fromroot(data, byteoffsets, basketstart, basketstop)
+
+def array(dataset, colname, entrystart=None, entrystop=None, zerocopy=False, prefetch=4, cache=None, pagecache=None, native=False):
+    colindex = _colindex(dataset, colname)
+    interpretation = dataset.columns[colindex].native
 
     entrystart, entrystop = _normalize_entrystartstop(dataset, entrystart, entrystop)
 
+    if cache is not None:
+        if zerocopy:
+            raise ValueError("zerocopy can't be combined with cache (cached arrays are memory maps of the cache's own files)")
+        return _output(dataset.columns[colindex], _cachedarray(dataset, colname, colindex, interpretation, entrystart, entrystop, prefetch, cache, pagecache), native)
+
+    if zerocopy:
+        # always in the file's dtype (not byteswapped): a range within one uncompressed basket is a view
+        # of the file, and otherwise the pieces are copied once, end to end
+        pieces = [x for _, _, x in views(dataset, colname, entrystart, entrystop, prefetch, pagecache)]
+        if len(pieces) == 1:
+            return pieces[0]
+        elif len(pieces) == 0:
+            return interpretation.fromroot(numpy.empty(0, dtype=numpy.uint8), None, 0, 0)
+        else:
+            out = numpy.empty((sum(len(x) for x in pieces),) + pieces[0].shape[1:], dtype=pieces[0].dtype)
+            return numpy.concatenate(pieces, out=out)
+
     numitems_numentries = _numitems_numentries(dataset, colindex, interpretation, entrystart, entrystop)
     basket_itemoffset = numpy.empty(len(numitems_numentries) + 1, dtype=int)
     basket_entryoffset = numpy.empty(len(numitems_numentries) + 1, dtype=int)
@@ -187,7 +278,7 @@ def array(dataset, colname, entrystart=None, entrystop=None):
 
     destination = interpretation.destination(basket_itemoffset[-1], int(entrystop - entrystart))
     
-    baskets = _baskets(dataset, colindex, entrystart, entrystop)
+    baskets = _baskets(dataset, colindex, entrystart, entrystop, getattr(interpretation, "itemsize", None), prefetch, pagecache)
     for j, (globalstart, globalstop, localstart, localstop, basketstart, basketstop, data, byteoffsets) in enumerate(baskets):
         source = interpretation.fromroot(data, byteoffsets, basketstart, basketstop)
 
@@ -222,29 +313,549 @@ def array(dataset, colname, entrystart=None, entrystop=None):
                                   basket_entryoffset[0],
                                   basket_entryoffset[-1])
 
-    return interpretation.finalize(clipped, TBranch())
+    return _output(dataset.columns[colindex], interpretation.finalize(clipped, TBranch()), native)
+
+def counts(dataset, colname, entrystart=None, entrystop=None, prefetch=4, pagecache=None):
+    # number of items in each entry of a jagged column, from the byte offsets after each basket's
+    # border alone: pages wholly before the border are not even decompressed
+    colindex = _colindex(dataset, colname)
+    interpretation = dataset.columns[colindex].native
+    if not isinstance(interpretation, uproot_skyhook.native.asjagged):
+        raise ValueError("counts are only defined for jagged columns, not {0}".format(interpretation.identifier))
+
+    entrystart, entrystop = _normalize_entrystartstop(dataset, entrystart, entrystop)
+    entrystart, entrystop = int(entrystart), int(entrystop)
+
+    out = numpy.empty(entrystop - entrystart, dtype=numpy.int64)
+    for filearray, branch, basketi, globalbot, localstart, localstop, localbot, localtop, basketstart, basketstop in _touched(dataset, colindex, entrystart, entrystop, prefetch, pagecache):
+        if branch.basket_data_borders is None:
+            raise ValueError("{0} requires the basket's byte offsets".format(interpretation.identifier))
+        border = int(branch.basket_data_borders[basketi])
+        pageends = numpy.cumsum(branch.uncompressedbytes[branch.basket_page_offsets[basketi] : branch.basket_page_offsets[basketi + 1]], dtype=numpy.int64)
+        skipped = numpy.searchsorted(pageends, border, side="right")
+        tailstart = 0 if skipped == 0 else int(pageends[skipped - 1])
+
+        tail = _basketdata(branch, filearray, basketi, skip=border)
+        byteoffsets = _byteoffsets(tail[border - tailstart:], branch.basket_keylens[basketi], border)
+
+        start = globalbot + localbot + basketstart - entrystart
+        stop = start + basketstop - basketstart
+        numpy.subtract(byteoffsets[basketstart + 1 : basketstop + 1], byteoffsets[basketstart:basketstop], out=out[start:stop])
+        numpy.subtract(out[start:stop], interpretation.skipbytes, out=out[start:stop])
+        numpy.floor_divide(out[start:stop], interpretation.content.itemsize, out=out[start:stop])
+
+    return out
+
+def _cachedarray(dataset, colname, colindex, interpretation, entrystart, entrystop, prefetch, cache, pagecache):
+    # one cache entry per file's part of the range (in the usual dtype, never zerocopy)
+    cls = type(interpretation.finalize(interpretation.destination(0, 0), TBranch()))
+
+    filestart, filestop = numpy.searchsorted(dataset.global_offsets, (entrystart, entrystop), side="left")
+    if dataset.global_offsets[filestart] > entrystart:
+        filestart -= 1
+
+    pieces = []
+    for filei in range(filestart, filestop):
+        file = dataset.files[filei]
+        globalbot, localstart, localstop = _localrange(dataset, file, filei, entrystart, entrystop)
+        start, stop = globalbot + localstart, globalbot + localstop
+        if start < stop:
+            key = cache.key(file.uuid, colname, interpretation.identifier, localstart, localstop)
+            piece = cache.get(key, cls)
+            if piece is None:
+                piece = array(dataset, colname, start, stop, prefetch=prefetch, pagecache=pagecache, native=True)
+                cache.put(key, piece)
+            pieces.append(piece)
+
+    if len(pieces) == 0:
+        return array(dataset, colname, entrystart, entrystop, prefetch=prefetch, pagecache=pagecache, native=True)
+    elif len(pieces) == 1:
+        return pieces[0]
+    else:
+        return uproot_skyhook.native.concatenate(pieces)
+
+def arrays(dataset, colnames, entrystart=None, entrystop=None, prefetch=4, cache=None, pagecache=None, where=None, native=False):
+    # where is a numpy expression of column names (e.g. "(pt > 20) & (abs(eta) < 2.4)") selecting entries
+    if where is None:
+        return dict((colname, array(dataset, colname, entrystart, entrystop, prefetch=prefetch, cache=cache, pagecache=pagecache, native=native)) for colname in colnames)
+    if cache is not None:
+        raise ValueError("cache can't be combined with where")
+
+    entrystart, entrystop = _normalize_entrystartstop(dataset, entrystart, entrystop)
+    entrystart, entrystop = int(entrystart), int(entrystop)
+    mask, out = _where(dataset, where, colnames, entrystart, entrystop, prefetch, pagecache)
+    passed = numpy.concatenate([[0], numpy.cumsum(mask)])
+
+    # other columns: only baskets with selected entries are read, and only those entries kept
+    for colname in colnames:
+        if colname not in out:
+            colindex = _colindex(dataset, colname)
+            interpretation = dataset.columns[colindex].native
+            starts, stops = dataset.columnar(colindex).basket_entries(dataset.global_offsets)
+            starts = numpy.clip(starts, entrystart, entrystop)
+            stops = numpy.clip(stops, entrystart, entrystop)
+            selected = passed[stops - entrystart] > passed[starts - entrystart]
+
+            pieces = []
+            for runstart, runstop in _runs(selected):
+                for start, stop, values in _basketarrays(dataset, colindex, interpretation, int(starts[runstart]), int(stops[runstop - 1]), prefetch, pagecache):
+                    pieces.append(values[mask[start - entrystart : stop - entrystart]])
+            out[colname] = _concatenate(interpretation, pieces)
+
+    return dict((colname, _output(dataset.columns[_colindex(dataset, colname)], out[colname], native)) for colname in colnames)
+
+_wherenamespace = {"abs": numpy.absolute, "sqrt": numpy.sqrt, "exp": numpy.exp, "log": numpy.log, "log10": numpy.log10, "sin": numpy.sin, "cos": numpy.cos, "tan": numpy.tan, "arctan2": numpy.arctan2, "hypot": numpy.hypot, "minimum": numpy.minimum, "maximum": numpy.maximum}
+
+_whereconstants = (ast.Constant,) if hasattr(ast, "Constant") else (ast.Num, ast.NameConstant)
+
+_wherenodes = (ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.boolop, ast.operator, ast.unaryop, ast.cmpop) + _whereconstants
+
+def _whereparse(dataset, where):
+    # where strings come from users: only arithmetic, comparisons, and logic on numbers, columns, and
+    # calls of _wherenamespace functions are allowed (no attributes, subscripts, lambdas, ...), since
+    # eval without builtins is not a sandbox; returns the compiled expression and its columns
+    try:
+        tree = ast.parse(where, "<where>", "eval")
+    except SyntaxError as err:
+        raise ValueError("where expression is not valid: {0}\n{1}".format(repr(where), err))
+
+    filternames = []
+    for node in ast.walk(tree):
+        if not isinstance(node, _wherenodes):
+            raise ValueError("{0} is not allowed in where expressions: {1}".format(type(node).__name__, repr(where)))
+        if isinstance(node, _whereconstants):
+            value = node.n if type(node).__name__ == "Num" else node.value
+            if not isinstance(value, numbers.Number):
+                raise ValueError("only numbers are allowed as constants in where expressions: {0}".format(repr(where)))
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in _wherenamespace or node.func.id in dataset.colindex or len(node.keywords) != 0:
+                raise ValueError("only calls of {0} (with positional arguments) are allowed in where expressions: {1}".format(", ".join(sorted(_wherenamespace)), repr(where)))
+        elif isinstance(node, ast.Name):
+            if node.id in dataset.colindex:
+                if node.id not in filternames:
+                    filternames.append(node.id)
+            elif node.id not in _wherenamespace:
+                raise ValueError("name {0} is not a column or a function in where expression: {1}".format(repr(node.id), repr(where)))
+
+    return compile(tree, "<where>", "eval"), filternames
+
+def _where(dataset, where, colnames, entrystart, entrystop, prefetch, pagecache):
+    # evaluates the expression one chunk at a time, where chunks break wherever a basket of one of
+    # its columns does, so that each basket is decoded once; requested columns are kept as selected
+    code, filternames = _whereparse(dataset, where)
+    if len(filternames) == 0:
+        raise ValueError("where expression uses no columns: {0}".format(repr(where)))
+
+    interpretations = [dataset.columns[dataset.colindex[x]].native for x in filternames]
+    iterators = [_basketarrays(dataset, dataset.colindex[x], y, entrystart, entrystop, prefetch, pagecache) for x, y in zip(filternames, interpretations)]
+    current = [next(x, None) for x in iterators]
+
+    mask = numpy.zeros(entrystop - entrystart, dtype=numpy.bool_)
+    pieces = dict((x, []) for x in filternames if x in colnames)
+    chunkstart = entrystart
+    while chunkstart < entrystop:
+        chunkstop = min(stop for start, stop, values in current)
+        namespace = dict(_wherenamespace)
+        for name, (start, stop, values) in zip(filternames, current):
+            namespace[name] = values[chunkstart - start : chunkstop - start]
+        chunkmask = eval(code, {"__builtins__": {}}, namespace)
+        chunkmask = numpy.broadcast_to(numpy.asarray(chunkmask, dtype=numpy.bool_), (chunkstop - chunkstart,))
+        mask[chunkstart - entrystart : chunkstop - entrystart] = chunkmask
+
+        for name in pieces:
+            pieces[name].append(namespace[name][chunkmask])
+        for i in range(len(current)):
+            if current[i][1] == chunkstop:
+                current[i] = next(iterators[i], None)
+        chunkstart = chunkstop
+
+    return mask, dict((x, _concatenate(y, pieces[x])) for x, y in zip(filternames, interpretations) if x in pieces)
+
+def _runs(selected):
+    # (start, stop) of each run of True values
+    edges = numpy.diff(numpy.concatenate([[False], selected, [False]]).astype(numpy.int8))
+    return zip(numpy.nonzero(edges == 1)[0], numpy.nonzero(edges == -1)[0])
+
+def _concatenate(interpretation, pieces):
+    if len(pieces) == 0:
+        return interpretation.finalize(interpretation.destination(0, 0), TBranch())
+    else:
+        return uproot_skyhook.native.concatenate(pieces)
+
+class Reducer(object):
+    # a reduction computed basket by basket: partial(values) of each basket's values (flattened, and
+    # the content of jagged arrays), merged pairwise with the others, starting from identity()
+    def identity(self):
+        raise NotImplementedError
+
+    def partial(self, values):
+        raise NotImplementedError
+
+    def merge(self, x, y):
+        raise NotImplementedError
+
+    def finish(self, x):
+        return x
+
+class Sum(Reducer):
+    def identity(self):
+        return 0
+
+    def partial(self, values):
+        return values.sum()
+
+    def merge(self, x, y):
+        return x + y
+
+class Count(Reducer):
+    def identity(self):
+        return 0
+
+    def partial(self, values):
+        return len(values)
+
+    def merge(self, x, y):
+        return x + y
+
+class Min(Reducer):
+    # None if there are no values
+    def identity(self):
+        return None
+
+    def partial(self, values):
+        return values.min() if len(values) != 0 else None
+
+    def merge(self, x, y):
+        return y if x is None else x if y is None else min(x, y)
+
+class Max(Min):
+    def partial(self, values):
+        return values.max() if len(values) != 0 else None
+
+    def merge(self, x, y):
+        return y if x is None else x if y is None else max(x, y)
+
+class MinMax(Reducer):
+    def identity(self):
+        return None, None
+
+    def partial(self, values):
+        return Min().partial(values), Max().partial(values)
+
+    def merge(self, x, y):
+        return Min().merge(x[0], y[0]), Max().merge(x[1], y[1])
+
+class Histogram(Reducer):
+    # like numpy.histogram, with explicit edges so that all partial counts line up
+    def __init__(self, edges):
+        self.edges = numpy.asarray(edges)
+
+    def identity(self):
+        return numpy.zeros(len(self.edges) - 1, dtype=numpy.int64)
+
+    def partial(self, values):
+        return numpy.histogram(values, self.edges)[0]
+
+    def merge(self, x, y):
+        return x + y
+
+    def finish(self, x):
+        return x, self.edges
+
+reducers = {"sum": Sum, "count": Count, "min": Min, "max": Max, "minmax": MinMax}
+
+def _flatten(array):
+    if isinstance(array, uproot_skyhook.native.JaggedArray):
+        return _flatten(array.content[array.offsets[0] : array.offsets[-1]])
+    else:
+        return array.reshape(-1)
+
+def _basketarrays(dataset, colindex, interpretation, entrystart, entrystop, prefetch, pagecache):
+    # yields (globalstart, globalstop, array) for each basket's part of the range, one at a time
+    for globalstart, globalstop, localstart, localstop, basketstart, basketstop, data, byteoffsets in _baskets(dataset, colindex, entrystart, entrystop, getattr(interpretation, "itemsize", None), prefetch, pagecache):
+        source = interpretation.fromroot(data, byteoffsets, basketstart, basketstop)
+        numitems = interpretation.source_numitems(source)
+        numentries = basketstop - basketstart
+        destination = interpretation.destination(numitems, numentries)
+        interpretation.fill(source, destination, 0, numitems, 0, numentries)
+        yield globalstart + basketstart, globalstart + basketstop, interpretation.finalize(interpretation.clip(destination, 0, numitems, 0, numentries), TBranch())
+
+def _reduce(dataset, colindex, interpretation, reducer, entrystart, entrystop, prefetch, pagecache):
+    # only one basket's worth of values exists at a time
+    out = reducer.identity()
+    for start, stop, values in _basketarrays(dataset, colindex, interpretation, entrystart, entrystop, prefetch, pagecache):
+        out = reducer.merge(out, reducer.partial(_flatten(values)))
+    return out
+
+def reduce(dataset, colname, reducer, entrystart=None, entrystop=None, executor=None, prefetch=4, pagecache=None):
+    # reducer is a Reducer or one of the names in reducers; with an executor, each basket is a task
+    colindex = _colindex(dataset, colname)
+    interpretation = dataset.columns[colindex].native
+    if not isinstance(reducer, Reducer):
+        if reducer not in reducers:
+            raise ValueError("unrecognized reducer: {0}".format(repr(reducer)))
+        reducer = reducers[reducer]()
+
+    entrystart, entrystop = _normalize_entrystartstop(dataset, entrystart, entrystop)
+
+    if executor is None:
+        return reducer.finish(_reduce(dataset, colindex, interpretation, reducer, entrystart, entrystop, prefetch, pagecache))
+
+    starts, stops = dataset.columnar(colindex).basket_entries(dataset.global_offsets)
+    touched = (starts < entrystop) & (stops > entrystart)
+    futures = [executor.submit(_reduce, dataset, colindex, interpretation, reducer, max(int(start), entrystart), min(int(stop), entrystop), 0, pagecache) for start, stop in zip(starts[touched], stops[touched])]
+    out = reducer.identity()
+    for future in futures:
+        out = reducer.merge(out, future.result())
+    return reducer.finish(out)
+
+def histogram(dataset, colname, bins=10, range=None, entrystart=None, entrystop=None, executor=None, prefetch=4, pagecache=None):
+    # returns (counts, edges) as numpy.histogram would for the whole column; without a range (for
+    # a number of bins), the data are read once more to find it
+    if range is None and numpy.ndim(bins) == 0:
+        low, high = reduce(dataset, colname, MinMax(), entrystart, entrystop, executor, prefetch, pagecache)
+        range = (0.0, 1.0) if low is None else (float(low), float(high))
+    edges = numpy.histogram([], bins, range)[1]
+    return reduce(dataset, colname, Histogram(edges), entrystart, entrystop, executor, prefetch, pagecache)
+
+def _basket_costs(dataset, colindex, compressed):
+    # global entry ranges and byte counts of all baskets of a column, in entry order
+    columnar = dataset.columnar(colindex)
+    starts, stops = columnar.basket_entries(dataset.global_offsets)
+    if compressed:
+        costs = columnar.basket_compressedbytes()
+    else:
+        costs = columnar.basket_uncompressedbytes()
+    return starts, stops, costs
+
+def partition(dataset, colnames, numpartitions, entrystart=None, entrystop=None, compressed=False):
+    if numpartitions < 1:
+        raise ValueError("numpartitions must be at least 1")
+    entrystart, entrystop = _normalize_entrystartstop(dataset, entrystart, entrystop)
+
+    # each basket's bytes are spread evenly over its entries, so that cumulative(x) is the
+    # number of bytes before entry x; basket boundaries are the preferred cuts
+    columns = [_basket_costs(dataset, _colindex(dataset, colname), compressed) for colname in colnames]
+    boundaries = [entrystart, entrystop]
+    for starts, stops, costs in columns:
+        boundaries.append(starts[(entrystart < starts) & (starts < entrystop)])
+    boundaries = numpy.unique(numpy.concatenate([numpy.asarray(x, dtype=numpy.int64).reshape(-1) for x in boundaries]))
+
+    def cumulative(x):
+        out = numpy.zeros(len(x), dtype=numpy.float64)
+        for starts, stops, costs in columns:
+            if len(costs) != 0:
+                # piecewise linear: flat between baskets, rising by costs[i] from starts[i] to stops[i]
+                before = numpy.cumsum(costs) - costs
+                xp = numpy.column_stack((starts, stops)).reshape(-1)
+                fp = numpy.column_stack((before, before + costs)).reshape(-1)
+                out += numpy.interp(x, xp, fp)
+        return out
+
+    cumboundaries = cumulative(boundaries)
+    total = cumboundaries[-1] - cumboundaries[0]
+    if total <= 0:
+        cumboundaries = boundaries.astype(numpy.float64)
+        total = float(entrystop - entrystart)
+
+    targets = cumboundaries[0] + total * numpy.arange(1, numpartitions, dtype=numpy.float64) / numpartitions
+    cuts = [entrystart]
+    for target in targets:
+        i = numpy.searchsorted(cumboundaries, target)
+        nearest = min((j for j in (i - 1, i) if 0 <= j < len(boundaries)), key=lambda j: abs(cumboundaries[j] - target))
+        if abs(cumboundaries[nearest] - target) <= 0.5 * total / numpartitions:
+            cut = int(boundaries[nearest])
+        else:
+            # no basket boundary close enough; cut inside a basket instead
+            cut = int(round(numpy.interp(target, cumboundaries, boundaries)))
+        if cuts[-1] < cut < entrystop:
+            cuts.append(cut)
+    cuts.append(entrystop)
+
+    out = []
+    for start, stop in zip(cuts[:-1], cuts[1:]):
+        est_bytes = 0
+        for starts, stops, costs in columns:
+            # every basket overlapping start:stop is decompressed in full
+            est_bytes += int(costs[(starts < stop) & (stops > start)].sum())
+        out.append((int(start), int(stop), est_bytes))
+    return out
+
+def _itemratio(interpretation):
+    # bytes in the output array per byte of serialized data
+    fromdtype = getattr(interpretation, "fromdtypeflat", getattr(interpretation, "fromdtype", None))
+    todtype = getattr(interpretation, "todtype", None)
+    if isinstance(interpretation, uproot_skyhook.native.asstlbitset):
+        return float(interpretation.numbytes) / (interpretation.numbytes + 4)
+    elif fromdtype is not None and todtype is not None:
+        if fromdtype.subdtype is None and todtype.subdtype is not None:
+            todtype = todtype.subdtype[0]
+        return float(todtype.itemsize) / fromdtype.itemsize
+    else:
+        return 1.0
+
+def estimate(dataset, colnames, entrystart=None, entrystop=None):
+    entrystart, entrystop = _normalize_entrystartstop(dataset, entrystart, entrystop)
+
+    files = set()
+    out = {"files": 0, "baskets": 0, "pages": 0, "compressedbytes": 0, "uncompressedbytes": 0, "codecs": {}, "outputbytes": 0}
+    for colname in colnames:
+        colindex = _colindex(dataset, colname)
+        columnar = dataset.columnar(colindex)
+        interpretation = dataset.columns[colindex].native
+
+        starts, stops = columnar.basket_entries(dataset.global_offsets)
+        touched = (starts < entrystop) & (stops > entrystart)
+        basketfile = numpy.repeat(numpy.arange(columnar.numfiles), columnar.numbaskets)
+        files.update(basketfile[touched].tolist())
+
+        pages = numpy.repeat(touched, numpy.diff(columnar.basket_pages()))
+        codecs = numpy.where(columnar.iscompressed, columnar.page_compression, uproot_skyhook.layout.none.value)
+        out["baskets"] += int(numpy.count_nonzero(touched))
+        out["pages"] += int(numpy.count_nonzero(pages))
+        out["compressedbytes"] += int(columnar.compressedbytes[pages].sum())
+        out["uncompressedbytes"] += int(columnar.uncompressedbytes[pages].sum())
+        for value in numpy.unique(codecs[pages]):
+            mask = pages & (codecs == value)
+            codec = out["codecs"].setdefault(uproot_skyhook.layout.compressions[value].name, {"pages": 0, "compressedbytes": 0, "uncompressedbytes": 0})
+            codec["pages"] += int(numpy.count_nonzero(mask))
+            codec["compressedbytes"] += int(columnar.compressedbytes[mask].sum())
+            codec["uncompressedbytes"] += int(columnar.uncompressedbytes[mask].sum())
+
+        # only the data part of each basket ends up in the output, and only for the entries in range
+        databytes = numpy.where(columnar.hasborders[basketfile], columnar.basket_data_borders, columnar.basket_uncompressedbytes()).astype(numpy.float64)
+        numentries = stops - starts
+        inrange = numpy.maximum(0, numpy.minimum(stops, entrystop) - numpy.maximum(starts, entrystart))
+        fraction = inrange / numpy.maximum(numentries, 1).astype(numpy.float64)
+        numentries = int(inrange[touched].sum())
+        if isinstance(interpretation, uproot_skyhook.native.asjagged):
+            content = (databytes * fraction)[touched].sum() - interpretation.skipbytes * numentries
+            outputbytes = content * _itemratio(interpretation.content) + 8 * (numentries + 1)
+        else:
+            outputbytes = (databytes * fraction)[touched].sum() * _itemratio(interpretation)
+        out["outputbytes"] += int(round(outputbytes))
+
+    out["files"] = len(files)
+    return out
 
 class FileArray(object):
+    # subclasses that implement _read(start, stop) get willneed as a read-ahead in background threads:
+    # the hinted bytes are read while earlier baskets are decoded, and reads within them wait for that
+    readahead_threads = 2
+
     @classmethod
-    def open(cls, location):
+    def open(cls, location, pagecache=None, uuid=None):
         parsed = urlparse(location)
         if parsed.scheme == "file" or len(parsed.scheme) == 0:
-            return MemmapFileArray(os.path.expanduser(parsed.netloc + parsed.path))
+            path = os.path.expanduser(parsed.netloc + parsed.path)
+            try:
+                out = MemmapFileArray(path)
+            except (ValueError, EnvironmentError):
+                # empty files and filesystems that can't be memory-mapped
+                out = ReadFileArray(path)
         else:
             raise NotImplementedError(parsed.scheme)
+        if pagecache is not None:
+            out = CachedFileArray(out, pagecache, uuid)
+        return out
+
+    def __getitem__(self, slice):
+        first, last = int(slice.start), int(slice.stop)
+        pending = getattr(self, "_pending", None)
+        if pending:
+            # baskets are read in order, so read-aheads that end before this one won't be used
+            pending[:] = [x for x in pending if x[1] > first]
+            for i, (start, stop, future) in enumerate(pending):
+                if start <= first and last <= stop:
+                    if last == stop:
+                        del pending[i]
+                    return future.result()[first - start : last - start]
+        return self._read(first, last)
+
+    def _read(self, start, stop):
+        raise NotImplementedError
+
+    def willneed(self, start, stop):
+        # a hint that bytes start:stop will be read soon; must return without waiting for them
+        if getattr(self, "_executor", None) is None:
+            try:
+                import concurrent.futures
+            except ImportError:
+                return
+            self._executor = concurrent.futures.ThreadPoolExecutor(self.readahead_threads)
+            self._pending = []
+        self._pending.append((int(start), int(stop), self._executor.submit(self._read, int(start), int(stop))))
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        if getattr(self, "_executor", None) is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._pending = []
 
 class MemmapFileArray(FileArray):
     def __init__(self, location):
+        self._location = location
         self._data = numpy.memmap(location, dtype=numpy.uint8, mode="r")
+        self._fd = None
 
     def __getitem__(self, slice):
         return self._data[slice]
 
+    def willneed(self, start, stop):
+        # the kernel starts reading into the page cache (which the memmap shares) in the background
+        if hasattr(os, "posix_fadvise"):
+            if self._fd is None:
+                self._fd = os.open(self._location, os.O_RDONLY)
+            os.posix_fadvise(self._fd, start, stop - start, os.POSIX_FADV_WILLNEED)
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         del self._data
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+class ReadFileArray(FileArray):
+    # positioned reads of a file that isn't memory-mapped
+    def __init__(self, location):
+        self._file = open(location, "rb")
+        self._fd = self._file.fileno()
+        self._lock = threading.Lock()
+
+    def _read(self, start, stop):
+        if hasattr(os, "pread"):
+            data = os.pread(self._fd, stop - start, start)
+        else:
+            with self._lock:
+                self._file.seek(start)
+                data = self._file.read(stop - start)
+        return numpy.frombuffer(data, dtype=numpy.uint8)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        FileArray.__exit__(self, exc_type, exc_val, exc_tb)
+        self._file.close()
+
+class CachedFileArray(FileArray):
+    # reads through a cache.PageCache, so that each page comes from the underlying FileArray once
+    def __init__(self, filearray, pagecache, uuid):
+        self._filearray = filearray
+        self._pagecache = pagecache
+        self._uuid = uuid
+
+    def __getitem__(self, slice):
+        key = self._pagecache.key(self._uuid, slice.start)
+        out = self._pagecache.get(key)
+        if out is None or len(out) != slice.stop - slice.start:
+            out = self._filearray[slice]
+            self._pagecache.put(key, out)
+        return out
+
+    def willneed(self, start, stop):
+        # only baskets whose first page isn't cached are worth asking the storage for
+        if not self._pagecache.has(self._pagecache.key(self._uuid, start)):
+            self._filearray.willneed(start, stop)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._filearray.__exit__(exc_type, exc_val, exc_tb)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Secondary indexes on sorted (or nearly sorted) integer key columns, such as run, luminosity block,
+# and event number: build() makes a layout.KeyIndex (saved next to the Dataset with its tofile method)
+# from a Dataset, analyze.keyindex() makes one from a ROOT file directly, and concatenate()
+# joins those of files; lookup() turns a key or key range into the global entry ranges that may
+# contain it, and entries() reads only those to find the exact entries.
+
+import math
+
+import numpy
+
+import uproot_skyhook.layout
+import uproot_skyhook.native
+import uproot_skyhook.deliver
+
+def _mix(x):
+    # splitmix64's finalizer; uint64 arithmetic wraps
+    x = x ^ (x >> numpy.uint64(30))
+    x = x * numpy.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> numpy.uint64(27))
+    x = x * numpy.uint64(0x94d049bb133111eb)
+    return x ^ (x >> numpy.uint64(31))
+
+def _hash(keys, unsigned):
+    # two hashes of each key's 64 bits for double hashing: the i-th bit position is (one + i*two) % bits
+    one = _mix(numpy.asarray(keys).astype(numpy.uint64 if unsigned else numpy.int64).reshape(-1).view(numpy.uint64))
+    return one, _mix(one) | numpy.uint64(1)
+
+def _positions(one, two, hashes, bits):
+    # one, two, and bits broadcast against each other; the hashes are a new last dimension
+    hashi = numpy.arange(hashes, dtype=numpy.uint64)
+    bits = numpy.asarray(bits, dtype=numpy.uint64)[..., numpy.newaxis]
+    return ((one[..., numpy.newaxis] + two[..., numpy.newaxis] * hashi) % bits).astype(numpy.int64)
+
+def _keycolumn(interpretation):
+    # whether the keys are unsigned, if the column can be indexed
+    if not isinstance(interpretation, uproot_skyhook.native.asdtype) or interpretation.fromdtype.kind not in "iu" or interpretation.fromdtype.shape != ():
+        raise ValueError("a KeyIndex needs a column of integers, not {0}".format(interpretation.identifier))
+    return interpretation.fromdtype.kind == "u"
+
+def _fromkeys(colname, unsigned, baskets, bitsperkey):
+    # a KeyIndex from (globalstart, globalstop, keys) of each basket in order; bitsperkey > 0 adds a
+    # Bloom filter to each basket for exact-key lookups (10 gives ~1% false positives)
+    bloom_hashes = max(1, int(round(bitsperkey * math.log(2)))) if bitsperkey > 0 else 0
+
+    basket_starts, basket_stops, basket_min, basket_max, bloom = [], [], [], [], []
+    for start, stop, keys in baskets:
+        if len(keys) == 0:
+            continue
+        basket_starts.append(start)
+        basket_stops.append(stop)
+        basket_min.append(keys.min())
+        basket_max.append(keys.max())
+        if bloom_hashes != 0:
+            filter = numpy.zeros(int(math.ceil(bitsperkey * len(keys) / 8.0)) * 8, dtype=numpy.bool_)
+            filter[_positions(*(_hash(keys, unsigned) + (bloom_hashes, len(filter)))).reshape(-1)] = True
+            bloom.append(numpy.packbits(filter))
+
+    if bloom_hashes == 0:
+        bloom_offsets = None
+    else:
+        bloom_offsets = numpy.zeros(len(bloom) + 1, dtype="<u8")
+        numpy.cumsum([len(x) for x in bloom], out=bloom_offsets[1:])
+        bloom = numpy.concatenate(bloom) if len(bloom) != 0 else numpy.empty(0, dtype=numpy.uint8)
+    return uproot_skyhook.layout.KeyIndex(colname, basket_starts, basket_stops, basket_min, basket_max, bloom_hashes, bloom_offsets, bloom if bloom_hashes != 0 else None, unsigned)
+
+def build(dataset, colname, bitsperkey=0, prefetch=4, pagecache=None):
+    # reads the column once; analyze.keyindex() builds the same from a ROOT file
+    colindex = uproot_skyhook.deliver._colindex(dataset, colname)
+    interpretation = dataset.columns[colindex].native
+    unsigned = _keycolumn(interpretation)
+    if dataset.numentries > 0:
+        baskets = uproot_skyhook.deliver._basketarrays(dataset, colindex, interpretation, 0, dataset.numentries, prefetch, pagecache)
+    else:
+        baskets = []
+    return _fromkeys(colname, unsigned, baskets, bitsperkey)
+
+def concatenate(keyindexes, global_offsets):
+    # one KeyIndex for a Dataset of files (in order), from each file's KeyIndex (as from analyze.file)
+    # and the Dataset's global_offsets
+    first = keyindexes[0]
+    for x in keyindexes:
+        if x.colname != first.colname or x.unsigned != first.unsigned or x.bloom_hashes != first.bloom_hashes:
+            raise ValueError("KeyIndexes of different columns, key types, or Bloom filters can't be concatenated")
+    if len(global_offsets) != len(keyindexes) + 1:
+        raise ValueError("global_offsets must have one more element than keyindexes")
+
+    shifts = [numpy.uint64(x) for x in global_offsets[:-1]]
+    basket_starts = numpy.concatenate([x.basket_starts + shift for x, shift in zip(keyindexes, shifts)])
+    basket_stops = numpy.concatenate([x.basket_stops + shift for x, shift in zip(keyindexes, shifts)])
+    basket_min = numpy.concatenate([x.basket_min for x in keyindexes])
+    basket_max = numpy.concatenate([x.basket_max for x in keyindexes])
+    if first.bloom_hashes == 0:
+        bloom_offsets = bloom = None
+    else:
+        bloom_offsets = [numpy.zeros(1, dtype="<u8")]
+        for x in keyindexes:
+            bloom_offsets.append(x.bloom_offsets[1:] + bloom_offsets[-1][-1])
+        bloom_offsets = numpy.concatenate(bloom_offsets)
+        bloom = numpy.concatenate([x.bloom for x in keyindexes])
+    return uproot_skyhook.layout.KeyIndex(first.colname, basket_starts, basket_stops, basket_min, basket_max, first.bloom_hashes, bloom_offsets, bloom, first.unsigned)
+
+def _ranges(keyindex, mask):
+    # merges the entry ranges of selected baskets that touch
+    out = []
+    for start, stop in zip(keyindex.basket_starts[mask], keyindex.basket_stops[mask]):
+        if len(out) != 0 and out[-1][1] >= start:
+            out[-1] = (out[-1][0], max(out[-1][1], int(stop)))
+        else:
+            out.append((int(start), int(stop)))
+    return out
+
+def _bounds(keyindex, low, high):
+    # low and high clipped to the keys' type (int64 or uint64), or None if no key can be in between
+    info = numpy.iinfo(keyindex.keydtype)
+    if high < info.min or low > info.max or low > high:
+        return None
+    return keyindex.keydtype.type(max(low, info.min)), keyindex.keydtype.type(min(high, info.max))
+
+def lookup(keyindex, low, high=None):
+    # global entry ranges of the baskets that may have keys in low..high (inclusive), or equal to low
+    exact = high is None
+    bounds = _bounds(keyindex, low, low if exact else high)
+    if bounds is None:
+        return []
+    low, high = bounds
+    mask = (keyindex.basket_min <= high) & (keyindex.basket_max >= low)
+
+    if exact and keyindex.bloom is not None and mask.any():
+        candidates = numpy.nonzero(mask)[0]
+        starts = keyindex.bloom_offsets[candidates].astype(numpy.int64)
+        bits = 8 * (keyindex.bloom_offsets[candidates + 1].astype(numpy.int64) - starts)
+        one, two = _hash([low], keyindex.unsigned)
+        positions = _positions(one, two, keyindex.bloom_hashes, bits)
+        filters = keyindex.bloom[starts[:, numpy.newaxis] + positions // 8]
+        mask[candidates] = (((filters >> (7 - positions % 8).astype(numpy.uint8)) & 1) != 0).all(axis=1)
+
+    return _ranges(keyindex, mask)
+
+def intersect(*rangelists):
+    # entry ranges common to all of the lists (as from lookup on different key columns)
+    out = rangelists[0]
+    for other in rangelists[1:]:
+        merged, i, j = [], 0, 0
+        while i < len(out) and j < len(other):
+            start, stop = max(out[i][0], other[j][0]), min(out[i][1], other[j][1])
+            if start < stop:
+                merged.append((start, stop))
+            if out[i][1] < other[j][1]:
+                i += 1
+            else:
+                j += 1
+        out = merged
+    return out
+
+def entries(dataset, keyindex, low, high=None, prefetch=4, pagecache=None):
+    # global entry numbers whose key is in low..high (inclusive), or equal to low; reads only the
+    # baskets that lookup allows
+    ranges = lookup(keyindex, low, high)
+    out = [numpy.empty(0, dtype=numpy.int64)]
+    if len(ranges) != 0:
+        low, high = _bounds(keyindex, low, low if high is None else high)
+        for start, stop in ranges:
+            keys = uproot_skyhook.deliver.array(dataset, keyindex.colname, start, stop, prefetch=prefetch, pagecache=pagecache)
+            out.append(start + numpy.nonzero((keys >= low) & (keys <= high))[0])
+    return numpy.concatenate(out)
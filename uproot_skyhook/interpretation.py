@@ -32,7 +32,7 @@ import sys
 import numpy
 import flatbuffers
 
-import uproot
+import uproot_skyhook.native
 import uproot_skyhook.interpretation_generated.DType
 import uproot_skyhook.interpretation_generated.Primitive
 import uproot_skyhook.interpretation_generated.Flat
@@ -98,10 +98,23 @@ fb2dtype = {
     uproot_skyhook.interpretation_generated.DType.DType.dtype_float64: numpy.dtype(numpy.float64),
     }
 
-def frombuffer(buffer, offset=0):
-    return fromflatbuffers(uproot_skyhook.interpretation_generated.Interpretation.Interpretation.GetRootAsInterpretation(buffer, offset))
+def _uproot():
+    # imported only when uproot's own interpretation objects are needed
+    import uproot
+    return uproot
 
-def fromflatbuffers(fb):
+def _isa(interp, name):
+    # uproot can only have made interp if it has already been imported
+    if isinstance(interp, getattr(uproot_skyhook.native, name, ())):
+        return True
+    uproot = sys.modules.get("uproot", None)
+    return uproot is not None and isinstance(interp, getattr(uproot, name))
+
+def frombuffer(buffer, offset=0, native=False):
+    return fromflatbuffers(uproot_skyhook.interpretation_generated.Interpretation.Interpretation.GetRootAsInterpretation(buffer, offset), native=native)
+
+def fromflatbuffers(fb, native=False):
+    lib = uproot_skyhook.native if native else _uproot()
     datatype = fb.DataType()
     data = fb.Data()
 
@@ -121,7 +134,7 @@ def fromflatbuffers(fb):
         if dims != ():
             todtype = numpy.dtype((todtype, dims))
 
-        return uproot.asdtype(fromdtype, todtype)
+        return lib.asdtype(fromdtype, todtype)
 
     elif datatype == uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.Record:
         fb2 = uproot_skyhook.interpretation_generated.Record.Record()
@@ -139,7 +152,7 @@ def fromflatbuffers(fb):
             dt = fb2dtype[t.Dtype()].newbyteorder(">" if t.Bigendian() else "<")
             totypes.append((fb2.Tonames(i).decode("utf-8"), dt))
 
-        return uproot.asdtype(numpy.dtype(fromtypes), numpy.dtype(totypes))
+        return lib.asdtype(numpy.dtype(fromtypes), numpy.dtype(totypes))
 
     elif datatype == uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.Double32:
         fb2 = uproot_skyhook.interpretation_generated.Double32.Double32()
@@ -149,27 +162,29 @@ def fromflatbuffers(fb):
         numbits = fb2.Numbits()
         fromdims = tuple(fb2.Fromdims(i) for i in range(fb2.FromdimsLength()))
         todims = tuple(fb2.Todims(i) for i in range(fb2.TodimsLength()))
-        return uproot.asdouble32(low, high, numbits, fromdims, todims)
+        return lib.asdouble32(low, high, numbits, fromdims, todims)
 
     elif datatype == uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.STLBitSet:
         fb2 = uproot_skyhook.interpretation_generated.STLBitSet.STLBitSet()
         fb2.Init(data.Bytes, data.Pos)
-        return uproot.asstlbitset(fb2.Numbytes())
+        return lib.asstlbitset(fb2.Numbytes())
 
     elif datatype == uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.Jagged:
         fb2 = uproot_skyhook.interpretation_generated.Jagged.Jagged()
         fb2.Init(data.Bytes, data.Pos)
-        return uproot.asjagged(fromflatbuffers(fb2.Content()), fb2.Skipbytes())
+        return lib.asjagged(fromflatbuffers(fb2.Content(), native=native), fb2.Skipbytes())
 
     elif datatype == uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.String:
         fb2 = uproot_skyhook.interpretation_generated.String.String()
         fb2.Init(data.Bytes, data.Pos)
-        return uproot.asstring(fb2.Skipbytes())
+        return lib.asstring(fb2.Skipbytes())
 
     elif datatype == uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.TableObj:
         fb2 = uproot_skyhook.interpretation_generated.TableObj.TableObj()
         fb2.Init(data.Bytes, data.Pos)
 
+        # no native equivalent: objects are always made by uproot
+        uproot = _uproot()
         content = fromflatbuffers(fb2.Content())
         qualname = [fb2.Qualname(i).decode("utf-8") for i in range(fb2.QualnameLength())]
         gen, genname = importlib.import_module(qualname[0]), qualname[1:]
@@ -182,7 +197,7 @@ def fromflatbuffers(fb):
         raise AssertionError(datatype)
 
 def toflatbuffers(builder, interp):
-    if isinstance(interp, uproot.asdtype):
+    if _isa(interp, "asdtype"):
         if interp.fromdtype.names is None and interp.todtype.names is None:
             if interp.fromdtype.subdtype is None:
                 fromdt, fromdims = interp.fromdtype, None
@@ -288,7 +303,7 @@ def toflatbuffers(builder, interp):
         else:
             raise NotImplementedError("SkyHook layout of Interpretation {0} not implemented".format(repr(interp)))
 
-    elif isinstance(interp, uproot.asdouble32):
+    elif _isa(interp, "asdouble32"):
         fromdims = None if len(interp.fromdims) is None else interp.fromdims
         todims = None if interp.todims is None or len(interp.todims) is None else interp.todims
 
@@ -315,13 +330,20 @@ def toflatbuffers(builder, interp):
         data = uproot_skyhook.interpretation_generated.Double32.Double32End(builder)
         datatype = uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.Double32
 
-    elif isinstance(interp, uproot.asstlbitset):
+    elif _isa(interp, "asstlbitset"):
         uproot_skyhook.interpretation_generated.STLBitSet.STLBitSetStart(builder)
         uproot_skyhook.interpretation_generated.STLBitSet.STLBitSetAddNumbytes(builder, interp.numbytes)
         data = uproot_skyhook.interpretation_generated.STLBitSet.STLBitSetEnd(builder)
         datatype = uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.STLBitSet
 
-    elif isinstance(interp, uproot.asjagged):
+    elif _isa(interp, "asstring"):
+        skipbytes = interp.skipbytes if isinstance(interp, uproot_skyhook.native.asstring) else interp.content.skipbytes
+        uproot_skyhook.interpretation_generated.String.StringStart(builder)
+        uproot_skyhook.interpretation_generated.String.StringAddSkipbytes(builder, skipbytes)
+        data = uproot_skyhook.interpretation_generated.String.StringEnd(builder)
+        datatype = uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.String
+
+    elif _isa(interp, "asjagged"):
         content = toflatbuffers(builder, interp.content)
         uproot_skyhook.interpretation_generated.Jagged.JaggedStart(builder)
         uproot_skyhook.interpretation_generated.Jagged.JaggedAddContent(builder, content)
@@ -329,13 +351,7 @@ def toflatbuffers(builder, interp):
         data = uproot_skyhook.interpretation_generated.Jagged.JaggedEnd(builder)
         datatype = uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.Jagged
 
-    elif isinstance(interp, uproot.asstring):
-        uproot_skyhook.interpretation_generated.String.StringStart(builder)
-        uproot_skyhook.interpretation_generated.String.StringAddSkipbytes(builder, interp.content.skipbytes)
-        data = uproot_skyhook.interpretation_generated.String.StringEnd(builder)
-        datatype = uproot_skyhook.interpretation_generated.InterpretationData.InterpretationData.String
-
-    elif isinstance(interp, uproot.asobj) and isinstance(interp.content, uproot.astable):
+    elif _isa(interp, "asobj") and _isa(interp.content, "astable"):
         content = toflatbuffers(builder, interp.content.content)
         qualname = [builder.CreateString(x.encode("utf-8")) for x in (interp.cls.__module__, interp.cls.__name__)]
         uproot_skyhook.interpretation_generated.TableObj.TableObjStartQualnameVector(builder, len(qualname))
@@ -356,3 +372,28 @@ def toflatbuffers(builder, interp):
     uproot_skyhook.interpretation_generated.Interpretation.InterpretationAddDataType(builder, datatype)
     uproot_skyhook.interpretation_generated.Interpretation.InterpretationAddData(builder, data)
     return uproot_skyhook.interpretation_generated.Interpretation.InterpretationEnd(builder)
+
+def tonative(interp):
+    if isinstance(interp, uproot_skyhook.native.Interpretation):
+        return interp
+
+    elif _isa(interp, "asdtype"):
+        return uproot_skyhook.native.asdtype(interp.fromdtype, interp.todtype)
+
+    elif _isa(interp, "asdouble32"):
+        return uproot_skyhook.native.asdouble32(interp.low, interp.high, interp.numbits, interp.fromdims, interp.todims)
+
+    elif _isa(interp, "asstlbitset"):
+        return uproot_skyhook.native.asstlbitset(interp.numbytes)
+
+    elif _isa(interp, "asstring"):
+        return uproot_skyhook.native.asstring(interp.content.skipbytes)
+
+    elif _isa(interp, "asjagged"):
+        content = tonative(interp.content)
+        if isinstance(content, uproot_skyhook.native.Interpretation):
+            return uproot_skyhook.native.asjagged(content, interp.skipbytes)
+        return interp
+
+    else:
+        return interp
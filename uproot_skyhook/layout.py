@@ -26,16 +26,26 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import os
+import hashlib
+
 import numpy
 import flatbuffers
+try:
+    from pickle import PickleBuffer
+except ImportError:
+    PickleBuffer = None
 
-import uproot
 import uproot_skyhook.interpretation
 import uproot_skyhook.lazyobject
+import uproot_skyhook.packing
 import uproot_skyhook.layout_generated.Compression
+import uproot_skyhook.layout_generated.PackedVector
 import uproot_skyhook.layout_generated.Branch
 import uproot_skyhook.layout_generated.Column
 import uproot_skyhook.layout_generated.File
+import uproot_skyhook.layout_generated.Shard
+import uproot_skyhook.layout_generated.KeyIndex
 import uproot_skyhook.layout_generated.Dataset
 
 class Compression(object):
@@ -63,6 +73,7 @@ zlib = Compression("zlib", uproot_skyhook.layout_generated.Compression.Compressi
 lzma = Compression("lzma", uproot_skyhook.layout_generated.Compression.Compression.lzma)
 old  = Compression("old",  uproot_skyhook.layout_generated.Compression.Compression.old)
 lz4  = Compression("lz4",  uproot_skyhook.layout_generated.Compression.Compression.lz4)
+zstd = Compression("zstd", uproot_skyhook.layout_generated.Compression.Compression.zstd)
 
 compressions = {
     uproot_skyhook.layout_generated.Compression.Compression.none: none,
@@ -70,6 +81,7 @@ compressions = {
     uproot_skyhook.layout_generated.Compression.Compression.lzma: lzma,
     uproot_skyhook.layout_generated.Compression.Compression.old: old,
     uproot_skyhook.layout_generated.Compression.Compression.lz4: lz4,
+    uproot_skyhook.layout_generated.Compression.Compression.zstd: zstd,
     }
 
 class Layout(object):
@@ -79,9 +91,110 @@ class Layout(object):
         self._flatbuffers = fb
         return self
 
+    @classmethod
+    def fromroot(cls, fb):
+        # every Layout decoded from this root shares one state, so that modifying any of them disables buffer comparisons
+        self = cls.fromflatbuffers(fb)
+        self._state = {"modified": False}
+        return self
+
+    def __setattr__(self, name, value):
+        if not name.startswith("_"):
+            state = self.__dict__.get("_state", None)
+            if state is not None:
+                state["modified"] = True
+        object.__setattr__(self, name, value)
+
+    def _unmodified(self):
+        state = self.__dict__.get("_state", None)
+        return state is not None and not state["modified"]
+
+    def _samebuffer(self, other, contents=False):
+        if type(self) is not type(other) or not self._unmodified() or not other._unmodified():
+            return False
+        one, two = self._flatbuffers._tab, other._flatbuffers._tab
+        if one.Pos != two.Pos:
+            return False
+        if uproot_skyhook.lazyobject.samebuffer(one.Bytes, two.Bytes):
+            return True
+        return contents and numpy.array_equal(numpy.frombuffer(one.Bytes, dtype=numpy.uint8), numpy.frombuffer(two.Bytes, dtype=numpy.uint8))
+
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __reduce_ex__(self, protocol):
+        # a standalone flatbuffer holding just this object, decoded lazily by the receiver
+        builder = flatbuffers.Builder(1024)
+        builder.Finish(self._toflatbuffers(builder))
+        return _unpickle, (type(self), _picklebuffer(builder.Output(), protocol))
+
+def _picklebuffer(buffer, protocol):
+    if protocol >= 5 and PickleBuffer is not None:
+        return PickleBuffer(buffer)      # can be sent out-of-band, without a copy
+    elif isinstance(buffer, bytes):
+        return buffer
+    else:
+        return numpy.frombuffer(buffer, dtype=numpy.uint8).tobytes()
+
+def _unpickle(cls, buffer, pos=None, shards=None):
+    buffer = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    if pos is None:
+        pos = int(buffer[:4].view("<u4")[0])
+    generated = getattr(getattr(uproot_skyhook.layout_generated, cls.__name__), cls.__name__)
+    fb = generated()
+    fb.Init(buffer, pos)
+    out = cls.fromroot(fb)
+    if shards is not None:
+        shards._state = out._state
+        out._shards = shards
+        out._files = out._columnviews(shards.files())
+    return out
+
+def _digest(array):
+    return (array.dtype.str, len(array), hashlib.sha1(array.view(numpy.uint8)).digest())
+
+def _numpyvector(builder, startvector, array, shared=None):
+    array = numpy.ascontiguousarray(array)
+    if shared is not None:
+        key = ("vector",) + _digest(array)
+        if key in shared:
+            return shared[key]
+
+    startvector(builder, len(array))
+    builder.head = builder.head - array.nbytes
+    memoryview(builder.Bytes)[builder.head : builder.head + array.nbytes] = array.view(numpy.uint8)
+    out = builder.EndVector(len(array))
+
+    if shared is not None:
+        shared[key] = out
+    return out
+
+def _string(builder, string, shared=None):
+    if isinstance(string, str):
+        string = string.encode("utf-8")
+    if shared is None:
+        return builder.CreateString(string)
+    key = ("string", string)
+    if key not in shared:
+        shared[key] = builder.CreateString(string)
+    return shared[key]
+
+def _packedvector(builder, packed):
+    encoding, length, first, bitwidth, data = packed
+    data = _numpyvector(builder, uproot_skyhook.layout_generated.PackedVector.PackedVectorStartDataVector, data)
+    uproot_skyhook.layout_generated.PackedVector.PackedVectorStart(builder)
+    uproot_skyhook.layout_generated.PackedVector.PackedVectorAddEncoding(builder, encoding)
+    uproot_skyhook.layout_generated.PackedVector.PackedVectorAddLength(builder, length)
+    uproot_skyhook.layout_generated.PackedVector.PackedVectorAddFirst(builder, first)
+    uproot_skyhook.layout_generated.PackedVector.PackedVectorAddBitwidth(builder, bitwidth)
+    uproot_skyhook.layout_generated.PackedVector.PackedVectorAddData(builder, data)
+    return uproot_skyhook.layout_generated.PackedVector.PackedVectorEnd(builder)
+
+def _unpackvector(dtype):
+    def unpack(fb):
+        return uproot_skyhook.packing.unpack(fb.Encoding(), fb.Length(), fb.First(), fb.Bitwidth(), fb.DataAsNumpy(), dtype)
+    return unpack
+
 def finalize_string(x):
     if x is None:
         return None
@@ -89,11 +202,11 @@ def finalize_string(x):
         return x.decode("utf-8")
 
 class Branch(Layout):
-    local_offsets = uproot_skyhook.lazyobject.lazyproperty_numpy("local_offsets")
-    page_seeks = uproot_skyhook.lazyobject.lazyproperty_numpy("page_seeks")
+    local_offsets = uproot_skyhook.lazyobject.lazyproperty_numpy("local_offsets", _unpackvector("<u8"))
+    page_seeks = uproot_skyhook.lazyobject.lazyproperty_numpy("page_seeks", _unpackvector("<u8"))
     compression = uproot_skyhook.lazyobject.lazyproperty("compression", lambda x: compressions[x])
-    uncompressedbytes = uproot_skyhook.lazyobject.lazyproperty_numpy("uncompressedbytes")
-    basket_page_offsets = uproot_skyhook.lazyobject.lazyproperty_numpy("basket_page_offsets")
+    uncompressedbytes = uproot_skyhook.lazyobject.lazyproperty_numpy("uncompressedbytes", _unpackvector("<u4"))
+    basket_page_offsets = uproot_skyhook.lazyobject.lazyproperty_numpy("basket_page_offsets", _unpackvector("<u4"))
 
     @property
     def iscompressed(self):
@@ -114,7 +227,11 @@ class Branch(Layout):
             return self._compressedbytes
         if self.compression == none:
             return self.uncompressedbytes
-        self._compressedbytes = self._flatbuffers.CompressedbytesAsNumpy()
+        packed = self._flatbuffers.PackedCompressedbytes()
+        if packed is None:
+            self._compressedbytes = self._flatbuffers.CompressedbytesAsNumpy()
+        else:
+            self._compressedbytes = _unpackvector("<u4")(packed)
         return self._compressedbytes
 
     @compressedbytes.setter
@@ -147,14 +264,34 @@ class Branch(Layout):
     def basket_data_borders(self, value):
         self._basket_data_borders = value
 
+    @property
+    def page_compression(self):
+        if hasattr(self, "_page_compression"):
+            return self._page_compression
+        if self._flatbuffers.PageCompressionLength() == 0:
+            return None
+        self._page_compression = self._flatbuffers.PageCompressionAsNumpy()
+        return self._page_compression
+
+    @page_compression.setter
+    def page_compression(self, value):
+        self._page_compression = value
+
+    def page_codec(self, pagei):
+        # the Compression of one page; meaningful only if iscompressed[pagei]
+        if self.page_compression is None:
+            return self.compression
+        else:
+            return compressions[self.page_compression[pagei]]
+
     @classmethod
     def empty(cls):
         return cls([0], [], none, None, None, [], [0], None, None)
 
-    def __init__(self, local_offsets, page_seeks, compression, iscompressed, compressedbytes, uncompressedbytes, basket_page_offsets, basket_keylens, basket_data_borders):
+    def __init__(self, local_offsets, page_seeks, compression, iscompressed, compressedbytes, uncompressedbytes, basket_page_offsets, basket_keylens, basket_data_borders, page_compression=None):
         local_offsets = numpy.array(local_offsets, dtype="<u8", copy=False)
-        if len(local_offsets) == 0 or local_offsets[0] != 0:
-            raise ValueError("local_offsets must start with 0")
+        if len(local_offsets) == 0:
+            raise ValueError("local_offsets must not be empty")
         if not (local_offsets[1:] >= local_offsets[:-1]).all():
             raise ValueError("local_offsets must be monatonically increasing")
         self.local_offsets = local_offsets
@@ -209,8 +346,18 @@ class Branch(Layout):
             if len(basket_data_borders) != len(basket_page_offsets) - 1:
                 raise ValueError("len(basket_data_borders) must be equal to len(basket_page_offsets) - 1")
 
+        if page_compression is None:
+            self.page_compression = None
+        else:
+            if self.compression == none:
+                raise ValueError("page_compression requires a compression other than none")
+            page_compression = numpy.array(page_compression, dtype=numpy.uint8, copy=False)
+            if len(page_compression) != len(page_seeks):
+                raise ValueError("len(page_compression) must be equal to len(page_seeks)")
+            self.page_compression = page_compression
+
     def __eq__(self, other):
-        return self is other or (isinstance(other, Branch) and
+        return self is other or self._samebuffer(other) or (isinstance(other, Branch) and
                                  numpy.array_equal(self.local_offsets, other.local_offsets) and
                                  numpy.array_equal(self.page_seeks, other.page_seeks) and
                                  self.compression == other.compression and
@@ -219,86 +366,391 @@ class Branch(Layout):
                                  numpy.array_equal(self.uncompressedbytes, other.uncompressedbytes) and
                                  numpy.array_equal(self.basket_page_offsets, other.basket_page_offsets) and 
                                  ((isinstance(self.basket_keylens, numpy.ndarray) and isinstance(other.basket_keylens, numpy.ndarray) and numpy.array_equal(self.basket_keylens, other.basket_keylens)) or (self.basket_keylens is None and other.basket_keylens is None)) and
-                                 ((isinstance(self.basket_data_borders, numpy.ndarray) and isinstance(other.basket_data_borders, numpy.ndarray) and numpy.array_equal(self.basket_data_borders, other.basket_data_borders)) or (self.basket_data_borders is None and other.basket_data_borders is None)))
-
-    def _toflatbuffers(self, builder):
-        uproot_skyhook.layout_generated.Branch.BranchStartLocalOffsetsVector(builder, len(self.local_offsets))
-        builder.head = builder.head - self.local_offsets.nbytes
-        builder.Bytes[builder.head : builder.head + self.local_offsets.nbytes] = self.local_offsets.tostring()
-        local_offsets = builder.EndVector(len(self.local_offsets))
-
-        uproot_skyhook.layout_generated.Branch.BranchStartPageSeeksVector(builder, len(self.page_seeks))
-        builder.head = builder.head - self.page_seeks.nbytes
-        builder.Bytes[builder.head : builder.head + self.page_seeks.nbytes] = self.page_seeks.tostring()
-        page_seeks = builder.EndVector(len(self.page_seeks))
+                                 ((isinstance(self.basket_data_borders, numpy.ndarray) and isinstance(other.basket_data_borders, numpy.ndarray) and numpy.array_equal(self.basket_data_borders, other.basket_data_borders)) or (self.basket_data_borders is None and other.basket_data_borders is None)) and
+                                 ((isinstance(self.page_compression, numpy.ndarray) and isinstance(other.page_compression, numpy.ndarray) and numpy.array_equal(self.page_compression, other.page_compression)) or (self.page_compression is None and other.page_compression is None)))
+
+    def _toflatbuffers(self, builder, compact=False, shared=None):
+        def packable(array, startvector):
+            if not compact:
+                return _numpyvector(builder, startvector, array, shared), False
+            if shared is not None:
+                key = ("packed",) + _digest(numpy.ascontiguousarray(array))
+                if key in shared:
+                    return shared[key]
+            packed = uproot_skyhook.packing.pack(array)
+            if packed is None:
+                out = _numpyvector(builder, startvector, array, shared), False
+            else:
+                out = _packedvector(builder, packed), True
+            if shared is not None:
+                shared[key] = out
+            return out
+
+        local_offsets, packed_local_offsets = packable(self.local_offsets, uproot_skyhook.layout_generated.Branch.BranchStartLocalOffsetsVector)
+        page_seeks, packed_page_seeks = packable(self.page_seeks, uproot_skyhook.layout_generated.Branch.BranchStartPageSeeksVector)
 
         if self.compression != none:
-            uproot_skyhook.layout_generated.Branch.BranchStartIscompressedVector(builder, len(self.iscompressed))
-            builder.head = builder.head - self.iscompressed.nbytes
-            builder.Bytes[builder.head : builder.head + self.iscompressed.nbytes] = self.iscompressed.tostring()
-            iscompressed = builder.EndVector(len(self.iscompressed))
-
-            uproot_skyhook.layout_generated.Branch.BranchStartCompressedbytesVector(builder, len(self.compressedbytes))
-            builder.head = builder.head - self.compressedbytes.nbytes
-            builder.Bytes[builder.head : builder.head + self.compressedbytes.nbytes] = self.compressedbytes.tostring()
-            compressedbytes = builder.EndVector(len(self.compressedbytes))
-
-        uproot_skyhook.layout_generated.Branch.BranchStartUncompressedbytesVector(builder, len(self.uncompressedbytes))
-        builder.head = builder.head - self.uncompressedbytes.nbytes
-        builder.Bytes[builder.head : builder.head + self.uncompressedbytes.nbytes] = self.uncompressedbytes.tostring()
-        uncompressedbytes = builder.EndVector(len(self.uncompressedbytes))
-
-        uproot_skyhook.layout_generated.Branch.BranchStartBasketPageOffsetsVector(builder, len(self.basket_page_offsets))
-        builder.head = builder.head - self.basket_page_offsets.nbytes
-        builder.Bytes[builder.head : builder.head + self.basket_page_offsets.nbytes] = self.basket_page_offsets.tostring()
-        basket_page_offsets = builder.EndVector(len(self.basket_page_offsets))
+            iscompressed = _numpyvector(builder, uproot_skyhook.layout_generated.Branch.BranchStartIscompressedVector, self.iscompressed, shared)
+            compressedbytes, packed_compressedbytes = packable(self.compressedbytes, uproot_skyhook.layout_generated.Branch.BranchStartCompressedbytesVector)
+
+        uncompressedbytes, packed_uncompressedbytes = packable(self.uncompressedbytes, uproot_skyhook.layout_generated.Branch.BranchStartUncompressedbytesVector)
+        basket_page_offsets, packed_basket_page_offsets = packable(self.basket_page_offsets, uproot_skyhook.layout_generated.Branch.BranchStartBasketPageOffsetsVector)
 
         if self.basket_keylens is not None:
-            uproot_skyhook.layout_generated.Branch.BranchStartBasketKeylensVector(builder, len(self.basket_keylens))
-            builder.head = builder.head - self.basket_keylens.nbytes
-            builder.Bytes[builder.head : builder.head + self.basket_keylens.nbytes] = self.basket_keylens.tostring()
-            basket_keylens = builder.EndVector(len(self.basket_keylens))
+            basket_keylens = _numpyvector(builder, uproot_skyhook.layout_generated.Branch.BranchStartBasketKeylensVector, self.basket_keylens, shared)
 
         if self.basket_data_borders is not None:
-            uproot_skyhook.layout_generated.Branch.BranchStartBasketDataBordersVector(builder, len(self.basket_data_borders))
-            builder.head = builder.head - self.basket_data_borders.nbytes
-            builder.Bytes[builder.head : builder.head + self.basket_data_borders.nbytes] = self.basket_data_borders.tostring()
-            basket_data_borders = builder.EndVector(len(self.basket_data_borders))
+            basket_data_borders = _numpyvector(builder, uproot_skyhook.layout_generated.Branch.BranchStartBasketDataBordersVector, self.basket_data_borders, shared)
+
+        if self.page_compression is not None:
+            page_compression = _numpyvector(builder, uproot_skyhook.layout_generated.Branch.BranchStartPageCompressionVector, self.page_compression, shared)
 
         uproot_skyhook.layout_generated.Branch.BranchStart(builder)
-        uproot_skyhook.layout_generated.Branch.BranchAddLocalOffsets(builder, local_offsets)
-        uproot_skyhook.layout_generated.Branch.BranchAddPageSeeks(builder, page_seeks)
+        if packed_local_offsets:
+            uproot_skyhook.layout_generated.Branch.BranchAddPackedLocalOffsets(builder, local_offsets)
+        else:
+            uproot_skyhook.layout_generated.Branch.BranchAddLocalOffsets(builder, local_offsets)
+        if packed_page_seeks:
+            uproot_skyhook.layout_generated.Branch.BranchAddPackedPageSeeks(builder, page_seeks)
+        else:
+            uproot_skyhook.layout_generated.Branch.BranchAddPageSeeks(builder, page_seeks)
         uproot_skyhook.layout_generated.Branch.BranchAddCompression(builder, self.compression.value)
         if self.compression != none:
             uproot_skyhook.layout_generated.Branch.BranchAddIscompressed(builder, iscompressed)
-            uproot_skyhook.layout_generated.Branch.BranchAddCompressedbytes(builder, compressedbytes)
-        uproot_skyhook.layout_generated.Branch.BranchAddUncompressedbytes(builder, uncompressedbytes)
-        uproot_skyhook.layout_generated.Branch.BranchAddBasketPageOffsets(builder, basket_page_offsets)
+            if packed_compressedbytes:
+                uproot_skyhook.layout_generated.Branch.BranchAddPackedCompressedbytes(builder, compressedbytes)
+            else:
+                uproot_skyhook.layout_generated.Branch.BranchAddCompressedbytes(builder, compressedbytes)
+        if packed_uncompressedbytes:
+            uproot_skyhook.layout_generated.Branch.BranchAddPackedUncompressedbytes(builder, uncompressedbytes)
+        else:
+            uproot_skyhook.layout_generated.Branch.BranchAddUncompressedbytes(builder, uncompressedbytes)
+        if packed_basket_page_offsets:
+            uproot_skyhook.layout_generated.Branch.BranchAddPackedBasketPageOffsets(builder, basket_page_offsets)
+        else:
+            uproot_skyhook.layout_generated.Branch.BranchAddBasketPageOffsets(builder, basket_page_offsets)
         if self.basket_keylens is not None:
             uproot_skyhook.layout_generated.Branch.BranchAddBasketKeylens(builder, basket_keylens)
         if self.basket_data_borders is not None:
             uproot_skyhook.layout_generated.Branch.BranchAddBasketDataBorders(builder, basket_data_borders)
+        if self.page_compression is not None:
+            uproot_skyhook.layout_generated.Branch.BranchAddPageCompression(builder, page_compression)
         return uproot_skyhook.layout_generated.Branch.BranchEnd(builder)
 
     @property
     def numentries(self):
         return self.local_offsets[-1]
 
+    def trimmed(self, localstart, localstop):
+        # only the baskets overlapping localstart:localstop; local entry numbers are unchanged, so
+        # local_offsets starts at the first one's first entry
+        lastbasket = len(self.local_offsets) - 1
+        basketstart, basketstop = numpy.searchsorted(self.local_offsets, (localstart, localstop), side="left")
+        if basketstart < lastbasket and self.local_offsets[basketstart] > localstart:
+            basketstart -= 1
+        basketstart = min(basketstart, lastbasket)
+        basketstop = max(basketstart, min(basketstop, lastbasket))
+        pagestart, pagestop = self.basket_page_offsets[basketstart], self.basket_page_offsets[basketstop]
+
+        def perbasket(array):
+            return None if array is None else array[basketstart:basketstop]
+
+        return Branch(self.local_offsets[basketstart : basketstop + 1],
+                      self.page_seeks[pagestart:pagestop],
+                      self.compression,
+                      None if self.compression == none else self.iscompressed[pagestart:pagestop],
+                      None if self.compression == none else self.compressedbytes[pagestart:pagestop],
+                      self.uncompressedbytes[pagestart:pagestop],
+                      self.basket_page_offsets[basketstart : basketstop + 1] - pagestart,
+                      perbasket(self.basket_keylens),
+                      perbasket(self.basket_data_borders),
+                      None if self.page_compression is None else self.page_compression[pagestart:pagestop])
+
+def _segmentsum(values, offsets):
+    cumulative = numpy.empty(len(values) + 1, dtype=numpy.int64)
+    cumulative[0] = 0
+    numpy.cumsum(values, out=cumulative[1:])
+    return cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+def _offsets(counts):
+    out = numpy.empty(len(counts) + 1, dtype=numpy.int64)
+    out[0] = 0
+    numpy.cumsum(counts, out=out[1:])
+    return out
+
+class ColumnBranches(object):
+    # One column's Branch metadata for all files, concatenated across files. File i owns baskets
+    # basket_offsets[i]:basket_offsets[i + 1] and pages page_offsets[i]:page_offsets[i + 1]; the
+    # per-file local_offsets and basket_page_offsets (one longer than the number of baskets) start
+    # at basket_offsets[i] + i. Files without basket_keylens or basket_data_borders have zeros there.
+    # page_compression is filled in for every page, with the file's compression where not given.
+    # entrystart is each File's entrystart, for basket_entries.
+
+    def __init__(self, compression, basket_offsets, page_offsets, local_offsets, page_seeks, iscompressed, compressedbytes, uncompressedbytes, basket_page_offsets, haskeylens, basket_keylens, hasborders, basket_data_borders, haspagecompression=None, page_compression=None, entrystart=None):
+        self.compression = numpy.array(compression, dtype=numpy.int32, copy=False)
+        self.basket_offsets = numpy.array(basket_offsets, dtype=numpy.int64, copy=False)
+        self.page_offsets = numpy.array(page_offsets, dtype=numpy.int64, copy=False)
+        self.local_offsets = numpy.array(local_offsets, dtype="<u8", copy=False)
+        self.page_seeks = numpy.array(page_seeks, dtype="<u8", copy=False)
+        self.iscompressed = numpy.array(iscompressed, dtype=numpy.bool_, copy=False)
+        self.compressedbytes = numpy.array(compressedbytes, dtype="<u4", copy=False)
+        self.uncompressedbytes = numpy.array(uncompressedbytes, dtype="<u4", copy=False)
+        self.basket_page_offsets = numpy.array(basket_page_offsets, dtype="<u4", copy=False)
+        self.haskeylens = numpy.array(haskeylens, dtype=numpy.bool_, copy=False)
+        self.basket_keylens = numpy.array(basket_keylens, dtype="<u4", copy=False)
+        self.hasborders = numpy.array(hasborders, dtype=numpy.bool_, copy=False)
+        self.basket_data_borders = numpy.array(basket_data_borders, dtype="<u4", copy=False)
+
+        numfiles = len(self.compression)
+        if haspagecompression is None:
+            haspagecompression = numpy.zeros(numfiles, dtype=numpy.bool_)
+        self.haspagecompression = numpy.array(haspagecompression, dtype=numpy.bool_, copy=False)
+        if page_compression is None:
+            page_compression = numpy.repeat(self.compression, numpy.diff(self.page_offsets))
+        self.page_compression = numpy.array(page_compression, dtype=numpy.uint8, copy=False)
+        if entrystart is None:
+            entrystart = numpy.zeros(numfiles, dtype="<u8")
+        self.entrystart = numpy.array(entrystart, dtype="<u8", copy=False)
+
+        if len(self.basket_offsets) != numfiles + 1 or len(self.page_offsets) != numfiles + 1:
+            raise ValueError("basket_offsets and page_offsets must have one more element than compression")
+        if len(self.entrystart) != numfiles:
+            raise ValueError("entrystart must have as many elements as compression")
+        if len(self.local_offsets) != self.basket_offsets[-1] + numfiles or len(self.basket_page_offsets) != self.basket_offsets[-1] + numfiles:
+            raise ValueError("local_offsets and basket_page_offsets must have one element per basket plus one per file")
+        for x in (self.page_seeks, self.iscompressed, self.compressedbytes, self.uncompressedbytes, self.page_compression):
+            if len(x) != self.page_offsets[-1]:
+                raise ValueError("page arrays must have page_offsets[-1] elements")
+        for x in (self.basket_keylens, self.basket_data_borders):
+            if len(x) != self.basket_offsets[-1]:
+                raise ValueError("basket arrays must have basket_offsets[-1] elements")
+
+    @classmethod
+    def fromdataset(cls, dataset, colindex):
+        if dataset._unmodified():
+            pieces = [dataset._columnpiece(i, colindex) for i in range(dataset._numpieces())]
+            if len(pieces) != 0:
+                return cls.concatenate(pieces)
+
+        # a Dataset built in Python (or modified) has its Branch objects already
+        branches = [file.branches[colindex] for file in dataset.files]
+        basket_offsets = _offsets([len(x.local_offsets) - 1 for x in branches])
+        page_offsets = _offsets([len(x.page_seeks) for x in branches])
+
+        def concat(arrays, dtype):
+            if len(arrays) == 0:
+                return numpy.empty(0, dtype=dtype)
+            else:
+                return numpy.concatenate([numpy.asarray(x, dtype=dtype) for x in arrays])
+
+        return cls([x.compression.value for x in branches],
+                   basket_offsets,
+                   page_offsets,
+                   concat([x.local_offsets for x in branches], "<u8"),
+                   concat([x.page_seeks for x in branches], "<u8"),
+                   concat([numpy.zeros(len(x.page_seeks), numpy.bool_) if x.iscompressed is None else x.iscompressed for x in branches], numpy.bool_),
+                   concat([x.compressedbytes for x in branches], "<u4"),
+                   concat([x.uncompressedbytes for x in branches], "<u4"),
+                   concat([x.basket_page_offsets for x in branches], "<u4"),
+                   [x.basket_keylens is not None for x in branches],
+                   concat([numpy.zeros(len(x.local_offsets) - 1, "<u4") if x.basket_keylens is None else x.basket_keylens for x in branches], "<u4"),
+                   [x.basket_data_borders is not None for x in branches],
+                   concat([numpy.zeros(len(x.local_offsets) - 1, "<u4") if x.basket_data_borders is None else x.basket_data_borders for x in branches], "<u4"),
+                   [x.page_compression is not None for x in branches],
+                   concat([numpy.full(len(x.page_seeks), x.compression.value, numpy.uint8) if x.page_compression is None else x.page_compression for x in branches], numpy.uint8),
+                   [file.entrystart for file in dataset.files])
+
+    @classmethod
+    def _fromflatbuffers(cls, raw, files, colindex):
+        # decodes the Branch tables of all files at once, without making any Python objects per file
+        # (packed vectors included)
+        branchstarts, _, _ = uproot_skyhook.lazyobject.tablevectors(raw, files, 2)
+        slots = branchstarts + 4*colindex
+        branches = slots + uproot_skyhook.lazyobject.gather(raw, slots, "<u4")
+
+        def vector(field, dtype, packedfield=None):
+            starts, lengths, present = uproot_skyhook.lazyobject.tablevectors(raw, branches, field)
+            slots = None if packedfield is None else uproot_skyhook.lazyobject.tablefields(raw, branches, packedfield)
+            if slots is None or not slots.any():
+                return uproot_skyhook.lazyobject.concatenate(raw, starts, lengths, dtype), lengths, present
+
+            # the branches that store this vector packed, all unpacked together
+            ispacked = slots != 0
+            tables = slots[ispacked] + uproot_skyhook.lazyobject.gather(raw, slots[ispacked], "<u4")
+            datastarts, datalengths, _ = uproot_skyhook.lazyobject.tablevectors(raw, tables, 4)
+            lengths = lengths.copy()
+            lengths[ispacked] = uproot_skyhook.lazyobject.tablescalars(raw, tables, 1, "<u8")
+            out = numpy.empty(lengths.sum(), dtype=dtype)
+            inpacked = numpy.repeat(ispacked, lengths)
+            out[~inpacked] = uproot_skyhook.lazyobject.concatenate(raw, starts[~ispacked], lengths[~ispacked], dtype)
+            out[inpacked] = uproot_skyhook.packing.unpackmany(uproot_skyhook.lazyobject.tablescalars(raw, tables, 0, "<i1"),
+                                                              lengths[ispacked],
+                                                              uproot_skyhook.lazyobject.tablescalars(raw, tables, 2, "<u8"),
+                                                              uproot_skyhook.lazyobject.tablescalars(raw, tables, 3, "<u1"),
+                                                              raw, datastarts, datalengths, dtype)
+            return out, lengths, present | ispacked
+
+        local_offsets, numlocal, _ = vector(0, "<u8", 9)
+        page_seeks, numpages, _ = vector(1, "<u8", 10)
+        compression = uproot_skyhook.lazyobject.tablescalars(raw, branches, 2, "<i4")
+        uncompressedbytes, _, _ = vector(5, "<u4", 12)
+        basket_page_offsets, _, _ = vector(6, "<u4", 13)
+        basket_offsets = _offsets(numlocal - 1)
+        page_offsets = _offsets(numpages)
+
+        pagemask = numpy.repeat(compression != none.value, numpages)
+        iscompressed = numpy.zeros(page_offsets[-1], dtype=numpy.bool_)
+        iscompressed[pagemask] = vector(3, numpy.bool_)[0][: numpy.count_nonzero(pagemask)]
+        compressedbytes = uncompressedbytes.copy()
+        compressedbytes[pagemask] = vector(4, "<u4", 11)[0][: numpy.count_nonzero(pagemask)]
+
+        def perbasket(field):
+            data, _, present = vector(field, "<u4")
+            out = numpy.zeros(basket_offsets[-1], dtype="<u4")
+            out[numpy.repeat(present, numlocal - 1)] = data
+            return present, out
+
+        haskeylens, basket_keylens = perbasket(7)
+        hasborders, basket_data_borders = perbasket(8)
+
+        data, _, haspagecompression = vector(14, numpy.uint8)
+        page_compression = numpy.repeat(compression, numpages).astype(numpy.uint8)
+        page_compression[numpy.repeat(haspagecompression, numpages)] = data
+
+        entrystart = uproot_skyhook.lazyobject.tablescalars(raw, files, 3, "<u8")
+
+        return cls(compression, basket_offsets, page_offsets, local_offsets, page_seeks, iscompressed, compressedbytes, uncompressedbytes, basket_page_offsets, haskeylens, basket_keylens, hasborders, basket_data_borders, haspagecompression, page_compression, entrystart)
+
+    @classmethod
+    def concatenate(cls, pieces):
+        if len(pieces) == 1:
+            return pieces[0]
+
+        def offsets(name):
+            arrays = [getattr(x, name) for x in pieces]
+            shifts = numpy.cumsum([0] + [x[-1] for x in arrays[:-1]])
+            return numpy.concatenate([arrays[0][:1]] + [x[1:] + shift for x, shift in zip(arrays, shifts)])
+
+        def concat(name):
+            return numpy.concatenate([getattr(x, name) for x in pieces])
+
+        return cls(concat("compression"),
+                   offsets("basket_offsets"),
+                   offsets("page_offsets"),
+                   concat("local_offsets"),
+                   concat("page_seeks"),
+                   concat("iscompressed"),
+                   concat("compressedbytes"),
+                   concat("uncompressedbytes"),
+                   concat("basket_page_offsets"),
+                   concat("haskeylens"),
+                   concat("basket_keylens"),
+                   concat("hasborders"),
+                   concat("basket_data_borders"),
+                   concat("haspagecompression"),
+                   concat("page_compression"),
+                   concat("entrystart"))
+
+    @property
+    def numfiles(self):
+        return len(self.compression)
+
+    def branch(self, filei):
+        basketstart, basketstop = self.basket_offsets[filei], self.basket_offsets[filei + 1]
+        pagestart, pagestop = self.page_offsets[filei], self.page_offsets[filei + 1]
+        compression = compressions[self.compression[filei]]
+
+        out = Branch.__new__(Branch)
+        out._local_offsets = self.local_offsets[basketstart + filei : basketstop + filei + 1]
+        out._page_seeks = self.page_seeks[pagestart:pagestop]
+        out._compression = compression
+        out._iscompressed = None if compression == none else self.iscompressed[pagestart:pagestop]
+        out._uncompressedbytes = self.uncompressedbytes[pagestart:pagestop]
+        out._compressedbytes = out._uncompressedbytes if compression == none else self.compressedbytes[pagestart:pagestop]
+        out._basket_page_offsets = self.basket_page_offsets[basketstart + filei : basketstop + filei + 1]
+        out._basket_keylens = self.basket_keylens[basketstart:basketstop] if self.haskeylens[filei] else None
+        out._basket_data_borders = self.basket_data_borders[basketstart:basketstop] if self.hasborders[filei] else None
+        out._page_compression = self.page_compression[pagestart:pagestop] if self.haspagecompression[filei] else None
+        return out
+
+    @property
+    def numbaskets(self):
+        return numpy.diff(self.basket_offsets)
+
+    @property
+    def numpages(self):
+        return numpy.diff(self.page_offsets)
+
+    @property
+    def numentries(self):
+        return self.local_offsets[self.basket_offsets[1:] + numpy.arange(self.numfiles)]
+
+    def file_compressedbytes(self):
+        return _segmentsum(self.compressedbytes, self.page_offsets)
+
+    def file_uncompressedbytes(self):
+        return _segmentsum(self.uncompressedbytes, self.page_offsets)
+
+    def basket_compressedbytes(self):
+        return _segmentsum(self.compressedbytes, self.basket_pages())
+
+    def basket_uncompressedbytes(self):
+        return _segmentsum(self.uncompressedbytes, self.basket_pages())
+
+    def basket_pages(self):
+        # offsets of each basket's pages in the concatenated page arrays
+        filei = numpy.repeat(numpy.arange(self.numfiles), self.numbaskets + 1)
+        firstbasket = numpy.repeat(self.basket_offsets[:-1] + numpy.arange(self.numfiles), self.numbaskets + 1)
+        notlast = numpy.ones(len(filei), dtype=numpy.bool_)
+        notlast[self.basket_offsets[1:] + numpy.arange(self.numfiles)] = False
+        out = self.basket_page_offsets.astype(numpy.int64) + self.page_offsets[filei]
+        return numpy.append(out[notlast], self.page_offsets[-1])
+
+    def basket_entries(self, global_offsets):
+        # global entry ranges of all baskets, as (starts, stops); the first basket of a File with an
+        # entrystart may start before the File does
+        filei = numpy.repeat(numpy.arange(self.numfiles), self.numbaskets + 1)
+        shifts = numpy.asarray(global_offsets[:-1], dtype=numpy.int64) - self.entrystart.astype(numpy.int64)
+        out = self.local_offsets.astype(numpy.int64) + shifts[filei]
+        notfirst = numpy.ones(len(filei), dtype=numpy.bool_)
+        notfirst[self.basket_offsets[:-1] + numpy.arange(self.numfiles)] = False
+        notlast = numpy.ones(len(filei), dtype=numpy.bool_)
+        notlast[self.basket_offsets[1:] + numpy.arange(self.numfiles)] = False
+        return out[notlast], out[notfirst]
+
 class Column(Layout):
-    interp = uproot_skyhook.lazyobject.lazyproperty("interp", uproot_skyhook.interpretation.fromflatbuffers)
+    interp = uproot_skyhook.lazyobject.lazyproperty("interp", uproot_skyhook.interpretation.fromflatbuffers, invalidates=("_native",))
     title = uproot_skyhook.lazyobject.lazyproperty("title", finalize_string)
 
     def __init__(self, interp, title=None):
         self.interp = interp
         self.title = title
 
+    @property
+    def native(self):
+        # the interpretation as a skyhook-native descriptor, read without importing uproot if possible
+        out = self.__dict__.get("_native", None)
+        if out is None:
+            if "_interp" in self.__dict__:
+                out = uproot_skyhook.interpretation.tonative(self._interp)
+            else:
+                out = uproot_skyhook.interpretation.fromflatbuffers(self._flatbuffers.Interp(), native=True)
+            self._native = out
+        return out
+
     def __eq__(self, other):
-        return self is other or (isinstance(other, Column) and self.interp.identifier == other.interp.identifier and self.title == other.title)
+        return self is other or self._samebuffer(other) or (isinstance(other, Column) and self.native.identifier == other.native.identifier and self.title == other.title)
 
-    def _toflatbuffers(self, builder):
-        interp = uproot_skyhook.interpretation.toflatbuffers(builder, self.interp)
+    def _toflatbuffers(self, builder, shared=None):
+        if shared is None:
+            interp = uproot_skyhook.interpretation.toflatbuffers(builder, self.interp)
+        else:
+            key = ("interp", self.interp.identifier)
+            if key not in shared:
+                shared[key] = uproot_skyhook.interpretation.toflatbuffers(builder, self.interp)
+            interp = shared[key]
         if self.title is not None:
-            title = builder.CreateString(self.title.encode("utf-8"))
+            title = _string(builder, self.title, shared)
 
         uproot_skyhook.layout_generated.Column.ColumnStart(builder)
         uproot_skyhook.layout_generated.Column.ColumnAddInterp(builder, interp)
@@ -309,30 +761,34 @@ class Column(Layout):
 class File(Layout):
     location = uproot_skyhook.lazyobject.lazyproperty("location", finalize_string)
     uuid = uproot_skyhook.lazyobject.lazyproperty("uuid", None)
-    branches = uproot_skyhook.lazyobject.lazyproperty("branches", Branch.fromflatbuffers)
+    branches = uproot_skyhook.lazyobject.lazyproperty("branches", Branch.fromflatbuffers, field=2)
+    entrystart = uproot_skyhook.lazyobject.lazyproperty("entrystart", None)
 
-    def __init__(self, location, uuid, branches):
+    def __init__(self, location, uuid, branches, entrystart=0):
         self.location = location
         self.uuid = uuid
         self.branches = branches
+        self.entrystart = entrystart
 
     def __eq__(self, other):
-        return self is other or (isinstance(other, File) and self.location == other.location and self.uuid == other.uuid and self.branches == other.branches)
+        return self is other or self._samebuffer(other) or (isinstance(other, File) and self.location == other.location and self.uuid == other.uuid and self.branches == other.branches and self.entrystart == other.entrystart)
 
-    def _toflatbuffers(self, builder):
-        branches = [x._toflatbuffers(builder) for x in self.branches]
+    def _toflatbuffers(self, builder, compact=False, shared=None):
+        branches = [x._toflatbuffers(builder, compact=compact, shared=shared) for x in self.branches]
         uproot_skyhook.layout_generated.File.FileStartBranchesVector(builder, len(branches))
         for x in branches[::-1]:
             builder.PrependUOffsetTRelative(x)
         branches = builder.EndVector(len(branches))
 
-        location = builder.CreateString(self.location.encode("utf-8"))
-        uuid = builder.CreateString(self.uuid)
+        location = _string(builder, self.location, shared)
+        uuid = _string(builder, self.uuid, shared)
 
         uproot_skyhook.layout_generated.File.FileStart(builder)
         uproot_skyhook.layout_generated.File.FileAddLocation(builder, location)
         uproot_skyhook.layout_generated.File.FileAddUuid(builder, uuid)
         uproot_skyhook.layout_generated.File.FileAddBranches(builder, branches)
+        if self.entrystart != 0:
+            uproot_skyhook.layout_generated.File.FileAddEntrystart(builder, int(self.entrystart))
         return uproot_skyhook.layout_generated.File.FileEnd(builder)
 
     @property
@@ -340,16 +796,230 @@ class File(Layout):
         if len(self.branches) == 0:
             return 0
         else:
-            return max(x.numentries for x in self.branches)
+            return max(int(x.numentries) for x in self.branches) - int(self.entrystart)
+
+class Shard(Layout):
+    files = uproot_skyhook.lazyobject.lazyproperty("files", File.fromflatbuffers, field=0)
+
+    def __init__(self, files):
+        self.files = files
+
+    def __eq__(self, other):
+        return self is other or self._samebuffer(other) or (isinstance(other, Shard) and self.files == other.files)
+
+    def _toflatbuffers(self, builder, compact=False, shared=None):
+        if shared is None:
+            shared = {}
+
+        files = [x._toflatbuffers(builder, compact=compact, shared=shared) for x in self.files]
+        uproot_skyhook.layout_generated.Shard.ShardStartFilesVector(builder, len(files))
+        for x in files[::-1]:
+            builder.PrependUOffsetTRelative(x)
+        files = builder.EndVector(len(files))
+
+        uproot_skyhook.layout_generated.Shard.ShardStart(builder)
+        uproot_skyhook.layout_generated.Shard.ShardAddFiles(builder, files)
+        return uproot_skyhook.layout_generated.Shard.ShardEnd(builder)
+
+    def tofile(self, filename, compact=False):
+        builder = flatbuffers.Builder(1024)
+        builder.Finish(self._toflatbuffers(builder, compact=compact))
+        with open(filename, "wb") as file:
+            file.write(b"rosh")
+            file.write(builder.Output())
+
+class Shards(object):
+    # The shard files of a sharded Dataset, memmapped as they are first needed.
+
+    def __init__(self, directory, offsets, locations, state=None):
+        self.directory = directory
+        self.offsets = numpy.array(offsets, dtype=numpy.int64)
+        self.locations = list(locations)
+        self._state = state
+        self._shards = [None] * len(self.locations)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __getitem__(self, i):
+        out = self._shards[i]
+        if out is None:
+            file = numpy.memmap(os.path.join(self.directory, self.locations[i]), dtype=numpy.uint8, mode="r")
+            if file[:4].tobytes() != b"rosh":
+                raise OSError("file does not begin with magic 'rosh'")
+            out = Shard.fromflatbuffers(uproot_skyhook.layout_generated.Shard.Shard.GetRootAsShard(file[4:], 0))
+            out._state = self._state
+            if self.offsets[i + 1] - self.offsets[i] != len(out.files):
+                raise ValueError("shard {0} has {1} files, but the index says {2}".format(repr(self.locations[i]), len(out.files), self.offsets[i + 1] - self.offsets[i]))
+            self._shards[i] = out
+        return out
+
+    def files(self):
+        def get(filei):
+            i = numpy.searchsorted(self.offsets, filei, side="right") - 1
+            return self[i].files[filei - self.offsets[i]]
+
+        def getmany(indexes):
+            shardis = numpy.searchsorted(self.offsets, indexes, side="right") - 1
+            out = [None] * len(indexes)
+            for i in numpy.unique(shardis):
+                mask = (shardis == i)
+                for j, x in zip(numpy.nonzero(mask)[0], self[i].files._materialize((indexes[mask] - self.offsets[i]).tolist())):
+                    out[j] = x
+            return out
+
+        return uproot_skyhook.lazyobject.LazyList(get, int(self.offsets[-1]), getmany)
+
+    def __reduce__(self):
+        return Shards, (self.directory, self.offsets, self.locations)
+
+    def __eq__(self, other):
+        return isinstance(other, Shards) and os.path.realpath(self.directory) == os.path.realpath(other.directory) and numpy.array_equal(self.offsets, other.offsets) and self.locations == other.locations
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+class KeyIndex(Layout):
+    # Smallest and largest key in each basket of an integer column (and optionally a Bloom filter of
+    # its keys, sized to the basket), for finding entries by key without reading the column. Stored in
+    # its own file.
+    colname = uproot_skyhook.lazyobject.lazyproperty("colname", finalize_string)
+    basket_starts = uproot_skyhook.lazyobject.lazyproperty_numpy("basket_starts")
+    basket_stops = uproot_skyhook.lazyobject.lazyproperty_numpy("basket_stops")
+    bloom_hashes = uproot_skyhook.lazyobject.lazyproperty("bloom_hashes", None)
+    unsigned = uproot_skyhook.lazyobject.lazyproperty("unsigned", None)
+
+    @property
+    def keydtype(self):
+        return numpy.dtype("<u8" if self.unsigned else "<i8")
+
+    @property
+    def basket_min(self):
+        if not hasattr(self, "_basket_min"):
+            self._basket_min = self._flatbuffers.BasketMinAsNumpy().view(self.keydtype)
+        return self._basket_min
+
+    @basket_min.setter
+    def basket_min(self, value):
+        self._basket_min = value
+
+    @property
+    def basket_max(self):
+        if not hasattr(self, "_basket_max"):
+            self._basket_max = self._flatbuffers.BasketMaxAsNumpy().view(self.keydtype)
+        return self._basket_max
+
+    @basket_max.setter
+    def basket_max(self, value):
+        self._basket_max = value
+
+    @property
+    def bloom_offsets(self):
+        if hasattr(self, "_bloom_offsets"):
+            return self._bloom_offsets
+        if self._flatbuffers.BloomOffsetsLength() == 0:
+            return None
+        self._bloom_offsets = self._flatbuffers.BloomOffsetsAsNumpy()
+        return self._bloom_offsets
+
+    @bloom_offsets.setter
+    def bloom_offsets(self, value):
+        self._bloom_offsets = value
+
+    @property
+    def bloom(self):
+        if hasattr(self, "_bloom"):
+            return self._bloom
+        if self._flatbuffers.BloomLength() == 0:
+            return None
+        self._bloom = self._flatbuffers.BloomAsNumpy()
+        return self._bloom
+
+    @bloom.setter
+    def bloom(self, value):
+        self._bloom = value
+
+    def __init__(self, colname, basket_starts, basket_stops, basket_min, basket_max, bloom_hashes=0, bloom_offsets=None, bloom=None, unsigned=None):
+        # unsigned (uint64 keys) is taken from basket_min's dtype if not given
+        if unsigned is None:
+            unsigned = numpy.asarray(basket_min).dtype.kind == "u"
+        basket_starts = numpy.array(basket_starts, dtype="<u8", copy=False)
+        basket_stops = numpy.array(basket_stops, dtype="<u8", copy=False)
+        basket_min = numpy.array(basket_min, dtype="<u8" if unsigned else "<i8", copy=False)
+        basket_max = numpy.array(basket_max, dtype="<u8" if unsigned else "<i8", copy=False)
+
+        if not len(basket_starts) == len(basket_stops) == len(basket_min) == len(basket_max):
+            raise ValueError("basket_starts, basket_stops, basket_min, and basket_max must have the same length")
+        if not (bloom_offsets is None) == (bloom is None) == (bloom_hashes == 0):
+            raise ValueError("bloom_offsets and bloom must be given if and only if bloom_hashes is not 0")
+        if bloom is not None:
+            bloom_offsets = numpy.array(bloom_offsets, dtype="<u8", copy=False)
+            bloom = numpy.array(bloom, dtype=numpy.uint8, copy=False)
+            if len(bloom_offsets) != len(basket_starts) + 1 or bloom_offsets[0] != 0 or bloom_offsets[-1] != len(bloom) or (bloom_offsets[1:] <= bloom_offsets[:-1]).any():
+                raise ValueError("bloom_offsets must increase from 0 to len(bloom), with one filter per basket")
+
+        self.colname = colname
+        self.basket_starts = basket_starts
+        self.basket_stops = basket_stops
+        self.basket_min = basket_min
+        self.basket_max = basket_max
+        self.bloom_hashes = bloom_hashes
+        self.bloom_offsets = bloom_offsets
+        self.bloom = bloom
+        self.unsigned = bool(unsigned)
+
+    def __eq__(self, other):
+        return self is other or self._samebuffer(other) or (isinstance(other, KeyIndex) and
+                                                            self.colname == other.colname and
+                                                            self.unsigned == other.unsigned and
+                                                            numpy.array_equal(self.basket_starts, other.basket_starts) and
+                                                            numpy.array_equal(self.basket_stops, other.basket_stops) and
+                                                            numpy.array_equal(self.basket_min, other.basket_min) and
+                                                            numpy.array_equal(self.basket_max, other.basket_max) and
+                                                            self.bloom_hashes == other.bloom_hashes and
+                                                            ((self.bloom is None and other.bloom is None) or (self.bloom is not None and other.bloom is not None and numpy.array_equal(self.bloom_offsets, other.bloom_offsets) and numpy.array_equal(self.bloom, other.bloom))))
+
+    def _toflatbuffers(self, builder):
+        colname = _string(builder, self.colname)
+        basket_starts = _numpyvector(builder, uproot_skyhook.layout_generated.KeyIndex.KeyIndexStartBasketStartsVector, self.basket_starts)
+        basket_stops = _numpyvector(builder, uproot_skyhook.layout_generated.KeyIndex.KeyIndexStartBasketStopsVector, self.basket_stops)
+        basket_min = _numpyvector(builder, uproot_skyhook.layout_generated.KeyIndex.KeyIndexStartBasketMinVector, self.basket_min.view("<i8"))
+        basket_max = _numpyvector(builder, uproot_skyhook.layout_generated.KeyIndex.KeyIndexStartBasketMaxVector, self.basket_max.view("<i8"))
+        if self.bloom is not None:
+            bloom_offsets = _numpyvector(builder, uproot_skyhook.layout_generated.KeyIndex.KeyIndexStartBloomOffsetsVector, self.bloom_offsets)
+            bloom = _numpyvector(builder, uproot_skyhook.layout_generated.KeyIndex.KeyIndexStartBloomVector, self.bloom)
+
+        uproot_skyhook.layout_generated.KeyIndex.KeyIndexStart(builder)
+        uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddColname(builder, colname)
+        uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddBasketStarts(builder, basket_starts)
+        uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddBasketStops(builder, basket_stops)
+        uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddBasketMin(builder, basket_min)
+        uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddBasketMax(builder, basket_max)
+        if self.bloom is not None:
+            uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddBloomHashes(builder, self.bloom_hashes)
+            uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddBloomOffsets(builder, bloom_offsets)
+            uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddBloom(builder, bloom)
+        if self.unsigned:
+            uproot_skyhook.layout_generated.KeyIndex.KeyIndexAddUnsigned(builder, True)
+        return uproot_skyhook.layout_generated.KeyIndex.KeyIndexEnd(builder)
+
+    def tofile(self, filename):
+        builder = flatbuffers.Builder(1024)
+        builder.Finish(self._toflatbuffers(builder))
+        with open(filename, "wb") as file:
+            file.write(b"roix")
+            file.write(builder.Output())
 
 class Dataset(Layout):
     name = uproot_skyhook.lazyobject.lazyproperty("name", finalize_string)
     treepath = uproot_skyhook.lazyobject.lazyproperty("treepath", finalize_string)
-    colnames = uproot_skyhook.lazyobject.lazyproperty("colnames", finalize_string)
-    columns = uproot_skyhook.lazyobject.lazyproperty("columns", Column.fromflatbuffers)
-    files = uproot_skyhook.lazyobject.lazyproperty("files", File.fromflatbuffers)
+    colnames = uproot_skyhook.lazyobject.lazyproperty("colnames", finalize_string, invalidates=("_colindex", "_columnar", "_columnpieces"), field=2)
+    columns = uproot_skyhook.lazyobject.lazyproperty("columns", Column.fromflatbuffers, field=3)
+    _bufferfiles = uproot_skyhook.lazyobject.lazyproperty("files", File.fromflatbuffers, field=4)
     global_offsets = uproot_skyhook.lazyobject.lazyproperty_numpy("global_offsets")
     location_prefix = uproot_skyhook.lazyobject.lazyproperty("location_prefix", finalize_string)
+    entryoffset = 0       # set by select; not serialized
+    _shards = None
 
     def __init__(self, name, treepath, colnames, columns, files, global_offsets, location_prefix=None):
         if len(colnames) != len(columns):
@@ -375,12 +1045,170 @@ class Dataset(Layout):
         self.global_offsets = global_offsets
         self.location_prefix = location_prefix
 
+    @property
+    def files(self):
+        # Files read from a buffer have Branches that are views into columnar(colindex)
+        out = self.__dict__.get("_files", None)
+        if out is None:
+            out = self._files = self._columnviews(Dataset._bufferfiles.fget(self))
+        return out
+
+    @files.setter
+    def files(self, value):
+        self._files = value
+        self.__dict__.pop("_columnar", None)
+        self.__dict__.pop("_columnpieces", None)
+
+    def _columnviews(self, files):
+        def view(filei, file):
+            if "_branches" not in file.__dict__:
+                fb = file._flatbuffers
+                source = (fb._tab.Bytes, uproot_skyhook.lazyobject.vectorstart(fb, 2), getattr(file, "_state", None))
+                file._branches = uproot_skyhook.lazyobject.LazyList(lambda colindex: self._columnbranch(file, filei, colindex), fb.BranchesLength(), source=source)
+            return file
+
+        def getmany(indexes):
+            return [view(filei, file) for filei, file in zip(indexes.tolist(), files._materialize(indexes.tolist()))]
+
+        return uproot_skyhook.lazyobject.LazyList(lambda filei: view(filei, files[filei]), len(files), getmany, files._source)
+
+    def _columnbranch(self, file, filei, colindex):
+        if self._unmodified():
+            if self._shards is None:
+                return self.columnar(colindex).branch(filei)
+            piecei = numpy.searchsorted(self._shards.offsets, filei, side="right") - 1
+            return self._columnpiece(piecei, colindex).branch(filei - self._shards.offsets[piecei])
+        else:
+            # the columns may no longer match the buffer
+            out = Branch.fromflatbuffers(file._flatbuffers.Branches(colindex))
+            out._state = getattr(file, "_state", None)
+            return out
+
     @property
     def numentries(self):
         return self.global_offsets[-1]
 
+    @property
+    def colindex(self):
+        out = getattr(self, "_colindex", None)
+        if out is None:
+            out = self._colindex = dict((n, i) for i, n in enumerate(self.colnames))
+        return out
+
+    def _numpieces(self):
+        # number of flatbuffers holding this Dataset's files: one, or one per shard
+        return 1 if self._shards is None else len(self._shards)
+
+    def _filetable(self, piecei):
+        # (buffer, File table positions) for one flatbuffer holding this Dataset's files
+        if self._shards is None:
+            fb, field = self._flatbuffers, 4
+        else:
+            fb, field = self._shards[piecei]._flatbuffers, 0
+        raw = numpy.frombuffer(fb._tab.Bytes, dtype=numpy.uint8)
+        return raw, uproot_skyhook.lazyobject.vectorpositions(raw, uproot_skyhook.lazyobject.vectorstart(fb, field), numpy.arange(fb.FilesLength(), dtype=numpy.int64))
+
+    def _filetables(self):
+        return [self._filetable(i) for i in range(self._numpieces())]
+
+    def _columnpiece(self, piecei, colindex):
+        # ColumnBranches of one flatbuffer's files, so that a sharded Dataset only reads the shards it needs
+        cache = self.__dict__.get("_columnpieces", None)
+        if cache is None:
+            cache = self._columnpieces = {}
+        out = cache.get((piecei, colindex), None)
+        if out is None:
+            raw, files = self._filetable(piecei)
+            out = cache[piecei, colindex] = ColumnBranches._fromflatbuffers(raw, files, colindex)
+        return out
+
+    def columnar(self, colindex):
+        cache = self.__dict__.get("_columnar", None)
+        if cache is None:
+            cache = self._columnar = {}
+        out = cache.get(colindex, None)
+        if out is None:
+            out = cache[colindex] = ColumnBranches.fromdataset(self, colindex)
+        return out
+
+    def tocolumnar(self):
+        columnar = [self.columnar(i) for i in range(len(self.colnames))]
+        if self._unmodified():
+            locations, uuids, entrystarts = [], [], []
+            for raw, files in self._filetables():
+                locations.extend(finalize_string(x) for x in uproot_skyhook.lazyobject.tablestrings(raw, files, 0))
+                uuids.extend(uproot_skyhook.lazyobject.tablestrings(raw, files, 1))
+                entrystarts.extend(uproot_skyhook.lazyobject.tablescalars(raw, files, 3, "<u8").tolist())
+        else:
+            locations = [x.location for x in self.files]
+            uuids = [x.uuid for x in self.files]
+            entrystarts = [x.entrystart for x in self.files]
+
+        def getfile(filei):
+            return File(locations[filei], uuids[filei], uproot_skyhook.lazyobject.LazyList(lambda i: columnar[i].branch(filei), len(columnar)), entrystarts[filei])
+
+        out = Dataset(self.name, self.treepath, list(self.colnames), list(self.columns), uproot_skyhook.lazyobject.LazyList(getfile, len(locations)), self.global_offsets, location_prefix=self.location_prefix)
+        out._columnar = dict(enumerate(columnar))
+        return out
+
+    def select(self, colnames=None, entrystart=None, entrystop=None, trim=False):
+        # Only the files overlapping entrystart:entrystop and only the requested columns. Entry 0 of
+        # the result is entry entryoffset of this Dataset: the first selected file's first entry, or
+        # with trim=True, entrystart. With trim=True, the result also ends at entrystop and each
+        # Branch keeps only the baskets in the range, so the first File may start in a basket
+        # (File.entrystart).
+        if colnames is None:
+            colnames = list(self.colnames)
+        colindexes = []
+        for colname in colnames:
+            colindex = self.colindex.get(colname, None)
+            if colindex is None:
+                raise ValueError("colname not recognized: {0}".format(repr(colname)))
+            colindexes.append(colindex)
+
+        numentries = int(self.numentries)
+        if entrystart is None:
+            entrystart = 0
+        if entrystart < 0:
+            entrystart += numentries
+        if entrystop is None:
+            entrystop = numentries
+        if entrystop < 0:
+            entrystop += numentries
+        if not 0 <= entrystart <= entrystop <= numentries:
+            raise ValueError("entrystart and entrystop must satisfy 0 <= entrystart <= entrystop <= numentries")
+
+        global_offsets = self.global_offsets.astype(numpy.int64)
+        overlapping = numpy.nonzero((global_offsets[:-1] < entrystop) & (global_offsets[1:] > entrystart))[0]
+        if len(overlapping) == 0 or entrystart == entrystop:
+            filestart, filestop = 0, 0
+        else:
+            filestart, filestop = overlapping[0], overlapping[-1] + 1
+
+        files = []
+        for filei, file in zip(range(filestart, filestop), self.files[filestart:filestop]):
+            branches = [file.branches[i] for i in colindexes]
+            fileentrystart = int(file.entrystart)
+            if trim:
+                localstart = max(global_offsets[filei], entrystart) - global_offsets[filei] + fileentrystart
+                localstop = min(global_offsets[filei + 1], entrystop) - global_offsets[filei] + fileentrystart
+                branches = [x.trimmed(localstart, localstop) for x in branches]
+                fileentrystart = int(localstart)
+            files.append(File(file.location, file.uuid, branches, fileentrystart))
+
+        if trim:
+            entryoffset = entrystart
+            offsets = numpy.clip(global_offsets[filestart : filestop + 1], entrystart, entrystop) - entrystart
+        else:
+            entryoffset = int(global_offsets[filestart])
+            offsets = global_offsets[filestart : filestop + 1] - entryoffset
+
+        out = Dataset(self.name, self.treepath, colnames, [self.columns[i] for i in colindexes], files, offsets, location_prefix=self.location_prefix)
+        out.entryoffset = entryoffset
+        return out
+
     def __eq__(self, other):
-        return self is other or (isinstance(other, Dataset) and self.name == other.name and self.treepath == other.treepath and self.colnames == other.colnames and self.columns == other.columns and self.files == other.files and numpy.array_equal(self.global_offsets, other.global_offsets) and self.location_prefix == other.location_prefix)
+        return self is other or (self._samebuffer(other, contents=True) and self._shards == other._shards) or (isinstance(other, Dataset) and self.name == other.name and self.treepath == other.treepath and self.colnames == other.colnames and self.columns == other.columns and self.files == other.files and numpy.array_equal(self.global_offsets, other.global_offsets) and self.location_prefix == other.location_prefix)
 
     def __add__(self, other):
         if not isinstance(other, Dataset):
@@ -392,16 +1220,16 @@ class Dataset(Layout):
         if self.location_prefix != other.location_prefix:
             raise ValueError("dataset location_prefixes differ: {0} and {1}".format(repr(self.location_prefix), repr(other.location_prefix)))
 
-        otherlookup = {n: i for i, n in enumerate(other.colnames)}
+        selflookup = self.colindex
+        otherlookup = other.colindex
 
         colnames = list(self.colnames)
         columns = list(self.columns)
         selfmap = list(range(len(colnames)))
         othermap = [otherlookup.get(n, None) for n in colnames]
-        seen = set(colnames)
 
         for n, x in zip(other.colnames, other.columns):
-            if n not in seen:
+            if n not in selflookup:
                 selfmap.append(None)
                 othermap.append(len(colnames))
                 colnames.append(n)
@@ -419,7 +1247,7 @@ class Dataset(Layout):
                     branches.append(Branch.empty())
                 else:
                     branches.append(file.branches[i])
-            files.append(File(file.location, file.uuid, branches))
+            files.append(File(file.location, file.uuid, branches, file.entrystart))
 
         for file in other.files:
             branches = []
@@ -428,7 +1256,7 @@ class Dataset(Layout):
                     branches.append(Branch.empty())
                 else:
                     branches.append(file.branches[i])
-            files.append(File(file.location, file.uuid, branches))
+            files.append(File(file.location, file.uuid, branches, file.entrystart))
 
         global_offsets = numpy.empty(len(self.global_offsets) + len(other.global_offsets) - 1, dtype="<u8")
         global_offsets[: len(self.global_offsets) - 1] = self.global_offsets[:-1]
@@ -436,34 +1264,44 @@ class Dataset(Layout):
 
         return Dataset(self.name, self.treepath, colnames, columns, files, global_offsets, location_prefix=self.location_prefix)
 
-    def _toflatbuffers(self, builder):
-        files = [x._toflatbuffers(builder) for x in self.files]
+    def _toflatbuffers(self, builder, compact=False, shared=None, shards=None):
+        if shared is None:
+            shared = {}
+
+        if shards is None:
+            files = [x._toflatbuffers(builder, compact=compact, shared=shared) for x in self.files]
+        else:
+            files = []
+            shard_offsets = _numpyvector(builder, uproot_skyhook.layout_generated.Dataset.DatasetStartShardOffsetsVector, shards.offsets.astype("<u8"))
+            shard_locations = [_string(builder, x) for x in shards.locations]
+            uproot_skyhook.layout_generated.Dataset.DatasetStartShardLocationsVector(builder, len(shard_locations))
+            for x in shard_locations[::-1]:
+                builder.PrependUOffsetTRelative(x)
+            shard_locations = builder.EndVector(len(shard_locations))
+
         uproot_skyhook.layout_generated.Dataset.DatasetStartFilesVector(builder, len(files))
         for x in files[::-1]:
             builder.PrependUOffsetTRelative(x)
         files = builder.EndVector(len(files))
 
-        columns = [x._toflatbuffers(builder) for x in self.columns]
+        columns = [x._toflatbuffers(builder, shared=shared) for x in self.columns]
         uproot_skyhook.layout_generated.Dataset.DatasetStartColumnsVector(builder, len(columns))
         for x in columns[::-1]:
             builder.PrependUOffsetTRelative(x)
         columns = builder.EndVector(len(columns))
 
-        colnames = [builder.CreateString(x.encode("utf-8")) for x in self.colnames]
+        colnames = [_string(builder, x, shared) for x in self.colnames]
         uproot_skyhook.layout_generated.Dataset.DatasetStartColnamesVector(builder, len(colnames))
         for x in colnames[::-1]:
             builder.PrependUOffsetTRelative(x)
         colnames = builder.EndVector(len(colnames))
 
-        uproot_skyhook.layout_generated.Dataset.DatasetStartGlobalOffsetsVector(builder, len(self.global_offsets))
-        builder.head = builder.head - self.global_offsets.nbytes
-        builder.Bytes[builder.head : builder.head + self.global_offsets.nbytes] = self.global_offsets.tostring()
-        global_offsets = builder.EndVector(len(self.global_offsets))
+        global_offsets = _numpyvector(builder, uproot_skyhook.layout_generated.Dataset.DatasetStartGlobalOffsetsVector, self.global_offsets, shared)
 
-        name = builder.CreateString(self.name.encode("utf-8"))
-        treepath = builder.CreateString(self.treepath.encode("utf-8"))
+        name = _string(builder, self.name, shared)
+        treepath = _string(builder, self.treepath, shared)
         if self.location_prefix is not None:
-            location_prefix = builder.CreateString(self.location_prefix.encode("utf-8"))
+            location_prefix = _string(builder, self.location_prefix, shared)
 
         uproot_skyhook.layout_generated.Dataset.DatasetStart(builder)
         uproot_skyhook.layout_generated.Dataset.DatasetAddName(builder, name)
@@ -474,20 +1312,40 @@ class Dataset(Layout):
         uproot_skyhook.layout_generated.Dataset.DatasetAddGlobalOffsets(builder, global_offsets)
         if self.location_prefix is not None:
             uproot_skyhook.layout_generated.Dataset.DatasetAddLocationPrefix(builder, location_prefix)
+        if shards is not None:
+            uproot_skyhook.layout_generated.Dataset.DatasetAddShardOffsets(builder, shard_offsets)
+            uproot_skyhook.layout_generated.Dataset.DatasetAddShardLocations(builder, shard_locations)
         return uproot_skyhook.layout_generated.Dataset.DatasetEnd(builder)
 
-    def tobuffer(self):
+    def __reduce_ex__(self, protocol):
+        if self._unmodified():
+            # the buffer this Dataset was read from, as is
+            tab = self._flatbuffers._tab
+            return _unpickle, (Dataset, _picklebuffer(tab.Bytes, protocol), tab.Pos, self._shards)
+        else:
+            return Layout.__reduce_ex__(self, protocol)
+
+    def tobuffer(self, compact=False):
         builder = flatbuffers.Builder(1024)
-        builder.Finish(toflatbuffers(builder, self))
+        builder.Finish(toflatbuffers(builder, self, compact=compact))
         return builder.Output()
 
-    def tonumpy(self):
-        return numpy.frombuffer(self.tobuffer(), dtype=numpy.uint8)
+    def tonumpy(self, compact=False):
+        return numpy.frombuffer(self.tobuffer(compact=compact), dtype=numpy.uint8)
 
-    def tofile(self, filename):
+    def tofile(self, filename, compact=False):
         with open(filename, "wb") as file:
             file.write(b"roly")
-            file.write(self.tobuffer())
+            file.write(self.tobuffer(compact=compact))
+
+    def toshards(self, directory, filespershard=1000, compact=False):
+        if self._unmodified() and self._shards is None:
+            # fresh File objects, so that the ones already written can be released
+            fb = self._flatbuffers
+            files = (File.fromflatbuffers(fb.Files(i)) for i in range(fb.FilesLength()))
+        else:
+            files = self.files
+        return toshards(directory, self.name, self.treepath, self.colnames, self.columns, files, global_offsets=self.global_offsets, location_prefix=self.location_prefix, filespershard=filespershard, compact=compact)
 
 def frombuffer(buffer, offset=0):
     return fromflatbuffers(uproot_skyhook.layout_generated.Dataset.Dataset.GetRootAsDataset(buffer, offset))
@@ -497,15 +1355,66 @@ def fromnumpy(array):
 
 def fromfile(filename):
     file = numpy.memmap(filename, dtype=numpy.uint8, mode="r")
-    if file[:4].tostring() != b"roly":
+    if file[:4].tobytes() != b"roly":
         raise OSError("file does not begin with magic 'roly'")
-    return fromnumpy(file[4:])
+    out = fromnumpy(file[4:])
+
+    fb = out._flatbuffers
+    if not fb.ShardOffsetsIsNone():
+        out._shards = Shards(os.path.dirname(filename), fb.ShardOffsetsAsNumpy(), [finalize_string(fb.ShardLocations(i)) for i in range(fb.ShardLocationsLength())], out._state)
+        out._files = out._columnviews(out._shards.files())
+    return out
+
+def keyindexfromfile(filename):
+    file = numpy.memmap(filename, dtype=numpy.uint8, mode="r")
+    if file[:4].tobytes() != b"roix":
+        raise OSError("file does not begin with magic 'roix'")
+    return KeyIndex.fromroot(uproot_skyhook.layout_generated.KeyIndex.KeyIndex.GetRootAsKeyIndex(file[4:], 0))
+
+def fromshards(directory):
+    return fromfile(os.path.join(directory, "index.rootlayout"))
+
+def toshards(directory, name, treepath, colnames, columns, files, global_offsets=None, location_prefix=None, filespershard=1000, compact=False):
+    # files may be any iterable; only filespershard of them are held in memory at a time
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    offsets, locations, numentries = [0], [], [0]
+    def flush(shardfiles):
+        location = "shard-{0:06d}.rootlayout".format(len(locations))
+        Shard(shardfiles).tofile(os.path.join(directory, location), compact=compact)
+        offsets.append(offsets[-1] + len(shardfiles))
+        locations.append(location)
+
+    shardfiles = []
+    for file in files:
+        shardfiles.append(file)
+        if global_offsets is None:
+            numentries.append(file.numentries)
+        if len(shardfiles) == filespershard:
+            flush(shardfiles)
+            shardfiles = []
+    if len(shardfiles) != 0:
+        flush(shardfiles)
+
+    if global_offsets is None:
+        global_offsets = numpy.cumsum(numentries, dtype="<u8")
+
+    shards = Shards(directory, offsets, locations)
+    index = Dataset(name, treepath, colnames, columns, shards.files(), global_offsets, location_prefix=location_prefix)
+    builder = flatbuffers.Builder(1024)
+    builder.Finish(index._toflatbuffers(builder, shards=shards))
+    with open(os.path.join(directory, "index.rootlayout"), "wb") as file:
+        file.write(b"roly")
+        file.write(builder.Output())
+
+    return fromshards(directory)
     
 def fromflatbuffers(fb):
-    return Dataset.fromflatbuffers(fb)
+    return Dataset.fromroot(fb)
 
-def tobuffer(dataset):
-    return dataset.tobuffer()
+def tobuffer(dataset, compact=False):
+    return dataset.tobuffer(compact=compact)
 
-def toflatbuffers(builder, dataset):
-    return dataset._toflatbuffers(builder)
+def toflatbuffers(builder, dataset, compact=False):
+    return dataset._toflatbuffers(builder, compact=compact)
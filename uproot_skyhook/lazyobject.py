@@ -35,15 +35,23 @@ except ImportError:
     from collections import Iterable
     from collections import Sequence
 
+import numpy
+
 class LazyList(Sequence):
-    def __init__(self, get, length):
+    chunksize = 1024
+
+    def __init__(self, get, length, getmany=None, source=None):
         self._get = get
+        self._getmany = getmany
+        self._source = source
         self._got = [None] * length
 
     def __len__(self):
         return len(self._got)
 
     def __getitem__(self, where):
+        if isinstance(where, slice):
+            return self._materialize(range(*where.indices(len(self))))
         out = self._got[where]
         if out is None:
             normalized = where
@@ -52,6 +60,30 @@ class LazyList(Sequence):
             out = self._got[normalized] = self._get(normalized)
         return out
 
+    def __iter__(self):
+        # in chunks, so that getmany is used without materializing everything before the first item
+        for start in range(0, len(self), self.chunksize):
+            for x in self._materialize(range(start, min(start + self.chunksize, len(self)))):
+                yield x
+
+    def _materialize(self, indexes):
+        got = self._got
+        missing = [i for i in indexes if got[i] is None]
+        if len(missing) == 1 or (len(missing) > 1 and self._getmany is None):
+            for i in missing:
+                got[i] = self._get(i)
+        elif len(missing) > 1:
+            for i, x in zip(missing, self._getmany(numpy.array(missing, dtype=numpy.int64))):
+                got[i] = x
+        return [got[i] for i in indexes]
+
+    def tolist(self):
+        return self._materialize(range(len(self)))
+
+    def materialize(self):
+        self.tolist()
+        return self
+
     def __repr__(self):
         tmp = [repr(x) for x in self]
         if sum(len(x) for x in tmp) < 100:
@@ -62,12 +94,14 @@ class LazyList(Sequence):
             return "[" + ",\n ".join(tmp[:50]) + ",\n ...\n " + ",\n ".join(tmp[:50]) + "]"
 
     def __eq__(self, other):
+        if isinstance(other, LazyList) and len(self) == len(other) and samesource(self._source, other._source):
+            return True
         if not isinstance(other, (LazyList, Iterable)):
             return False
         if len(self) != len(other):
             return False
-        for i in range(len(self)):
-            if self[i] != other[i]:
+        for x, y in zip(self, other):
+            if x != y:
                 return False
         else:
             return True
@@ -75,10 +109,114 @@ class LazyList(Sequence):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+def samesource(one, two):
+    if one is None or two is None:
+        return False
+    (onebuffer, onestart, onestate), (twobuffer, twostart, twostate) = one, two
+    if onestate is None or twostate is None or onestate["modified"] or twostate["modified"]:
+        return False
+    return onestart == twostart and samebuffer(onebuffer, twobuffer)
+
+def bufferaddress(buffer):
+    return numpy.frombuffer(buffer, dtype=numpy.uint8).__array_interface__["data"][0]
+
+def samebuffer(one, two):
+    return one is two or (len(one) == len(two) and bufferaddress(one) == bufferaddress(two))
+
+def vectorstart(fb, field):
+    # field is the index of the vector field in the .fbs table
+    tab = fb._tab
+    o = tab.Offset(4 + 2*field)
+    if o == 0:
+        return None
+    else:
+        return tab.Vector(o)
+
+def gather(raw, positions, dtype):
+    dtype = numpy.dtype(dtype)
+    return raw[positions[:, numpy.newaxis] + numpy.arange(dtype.itemsize)].view(dtype).reshape(-1)
+
+def vectorpositions(buffer, start, indexes):
+    buffer = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    slots = start + 4*indexes
+    return slots + gather(buffer, slots, "<u4")
+
+# the following decode the same field of many tables at once: positions are the tables' absolute positions in raw
+
+def tablefields(raw, positions, field):
+    positions = numpy.asarray(positions, dtype=numpy.int64)
+    vtables = positions - gather(raw, positions, "<i4")
+    slot = 4 + 2*field
+    present = gather(raw, vtables, "<u2") > slot
+    out = numpy.zeros(len(positions), dtype=numpy.int64)
+    out[present] = gather(raw, vtables[present] + slot, "<u2")
+    nonzero = out != 0
+    out[nonzero] += positions[nonzero]
+    return out
+
+def tablescalars(raw, positions, field, dtype, default=0):
+    fields = tablefields(raw, positions, field)
+    out = numpy.full(len(fields), default, dtype=dtype)
+    present = fields != 0
+    out[present] = gather(raw, fields[present], dtype)
+    return out
+
+def tablevectors(raw, positions, field):
+    fields = tablefields(raw, positions, field)
+    present = fields != 0
+    starts = numpy.zeros(len(fields), dtype=numpy.int64)
+    lengths = numpy.zeros(len(fields), dtype=numpy.int64)
+    vectors = fields[present] + gather(raw, fields[present], "<u4")
+    starts[present] = vectors + 4
+    lengths[present] = gather(raw, vectors, "<u4")
+    return starts, lengths, present
+
+def tablestrings(raw, positions, field):
+    starts, lengths, present = tablevectors(raw, positions, field)
+    return [raw[i : i + n].tobytes() if p else None for i, n, p in zip(starts.tolist(), lengths.tolist(), present.tolist())]
+
+def concatenate(raw, starts, lengths, dtype):
+    dtype = numpy.dtype(dtype)
+    total = int(lengths.sum())
+    offsets = numpy.empty(len(lengths) + 1, dtype=numpy.int64)
+    offsets[0] = 0
+    numpy.cumsum(lengths, out=offsets[1:])
+    index = numpy.arange(total, dtype=numpy.int64) - numpy.repeat(offsets[:-1] - starts // dtype.itemsize, lengths)
+    if (starts % dtype.itemsize == 0).all():
+        return raw[: (len(raw) // dtype.itemsize) * dtype.itemsize].view(dtype)[index]
+    else:
+        return gather(raw, index * dtype.itemsize + numpy.repeat(starts % dtype.itemsize, lengths), dtype)
+
+def getmany_strings(buffer, start):
+    def getmany(indexes):
+        positions = vectorpositions(buffer, start, indexes)
+        raw = numpy.frombuffer(buffer, dtype=numpy.uint8)
+        lengths = gather(raw, positions, "<u4")
+        starts = positions + 4
+        return [raw[i : i + n].tobytes() for i, n in zip(starts.tolist(), lengths.tolist())]
+    return getmany
+
+def getmany_tables(buffer, start, cls):
+    def getmany(indexes):
+        out = []
+        for pos in vectorpositions(buffer, start, indexes).tolist():
+            x = cls()
+            x.Init(buffer, pos)
+            out.append(x)
+        return out
+    return getmany
+
+def adopt(finalize, state):
+    def adopted(x):
+        out = finalize(x)
+        out._state = state
+        return out
+    return adopted
+
 def name2fb(name):
     return "".join(x.capitalize() for x in name.split("_"))
 
-def lazyproperty(name, finalize):
+def lazyproperty(name, finalize, invalidates=(), field=None):
     @property
     def prop(self):
         uname = "_" + name
@@ -92,20 +230,44 @@ def lazyproperty(name, finalize):
             out = getattr(self._flatbuffers, fbname)()
             if finalize is not None:
                 out = finalize(out)
-        elif finalize is None:
-            out = LazyList(getattr(self._flatbuffers, fbname), lenmethod())
         else:
-            out = LazyList(lambda i: finalize(getattr(self._flatbuffers, fbname)(i)), lenmethod())
+            get = getattr(self._flatbuffers, fbname)
+            length = lenmethod()
+            state = getattr(self, "_state", None)
+            convert = finalize
+            first = None if length == 0 else get(0)
+            if state is not None and convert is not None and hasattr(first, "Init"):
+                convert = adopt(convert, state)
+
+            getmany, source = None, None
+            start = None if field is None or length == 0 else vectorstart(self._flatbuffers, field)
+            if start is not None:
+                buffer = self._flatbuffers._tab.Bytes
+                source = (buffer, start, state)
+                if isinstance(first, bytes):
+                    getmany = getmany_strings(buffer, start)
+                elif hasattr(first, "Init"):
+                    getmany = getmany_tables(buffer, start, type(first))
+
+            if convert is None:
+                out = LazyList(get, length, getmany, source)
+            elif getmany is None:
+                out = LazyList(lambda i: convert(get(i)), length, None, source)
+            else:
+                out = LazyList(lambda i: convert(get(i)), length, lambda indexes: [convert(x) for x in getmany(indexes)], source)
         setattr(self, uname, out)
         return out
 
     @prop.setter
     def prop(self, value):
         setattr(self, "_" + name, value)
+        for x in invalidates:
+            if hasattr(self, x):
+                delattr(self, x)
 
     return prop
 
-def lazyproperty_numpy(name):
+def lazyproperty_numpy(name, unpack=None):
     @property
     def prop(self):
         uname = "_" + name
@@ -113,8 +275,11 @@ def lazyproperty_numpy(name):
         if out is not None:
             return out
 
-        fbname = name2fb(name) + "AsNumpy"
-        out = getattr(self._flatbuffers, fbname)()
+        packed = None if unpack is None else getattr(self._flatbuffers, "Packed" + name2fb(name))()
+        if packed is None:
+            out = getattr(self._flatbuffers, name2fb(name) + "AsNumpy")()
+        else:
+            out = unpack(packed)
         setattr(self, uname, out)
         return out
 
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Same numitems/fromroot/destination/fill/clip/finalize protocol as uproot's interpretations,
+# but fromroot only takes views and fill decodes whole baskets directly into the destination.
+
+import numpy
+
+class Interpretation(object):
+    def __repr__(self):
+        return self.identifier
+
+    def __eq__(self, other):
+        return isinstance(other, Interpretation) and self.identifier == other.identifier
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.identifier)
+
+    def source_numitems(self, source):
+        return int(numpy.prod(source.shape))
+
+    def finalize(self, destination, branch):
+        return destination
+
+def _flatlen(dims):
+    return int(numpy.prod(dims)) if len(dims) != 0 else 1
+
+def _dtypeshape(dtype):
+    shape = ()
+    while dtype.subdtype is not None:
+        dtype, subshape = dtype.subdtype
+        shape = shape + subshape
+    return dtype, shape
+
+_byteorder = {"!": "B", ">": "B", "<": "L", "|": "L", "=": "B" if numpy.dtype(">f8").isnative else "L"}
+
+def _dtypeform(dtype, suffix):
+    dtype, shape = _dtypeshape(dtype)
+    return "{0}{1}{2}({3}{4})".format(_byteorder[dtype.byteorder], dtype.kind, dtype.itemsize, ",".join(repr(x) for x in shape), suffix)
+
+class asdtype(Interpretation):
+    def __init__(self, fromdtype, todtype=None):
+        self.fromdtype = numpy.dtype(fromdtype)
+        self.todtype = self.fromdtype.newbyteorder("=") if todtype is None else numpy.dtype(todtype)
+
+    @property
+    def identifier(self):
+        def form(dtype):
+            if dtype.names is None:
+                return _dtypeform(dtype, "")
+            else:
+                return "[" + ",".join(_dtypeform(dtype[n], "," + repr(n)) for n in dtype.names) + "]"
+        return "asdtype({0},{1})".format(form(self.fromdtype), form(self.todtype))
+
+    @property
+    def itemsize(self):
+        return self.fromdtype.itemsize
+
+    def numitems(self, numbytes, numentries):
+        return numbytes // self.fromdtype.itemsize
+
+    def fromroot(self, data, byteoffsets, local_entrystart, local_entrystop):
+        dtype, shape = _dtypeshape(self.fromdtype)
+        array = data[: (len(data) // self.fromdtype.itemsize) * self.fromdtype.itemsize].view(dtype)
+        if shape != ():
+            array = array.reshape((-1,) + shape)
+        return array[local_entrystart:local_entrystop]
+
+    def source_numitems(self, source):
+        return len(source)
+
+    def destination(self, numitems, numentries):
+        return numpy.empty(numitems, dtype=self.todtype)
+
+    def fill(self, source, destination, itemstart, itemstop, entrystart, entrystop):
+        destination[itemstart:itemstop] = source
+
+    def clip(self, destination, itemstart, itemstop, entrystart, entrystop):
+        return destination[itemstart:itemstop]
+
+class JaggedArray(object):
+    def __init__(self, offsets, content):
+        self.offsets = offsets
+        self.content = content
+
+    @classmethod
+    def fromcounts(cls, counts, content):
+        offsets = numpy.empty(len(counts) + 1, dtype=numpy.int64)
+        offsets[0] = 0
+        numpy.cumsum(counts, out=offsets[1:])
+        return cls(offsets, content)
+
+    @property
+    def counts(self):
+        return numpy.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, where):
+        if isinstance(where, numpy.ndarray) and where.dtype == numpy.bool_:
+            content = self.content[self.offsets[0] : self.offsets[-1]]
+            return type(self).fromcounts(self.counts[where], content[numpy.repeat(where, self.counts)])
+        if isinstance(where, slice):
+            start, stop, step = where.indices(len(self))
+            if step != 1:
+                raise NotImplementedError("slice step other than 1")
+            return type(self)(self.offsets[start : max(start, stop) + 1], self.content)
+        if where < 0:
+            where += len(self)
+        if not 0 <= where < len(self):
+            raise IndexError("index out of range for {0} with length {1}".format(type(self).__name__, len(self)))
+        return self.content[self.offsets[where] : self.offsets[where + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def tolist(self):
+        return [x.tolist() for x in self]
+
+    def __repr__(self):
+        return "<{0} of {1} entries>".format(type(self).__name__, len(self))
+
+class StringArray(JaggedArray):
+    def __getitem__(self, where):
+        out = JaggedArray.__getitem__(self, where)
+        if isinstance(out, numpy.ndarray):
+            return out.tobytes()
+        return out
+
+    def tolist(self):
+        return list(self)
+
+def concatenate(arrays):
+    # arrays of the same kind (numpy.ndarray or JaggedArray) as produced by finalize, end to end
+    if isinstance(arrays[0], JaggedArray):
+        offsets = [numpy.zeros(1, dtype=numpy.int64)]
+        for x in arrays:
+            offsets.append(x.offsets[1:] - x.offsets[0] + offsets[-1][-1])
+        return type(arrays[0])(numpy.concatenate(offsets), numpy.concatenate([x.content[x.offsets[0] : x.offsets[-1]] for x in arrays]))
+    else:
+        return numpy.concatenate(arrays)
+
+class asjagged(Interpretation):
+    # the source and destination are (content, counts) pairs: content in the content's own items, counts per entry
+    def __init__(self, content, skipbytes=0):
+        self.content = content
+        self.skipbytes = skipbytes
+
+    @property
+    def identifier(self):
+        return "asjagged({0}{1})".format(self.content.identifier, "" if self.skipbytes == 0 else ",{0}".format(self.skipbytes))
+
+    def numitems(self, numbytes, numentries):
+        return self.content.numitems(numbytes - numentries*self.skipbytes, numentries)
+
+    def fromroot(self, data, byteoffsets, local_entrystart, local_entrystop):
+        if byteoffsets is None:
+            raise ValueError("{0} requires the basket's byte offsets".format(self.identifier))
+        bot, top = byteoffsets[local_entrystart], byteoffsets[local_entrystop]
+        bytestarts = byteoffsets[local_entrystart:local_entrystop] + self.skipbytes
+        bytestops = byteoffsets[local_entrystart + 1 : local_entrystop + 1]
+
+        data = data[bot:top]
+        if self.skipbytes != 0 and len(data) != 0:
+            # drop each entry's header: +1 where an entry's content starts, -1 where it stops
+            mask = numpy.zeros(len(data) + 1, dtype=numpy.int8)
+            numpy.add.at(mask, bytestarts - bot, 1)
+            numpy.add.at(mask, bytestops - bot, -1)
+            numpy.cumsum(mask, out=mask)
+            data = data[mask[:-1].view(numpy.bool_)]
+
+        counts = bytestops - bytestarts
+        numpy.floor_divide(counts, self.content.itemsize, out=counts)
+        return self.content.fromroot(data, None, 0, None), counts
+
+    def source_numitems(self, source):
+        return self.content.source_numitems(source[0])
+
+    def destination(self, numitems, numentries):
+        return self.content.destination(numitems, numitems), numpy.empty(numentries, dtype=numpy.int64)
+
+    def fill(self, source, destination, itemstart, itemstop, entrystart, entrystop):
+        self.content.fill(source[0], destination[0], itemstart, itemstop, itemstart, itemstop)
+        destination[1][entrystart:entrystop] = source[1]
+
+    def clip(self, destination, itemstart, itemstop, entrystart, entrystop):
+        return self.content.clip(destination[0], itemstart, itemstop, itemstart, itemstop), destination[1][entrystart:entrystop]
+
+    def finalize(self, destination, branch):
+        content, counts = destination
+        return JaggedArray.fromcounts(counts, self.content.finalize(content, branch))
+
+class asstring(asjagged):
+    def __init__(self, skipbytes=1):
+        asjagged.__init__(self, asdtype(numpy.uint8), skipbytes)
+
+    @property
+    def identifier(self):
+        return "asstring({0})".format("" if self.skipbytes == 1 else repr(self.skipbytes))
+
+    def finalize(self, destination, branch):
+        content, counts = destination
+        return StringArray.fromcounts(counts, content)
+
+class asdouble32(Interpretation):
+    def __init__(self, low, high, numbits, fromdims=(), todims=None):
+        if not 2 <= numbits <= 32:
+            raise ValueError("numbits must be an integer between 2 and 32 (inclusive)")
+        self.truncated = low == 0.0 and high == 0.0
+        if high <= low and not self.truncated:
+            raise ValueError("high ({0}) must be strictly greater than low ({1})".format(high, low))
+        self.low = low
+        self.high = high
+        self.numbits = numbits
+        self.fromdims = tuple(fromdims)
+        self.todims = self.fromdims if todims is None else tuple(todims)
+
+    @property
+    def identifier(self):
+        fromdims = "(" + ",".join(repr(x) for x in self.fromdims) + ")"
+        todims = "(" + ",".join(repr(x) for x in self.todims) + ")"
+        return "asdouble32({0},{1},{2},{3},{4})".format(self.low, self.high, self.numbits, fromdims, todims)
+
+    @property
+    def fromdtypeflat(self):
+        if self.truncated:
+            return numpy.dtype([("exponent", "u1"), ("mantissa", ">u2")])
+        else:
+            return numpy.dtype(">u4")
+
+    @property
+    def todtype(self):
+        return numpy.dtype((numpy.float64, self.todims))
+
+    @property
+    def itemsize(self):
+        return self.fromdtypeflat.itemsize * _flatlen(self.fromdims)
+
+    def numitems(self, numbytes, numentries):
+        return numbytes // self.fromdtypeflat.itemsize
+
+    def fromroot(self, data, byteoffsets, local_entrystart, local_entrystop):
+        itemsize = self.fromdtypeflat.itemsize
+        array = data[: (len(data) // itemsize) * itemsize].view(self.fromdtypeflat)
+        if self.fromdims != ():
+            array = array.reshape((-1,) + self.fromdims)
+        return array[local_entrystart:local_entrystop]
+
+    def destination(self, numitems, numentries):
+        quotient, remainder = divmod(numitems, _flatlen(self.todims))
+        if remainder != 0:
+            raise ValueError("cannot reshape {0} items as {1}".format(numitems, self.todims))
+        return numpy.empty(quotient, dtype=self.todtype)
+
+    def fill(self, source, destination, itemstart, itemstop, entrystart, entrystop):
+        out = destination.reshape(-1)[itemstart:itemstop]
+        source = source.reshape(-1)
+
+        if self.truncated:
+            # ROOT's truncated float: 8-bit exponent, then numbits of mantissa with the sign just above them
+            bits = numpy.empty(len(source), dtype=numpy.int32)
+            mantissa = numpy.empty(len(source), dtype=numpy.int32)
+            bits[:] = source["exponent"]
+            mantissa[:] = source["mantissa"]
+            numpy.left_shift(bits, 23, out=bits)
+            negative = numpy.bitwise_and(mantissa, 1 << (self.numbits + 1)) != 0
+            numpy.bitwise_and(mantissa, (1 << (self.numbits + 1)) - 1, out=mantissa)
+            numpy.left_shift(mantissa, 23 - self.numbits, out=mantissa)
+            numpy.bitwise_or(bits, mantissa, out=bits)
+            out[:] = bits.view(numpy.float32)
+            numpy.negative(out, out=out, where=negative)
+
+        else:
+            numpy.multiply(source, float(self.high - self.low) / (1 << self.numbits), out=out)
+            numpy.add(out, self.low, out=out)
+
+    def clip(self, destination, itemstart, itemstop, entrystart, entrystop):
+        length = _flatlen(self.todims)
+        return destination[itemstart // length : itemstop // length]
+
+class asstlbitset(Interpretation):
+    def __init__(self, numbytes):
+        self.numbytes = numbytes
+
+    @property
+    def identifier(self):
+        return "asstlbitset({0})".format(self.numbytes)
+
+    @property
+    def todtype(self):
+        return numpy.dtype(numpy.bool_)
+
+    @property
+    def itemsize(self):
+        return self.numbytes + 4
+
+    def numitems(self, numbytes, numentries):
+        return max(0, numbytes // (self.numbytes + 4))
+
+    def fromroot(self, data, byteoffsets, local_entrystart, local_entrystop):
+        # each entry is a 4-byte header followed by one byte per bit
+        rowsize = self.numbytes + 4
+        return data[: (len(data) // rowsize) * rowsize].reshape(-1, rowsize)[local_entrystart:local_entrystop, 4:]
+
+    def source_numitems(self, source):
+        return len(source)
+
+    def destination(self, numitems, numentries):
+        return numpy.empty((numitems, self.numbytes), dtype=self.todtype)
+
+    def fill(self, source, destination, itemstart, itemstop, entrystart, entrystop):
+        numpy.not_equal(source, 0, out=destination[itemstart:itemstop])
+
+    def clip(self, destination, itemstart, itemstop, entrystart, entrystop):
+        return destination[itemstart:itemstop]
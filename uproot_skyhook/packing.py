@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy
+
+import uproot_skyhook.layout_generated.VectorEncoding
+
+delta_bitpacked = uproot_skyhook.layout_generated.VectorEncoding.VectorEncoding.delta_bitpacked
+bitpacked = uproot_skyhook.layout_generated.VectorEncoding.VectorEncoding.bitpacked
+lz4 = uproot_skyhook.layout_generated.VectorEncoding.VectorEncoding.lz4
+
+def _lz4block():
+    import lz4.block
+    return lz4.block
+
+def bitwidth(values):
+    if len(values) == 0:
+        return 0
+    return int(values.max()).bit_length()
+
+def bitpack(values, width):
+    if width == 0 or len(values) == 0:
+        return numpy.empty(0, dtype=numpy.uint8)
+    bits = numpy.empty((len(values), width), dtype=numpy.uint8)
+    for i in range(width):
+        bits[:, i] = (values >> numpy.uint64(i)) & numpy.uint64(1)
+    return numpy.packbits(bits.reshape(-1))
+
+def bitunpack(data, length, width):
+    out = numpy.zeros(length, dtype=numpy.uint64)
+    if width == 0 or length == 0:
+        return out
+    bits = numpy.unpackbits(data)[: length * width].reshape(length, width)
+    for i in range(width):
+        out |= bits[:, i].astype(numpy.uint64) << numpy.uint64(i)
+    return out
+
+def pack(array):
+    # returns (encoding, length, first, bitwidth, data) or None if packing would not save space
+    array = numpy.asarray(array)
+    if len(array) < 2:
+        return None
+
+    values = array.astype(numpy.uint64)
+    first = int(values[0])
+    deltas = values[1:] - values[:-1]
+
+    if (values[1:] >= values[:-1]).all():
+        width = bitwidth(deltas)
+        candidate = (delta_bitpacked, len(values), first, width, bitpack(deltas, width))
+
+    else:
+        minimum = values.min()
+        width = bitwidth(values - minimum)
+        candidate = (bitpacked, len(values), int(minimum), width, bitpack(values - minimum, width))
+
+        compressed = numpy.frombuffer(_lz4block().compress(array.astype(array.dtype.newbyteorder("<")).tobytes(), store_size=False), dtype=numpy.uint8)
+        if len(compressed) < len(candidate[4]):
+            candidate = (lz4, len(values), 0, 0, compressed)
+
+    if len(candidate[4]) + 24 >= array.nbytes:
+        return None
+    else:
+        return candidate
+
+def unpack(encoding, length, first, width, data, dtype):
+    dtype = numpy.dtype(dtype)
+
+    if encoding == delta_bitpacked:
+        out = numpy.empty(length, dtype=numpy.uint64)
+        if length > 0:
+            out[0] = first
+            out[1:] = bitunpack(data, length - 1, width)
+            numpy.cumsum(out, out=out)
+        return out.astype(dtype)
+
+    elif encoding == bitpacked:
+        out = bitunpack(data, length, width)
+        out += numpy.uint64(first)
+        return out.astype(dtype)
+
+    elif encoding == lz4:
+        return numpy.frombuffer(_lz4block().decompress(data.tobytes() if isinstance(data, numpy.ndarray) else data, uncompressed_size=length * dtype.itemsize), dtype=dtype)
+
+    else:
+        raise ValueError("unrecognized vector encoding: {0}".format(encoding))
+
+def unpackmany(encodings, lengths, firsts, widths, data, datastarts, datalengths, dtype):
+    # the concatenation of many packed vectors, whose data are data[datastarts[i] : datastarts[i] + datalengths[i]];
+    # bitpacked vectors of the same width are unpacked together, LZ4 blocks one by one
+    dtype = numpy.dtype(dtype)
+    encodings = numpy.asarray(encodings)
+    lengths = numpy.asarray(lengths, dtype=numpy.int64)
+    firsts = numpy.asarray(firsts, dtype=numpy.uint64)
+    widths = numpy.asarray(widths, dtype=numpy.int64)
+    datastarts = numpy.asarray(datastarts, dtype=numpy.int64)
+    datalengths = numpy.asarray(datalengths, dtype=numpy.int64)
+
+    offsets = numpy.zeros(len(lengths) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=offsets[1:])
+    out = numpy.zeros(offsets[-1], dtype=numpy.uint64)
+
+    unrecognized = ~numpy.isin(encodings, (delta_bitpacked, bitpacked, lz4))
+    if unrecognized.any():
+        raise ValueError("unrecognized vector encoding: {0}".format(encodings[unrecognized][0]))
+
+    # delta_bitpacked vectors store their first value in firsts and the rest as bits
+    isdelta = (encodings == delta_bitpacked) & (lengths > 0)
+    bitstarts = offsets[:-1] + isdelta
+    numbits = numpy.where(isdelta, lengths - 1, lengths)
+
+    isbits = encodings != lz4
+    for width in numpy.unique(widths[isbits]).tolist():
+        group = numpy.nonzero(isbits & (widths == width))[0]
+        counts = numbits[group]
+        total = int(counts.sum())
+        if width == 0 or total == 0:
+            continue
+        groupoffsets = numpy.zeros(len(group) + 1, dtype=numpy.int64)
+        numpy.cumsum(datalengths[group], out=groupoffsets[1:])
+        packed = data[numpy.repeat(datastarts[group] - groupoffsets[:-1], datalengths[group]) + numpy.arange(groupoffsets[-1])]
+        bits = numpy.unpackbits(packed)
+
+        countoffsets = numpy.zeros(len(group) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=countoffsets[1:])
+        local = numpy.arange(total) - numpy.repeat(countoffsets[:-1], counts)
+        items = bits[(numpy.repeat(8*groupoffsets[:-1], counts) + width*local)[:, numpy.newaxis] + numpy.arange(width)]
+        values = numpy.zeros(total, dtype=numpy.uint64)
+        for i in range(width):
+            values |= items[:, i].astype(numpy.uint64) << numpy.uint64(i)
+        out[numpy.repeat(bitstarts[group], counts) + local] = values
+
+    isbitpacked = encodings == bitpacked
+    out += numpy.repeat(numpy.where(isbitpacked, firsts, 0).astype(numpy.uint64), lengths)
+
+    # running sums within each delta_bitpacked vector (uint64 wraparound cancels in the differences)
+    out[offsets[:-1][isdelta]] = firsts[isdelta]
+    indelta = numpy.repeat(isdelta, lengths)
+    if indelta.any():
+        deltas = out[indelta]
+        sums = numpy.cumsum(deltas, dtype=numpy.uint64)
+        deltalengths = lengths[isdelta]
+        before = numpy.zeros(len(deltalengths), dtype=numpy.uint64)
+        before[1:] = sums[numpy.cumsum(deltalengths)[:-1] - 1]
+        out[indelta] = sums - numpy.repeat(before, deltalengths)
+
+    out = out.astype(dtype)
+    for i in numpy.nonzero(encodings == lz4)[0].tolist():
+        block = data[datastarts[i] : datastarts[i] + datalengths[i]]
+        out[offsets[i] : offsets[i + 1]] = unpack(lz4, lengths[i], 0, 0, block, dtype)
+    return out
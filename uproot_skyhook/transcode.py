@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Rewrites columns of a Dataset into new page files that decode fast: one page per basket, either
+# uncompressed or lz4, optionally with flat columns converted to native endianness.
+
+import os
+import hashlib
+
+import numpy
+
+import uproot_skyhook.layout
+import uproot_skyhook.native
+import uproot_skyhook.deliver
+
+def _swap(data, fromdtype):
+    base, shape = uproot_skyhook.native._dtypeshape(fromdtype)
+    return data.view(base).astype(base.newbyteorder("=")).view(numpy.uint8)
+
+def transcode(dataset, colnames, directory, compression=uproot_skyhook.layout.none, native=False, pagecache=None):
+    # returns a Dataset of the given columns whose pages are in directory, one page file per file
+    if compression == uproot_skyhook.layout.lz4:
+        import lz4.block
+    elif compression != uproot_skyhook.layout.none:
+        raise ValueError("transcode only writes lz4 or uncompressed pages, not {0}".format(compression.name))
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    colindexes = [uproot_skyhook.deliver._colindex(dataset, x) for x in colnames]
+    columns, swap = [], []
+    for colindex in colindexes:
+        column = dataset.columns[colindex]
+        interpretation = column.native
+        if native and isinstance(interpretation, uproot_skyhook.native.asdtype) and not interpretation.fromdtype.isnative:
+            columns.append(uproot_skyhook.layout.Column(uproot_skyhook.native.asdtype(interpretation.fromdtype.newbyteorder("="), interpretation.todtype), column.title))
+            swap.append(interpretation.fromdtype)
+        else:
+            columns.append(column)
+            swap.append(None)
+
+    files = []
+    for filei, file in enumerate(dataset.files):
+        location = file.location if dataset.location_prefix is None else dataset.location_prefix + file.location
+        path = os.path.abspath(os.path.join(directory, "{0:06d}.pages".format(filei)))
+
+        branches = []
+        with uproot_skyhook.deliver.FileArray.open(location, pagecache, file.uuid) as filearray:
+            with open(path, "wb") as output:
+                for colindex, fromdtype in zip(colindexes, swap):
+                    branch = file.branches[colindex]
+                    numbaskets = len(branch.local_offsets) - 1
+                    page_seeks, iscompressed, compressedbytes, uncompressedbytes = [], [], [], []
+                    basket_page_offsets = [0]
+
+                    for basketi in range(numbaskets):
+                        if branch.basket_page_offsets[basketi] != branch.basket_page_offsets[basketi + 1]:
+                            data = uproot_skyhook.deliver._basketdata(branch, filearray, basketi)
+                            if fromdtype is not None:
+                                if branch.basket_data_borders is not None:
+                                    raise ValueError("asdtype basket with byte offsets in file {0}".format(repr(file.location)))
+                                data = _swap(data, fromdtype)
+
+                            page = numpy.asarray(data, dtype=numpy.uint8).tobytes()
+                            uncompressedbytes.append(len(page))
+                            if compression == uproot_skyhook.layout.lz4:
+                                compressed = lz4.block.compress(page, store_size=False)
+                                if len(compressed) < len(page):
+                                    page = compressed
+                            iscompressed.append(len(page) != uncompressedbytes[-1])
+                            compressedbytes.append(len(page))
+                            page_seeks.append(output.tell())
+                            output.write(page)
+
+                        basket_page_offsets.append(len(page_seeks))
+
+                    if compression == uproot_skyhook.layout.none:
+                        iscompressed = compressedbytes = None
+                    branches.append(uproot_skyhook.layout.Branch(branch.local_offsets, page_seeks, compression, iscompressed, compressedbytes, uncompressedbytes, basket_page_offsets, branch.basket_keylens, branch.basket_data_borders))
+
+        # new bytes at new seeks: caches keyed by UUID must not confuse them with the original file
+        fileuuid = file.uuid if isinstance(file.uuid, bytes) else file.uuid.encode("utf-8")
+        uuid = hashlib.sha1(b"\x00".join([fileuuid, compression.name.encode("utf-8"), b"native" if native else b""] + [x.encode("utf-8") for x in colnames])).digest()[:16]
+        files.append(uproot_skyhook.layout.File(path, uuid, branches, file.entrystart))
+
+    return uproot_skyhook.layout.Dataset(dataset.name, dataset.treepath, colnames, columns, files, dataset.global_offsets)